@@ -1,8 +1,12 @@
 # app.py
 from flask import Flask, jsonify
 from flask_restful import Api
-from ussd.ussd_handler import ussd_bp, start_cleanup
-from models.database import init_db
+from ussd.ussd_handler import ussd_bp
+from models.database import db, init_db
+from services.events import broker
+from services.spikes import detector
+from services.metrics import init_metrics
+from services.profiling import init_profiling
 from config import Config
 from flask_cors import CORS
 
@@ -16,6 +20,10 @@ app.config['JWT_ERROR_MESSAGE_KEY'] = 'msg'
 app.config['JWT_TOKEN_LOCATION'] = ['headers']
 
 init_db(app)
+broker.configure(app)
+detector.configure(app)
+init_metrics(app, db)
+init_profiling(app)
 
 # === JWT ===
 jwt = JWTManager(app) 
@@ -38,5 +46,5 @@ from routes import register_routes
 register_routes(app)
 app.register_blueprint(ussd_bp)
 
-# === BACKGROUND ===
-start_cleanup()
\ No newline at end of file
+from commands import register_commands
+register_commands(app)
@@ -0,0 +1,172 @@
+# benchmarks/admin_api.py
+"""
+Run every admin endpoint against synthetic datasets of increasing size and
+record latency, peak Python memory and SQL statement counts.
+
+    python -m benchmarks.admin_api --sizes 10000,1000000 \\
+        --db sqlite:////tmp/bench.db --db postgresql://localhost/incidents_bench
+
+Each --db runs in its own interpreter (the app binds its database at import).
+The tables in each database are dropped and recreated, so never point this at
+real data. Results are compared against --baseline when that file exists;
+--save-baseline writes the current run there instead.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+ENDPOINTS = {
+    "dashboard": "/api/dashboard",
+    "reports": "/api/reports",
+    "reports_filtered": "/api/reports?category=Phishing&severity=High",
+    "search": "/api/search?q=lagos",
+    "reports_location": "/api/reports?location=lagos",
+    "locations": "/api/analytics/locations",
+    "export": "/api/export",
+}
+
+
+def _child(db_url, sizes, endpoints, repeat, users_per_incident):
+    """Runs inside the per-database interpreter; returns a list of result dicts."""
+    os.environ['DATABASE_URL'] = db_url
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench')
+    os.environ.setdefault('USSD_SHORTCODE', '*000#')
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from app import app
+    from models.database import db, Admin
+    from models.locations import resolver
+    from benchmarks.synthetic import load
+
+    statements = [0]
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _count(*args):
+        statements[0] += 1
+
+    client = app.test_client()
+    label = db_url.split(':', 1)[0].split('+')[0]
+    results = []
+    for size in sizes:
+        with app.app_context():
+            db.drop_all(bind_key=None)
+            db.create_all(bind_key=None)
+            resolver.reset()
+            started = time.perf_counter()
+            load(max(1, int(size * users_per_incident)), size)
+            load_s = time.perf_counter() - started
+            admin = Admin(email='bench@example.com')
+            admin.set_password('bench')
+            db.session.add(admin)
+            db.session.commit()
+
+        token = client.post('/api/auth/login', json={'email': 'bench@example.com', 'password': 'bench'}).json['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        for name in endpoints:
+            path = ENDPOINTS[name]
+            timings = []
+            for _ in range(repeat):
+                statements[0] = 0
+                started = time.perf_counter()
+                resp = client.get(path, headers=headers)
+                timings.append(time.perf_counter() - started)
+                assert resp.status_code == 200, (path, resp.status_code)
+            queries = statements[0]
+
+            tracemalloc.start()
+            client.get(path, headers=headers)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            timings.sort()
+            results.append({
+                "db": label,
+                "size": size,
+                "endpoint": name,
+                "load_s": round(load_s, 3),
+                "median_ms": round(statistics.median(timings) * 1000, 2),
+                "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 2),
+                "peak_mib": round(peak / 2**20, 2),
+                "queries": queries,
+                "response_bytes": len(resp.data),
+            })
+            print(f"  {results[-1]['db']:<10} {size:>10,} {name:<18} "
+                  f"{results[-1]['median_ms']:>10.1f} ms {results[-1]['peak_mib']:>8.1f} MiB "
+                  f"{queries:>4} queries", file=sys.stderr)
+    return results
+
+
+def _key(r):
+    return (r['db'], r['size'], r['endpoint'])
+
+
+def compare(results, baseline):
+    base = {_key(r): r for r in baseline}
+    print(f"{'db':<10} {'size':>10} {'endpoint':<18} {'median ms':>10} {'vs base':>8} "
+          f"{'peak MiB':>9} {'vs base':>8} {'queries':>7}")
+    for r in results:
+        b = base.get(_key(r))
+
+        def delta(field):
+            if not b or not b[field]:
+                return '-'
+            return f"{(r[field] - b[field]) / b[field] * 100:+.0f}%"
+        print(f"{r['db']:<10} {r['size']:>10,} {r['endpoint']:<18} {r['median_ms']:>10.1f} {delta('median_ms'):>8} "
+              f"{r['peak_mib']:>9.1f} {delta('peak_mib'):>8} {r['queries']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', action='append', help="database URL (repeatable); default: a temp SQLite file")
+    parser.add_argument('--sizes', default='10000', help="comma-separated incident counts, e.g. 10000,1000000,10000000")
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help="comma-separated subset of: " + ', '.join(ENDPOINTS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--users-per-incident', type=float, default=0.1)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    endpoints = args.endpoints.split(',')
+
+    if args.child:
+        results = _child(args.child, sizes, endpoints, args.repeat, args.users_per_incident)
+        print(json.dumps(results))
+        sys.stdout.flush()
+        os._exit(0)
+
+    results = []
+    for db_url in args.db or ['sqlite:////tmp/incident_bench.db']:
+        cmd = [sys.executable, '-m', 'benchmarks.admin_api', '--child', db_url, '--sizes', args.sizes,
+               '--endpoints', args.endpoints, '--repeat', str(args.repeat),
+               '--users-per-incident', str(args.users_per_incident)]
+        out = subprocess.run(cmd, stdout=subprocess.PIPE, text=True)
+        if out.returncode != 0:
+            sys.exit(f"benchmark failed for {db_url}")
+        results.extend(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    baseline = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    compare(results, baseline)
+
+
+if __name__ == '__main__':
+    main()
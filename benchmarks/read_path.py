@@ -0,0 +1,109 @@
+# benchmarks/read_path.py
+"""
+Compare the ORM read path (Incident.query...all()) with the column projection
+used by the list endpoints.
+
+    python -m benchmarks.read_path --rows 100000
+"""
+import argparse
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import insert
+
+from models.database import db, User, Incident
+from models.queries import report_rows, serialize_report
+
+
+def _make_app(uri):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def _seed(rows):
+    user_id = uuid.uuid4()
+    db.session.execute(insert(User), [{"id": user_id, "phone_number": "0000000000"}])
+    start = datetime.utcnow() - timedelta(days=365)
+    batch = []
+    for i in range(rows):
+        batch.append({
+            "reference": f"BENCH-{i:08d}",
+            "category": "Phishing",
+            "location": "Lagos",
+            "severity": "High",
+            "description": "Synthetic benchmark incident",
+            "created_at": start + timedelta(seconds=i * 30),
+            "user_id": user_id,
+        })
+        if len(batch) == 10000:
+            db.session.execute(insert(Incident), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Incident), batch)
+    db.session.commit()
+
+
+def orm_path():
+    incidents = Incident.query.order_by(Incident.created_at.desc()).all()
+    return [
+        {
+            "id": inc.id,
+            "category": inc.category,
+            "severity": inc.severity,
+            "location": inc.location,
+            "description": inc.description or "",
+            "date": inc.created_at.date().isoformat() if inc.created_at else ''
+        }
+        for inc in incidents
+    ]
+
+
+def projection_path():
+    return [serialize_report(row) for row in report_rows()]
+
+
+def measure(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    db.session.expunge_all()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(result), best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--db", default="sqlite://", help="database URI (default: in-memory SQLite)")
+    args = parser.parse_args()
+
+    app = _make_app(args.db)
+    with app.app_context():
+        db.create_all()
+        _seed(args.rows)
+
+        print(f"{'path':<12}{'rows':>10}{'rows/sec':>14}{'peak MiB':>12}")
+        for name, fn in (("orm", orm_path), ("projection", projection_path)):
+            count, best, peak = measure(fn, args.repeat)
+            print(f"{name:<12}{count:>10}{count / best:>14,.0f}{peak / 2**20:>12.1f}")
+
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
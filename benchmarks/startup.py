@@ -0,0 +1,62 @@
+# benchmarks/startup.py
+"""
+Measure worker cold start: time to import app.py and time to the first /ussd
+response, each in a fresh interpreter.
+
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = r"""
+import json, os, sys, time
+t0 = time.perf_counter()
+from app import app
+t1 = time.perf_counter()
+client = app.test_client()
+resp = client.post('/ussd', json={'sessionId': 'bench-startup', 'phoneNumber': '0000', 'text': ''})
+t2 = time.perf_counter()
+assert resp.status_code == 200, resp.status_code
+print(json.dumps({
+    'import_s': t1 - t0,
+    'first_ussd_s': t2 - t0,
+    'pandas_loaded': 'pandas' in sys.modules,
+}))
+sys.stdout.flush()
+os._exit(0)
+"""
+
+
+def run_once(env):
+    out = subprocess.run([sys.executable, '-c', CHILD], env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        sys.exit(out.stderr)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    # The configured pool options need a file-backed SQLite database
+    env.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_startup.db')}")
+    env.setdefault('JWT_SECRET_KEY', 'bench')
+    env.setdefault('USSD_SHORTCODE', '*000#')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.getcwd(), env.get('PYTHONPATH')]))
+
+    results = [run_once(env) for _ in range(args.runs)]
+    print(f"runs: {args.runs}")
+    print(f"import app (median):       {statistics.median(r['import_s'] for r in results) * 1000:.0f} ms")
+    print(f"first /ussd (median):      {statistics.median(r['first_ussd_s'] for r in results) * 1000:.0f} ms")
+    print(f"pandas imported at start:  {results[0]['pandas_loaded']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# benchmarks/synthetic.py
+"""
+Deterministic synthetic incident data with realistic skews.
+
+- categories and severities follow fixed, uneven weights
+- locations are Zipf-distributed over cities, platforms and URLs, with the
+  messy spellings real subscribers type ("lagos ", "LAGOS", "Twitter @x")
+- a few heavy reporters file most incidents (Zipf over phone numbers)
+- timestamps lean towards recent days and follow a day/night cycle
+
+    python -m benchmarks.synthetic --users 1000 --incidents 100000 --out incidents.csv
+    python -m benchmarks.synthetic --users 1000 --incidents 100000 --load   # into DATABASE_URL
+"""
+import argparse
+import csv
+import io
+import itertools
+import random
+import sys
+from datetime import datetime, timedelta
+
+from ussd.ussd_flow import INCIDENT_CATEGORIES, SEVERITY_LEVELS
+
+FIELDS = ('phone_number', 'category', 'location', 'severity', 'description', 'created_at')
+
+CATEGORY_WEIGHTS = {
+    "Phishing": 30, "Fraud (Digital)": 25, "Spam / Scam": 20, "Malware / Virus": 10,
+    "Cyberstalking": 8, "Forgery (Digital)": 5, "Cyber Terrorism": 2,
+}
+SEVERITY_WEIGHTS = {"Low": 40, "Medium": 35, "High": 20, "Emergency": 5}
+
+CITIES = ["Lagos", "Abuja", "Kano", "Ibadan", "Port Harcourt", "Benin City", "Kaduna", "Enugu",
+          "Onitsha", "Aba", "Jos", "Ilorin", "Warri", "Owerri", "Calabar", "Uyo", "Akure", "Abeokuta"]
+PLATFORMS = ["WhatsApp", "Facebook", "Instagram", "Twitter", "Telegram", "TikTok", "Email", "SMS"]
+DOMAINS = ["example.com", "secure-bank-login.net", "free-airtime.ng", "promo-gift.xyz", "verify-bvn.com"]
+
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 3, 5, 7, 8, 9, 9, 9, 9, 8, 8, 8, 9, 10, 10, 8, 6, 4, 2]
+
+DESCRIPTIONS = [
+    "Received a link asking for my BVN",
+    "Account debited without authorization",
+    "Fake customer care line on social media",
+    "Someone is impersonating me",
+    "Suspicious attachment in email",
+    "Repeated threatening messages",
+    "Won a prize I never entered for",
+]
+
+assert set(CATEGORY_WEIGHTS) == set(INCIDENT_CATEGORIES.values())
+assert set(SEVERITY_WEIGHTS) == set(SEVERITY_LEVELS.values())
+
+
+def _zipf_weights(n, s=1.1):
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def _messy(rng, name):
+    """Real input is inconsistently cased and padded."""
+    roll = rng.random()
+    if roll < 0.1:
+        return name.lower()
+    if roll < 0.15:
+        return name.upper()
+    if roll < 0.2:
+        return name + " "
+    return name
+
+
+def _location(rng, kind, value):
+    if kind == 'city':
+        return _messy(rng, value)
+    if kind == 'platform':
+        return f"{value} @user{rng.randint(1, 5000)}" if rng.random() < 0.5 else _messy(rng, value)
+    return f"https://{value}/{rng.choice(['login', 'verify', 'claim', 'promo'])}" if rng.random() < 0.5 else value
+
+
+def generate(users, incidents, seed=42, days=365, end=None):
+    """Yield incident dicts (bulk-import shape); the same arguments give the same data."""
+    rng = random.Random(seed)
+    end = end or datetime(2025, 1, 1)
+
+    phones = [f"080{i:08d}" for i in range(users)]
+    phone_weights = list(itertools.accumulate(_zipf_weights(users, s=0.9)))
+
+    places = ([('city', c) for c in CITIES] + [('platform', p) for p in PLATFORMS]
+              + [('url', d) for d in DOMAINS])
+    rng.shuffle(places)
+    place_weights = list(itertools.accumulate(_zipf_weights(len(places))))
+
+    categories, cat_w = zip(*CATEGORY_WEIGHTS.items())
+    cat_w = list(itertools.accumulate(cat_w))
+    severities, sev_w = zip(*SEVERITY_WEIGHTS.items())
+    sev_w = list(itertools.accumulate(sev_w))
+    hour_w = list(itertools.accumulate(HOUR_WEIGHTS))
+
+    for _ in range(incidents):
+        # Volume grows towards the end of the window: more recent days are likelier
+        day = int(days * (rng.random() ** 0.5))
+        hour = rng.choices(range(24), cum_weights=hour_w)[0]
+        created_at = (end - timedelta(days=days - day)).replace(hour=hour) + timedelta(seconds=rng.randrange(3600))
+        kind, value = rng.choices(places, cum_weights=place_weights)[0]
+        yield {
+            "phone_number": rng.choices(phones, cum_weights=phone_weights)[0],
+            "category": rng.choices(categories, cum_weights=cat_w)[0],
+            "location": _location(rng, kind, value),
+            "severity": rng.choices(severities, cum_weights=sev_w)[0],
+            "description": rng.choice(DESCRIPTIONS),
+            "created_at": created_at.isoformat(timespec='seconds'),
+        }
+
+
+def csv_lines(records):
+    """Render records as CSV lines (header first), suitable for import_incidents()."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=FIELDS)
+    writer.writeheader()
+    yield buf.getvalue()
+    buf.seek(0)
+    buf.truncate()
+    for record in records:
+        writer.writerow(record)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+
+
+def load(users, incidents, seed=42, days=365, progress=None):
+    """Load a synthetic dataset into the app's database (inside an app context)."""
+    from models.bulk_import import import_incidents
+    return import_incidents(csv_lines(generate(users, incidents, seed, days)), fmt='csv', progress=progress)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--incidents', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--out', help="write CSV here ('-' for stdout)")
+    parser.add_argument('--load', action='store_true', help="bulk-load into DATABASE_URL")
+    args = parser.parse_args()
+
+    if args.load:
+        from app import app
+        with app.app_context():
+            result = load(args.users, args.incidents, args.seed, args.days,
+                          progress=lambda r: print(f"  {r.inserted:,} inserted", file=sys.stderr))
+        print(f"Loaded {result.inserted:,} incidents, {result.users_created:,} users, {result.error_count} errors")
+        return
+
+    out = sys.stdout if args.out in (None, '-') else open(args.out, 'w', newline='')
+    with out:
+        out.writelines(csv_lines(generate(args.users, args.incidents, args.seed, args.days)))
+
+
+if __name__ == '__main__':
+    main()
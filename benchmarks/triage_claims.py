@@ -0,0 +1,119 @@
+# benchmarks/triage_claims.py
+"""
+Many admins claiming triage batches at once (models/triage.py).
+
+    python -m benchmarks.triage_claims --incidents 20000 --admins 32 --batch 10
+    python -m benchmarks.triage_claims --db postgresql://localhost/incidents_bench
+
+Loads a synthetic dataset, then runs one thread per admin, each claiming
+batches until the queue is empty. Every incident must be claimed exactly once:
+the run fails if any id is handed out twice or left behind. Reports claim
+throughput and latency, then the plan the database uses for the claim query
+(it should read the open-incidents partial index, not scan the table).
+The tables in --db are dropped and recreated, so never point this at real data.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+
+def run(args):
+    os.environ['DATABASE_URL'] = args.db or f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_triage.db')}"
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench')
+    os.environ.setdefault('USSD_SHORTCODE', '*000#')
+
+    from sqlalchemy import select, func, text
+    from sqlalchemy.exc import OperationalError
+    from app import app
+    from models.database import db, Admin, Incident
+    from models.locations import resolver
+    from models.triage import claim_batch, OPEN
+    from benchmarks.synthetic import load
+
+    with app.app_context():
+        db.drop_all(bind_key=None)
+        db.create_all(bind_key=None)
+        resolver.reset()
+        load(max(1, args.incidents // 20), args.incidents)
+        admins = [Admin(email=f"triage{i}@example.com") for i in range(args.admins)]
+        db.session.add_all(admins)
+        db.session.commit()
+        admin_ids = [a.id for a in admins]
+
+    claimed = []          # (admin index, incident id)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start = threading.Barrier(args.admins)
+
+    def admin_loop(index, admin_id):
+        mine, timings = [], []
+        with app.app_context():
+            start.wait()
+            while True:
+                started = time.perf_counter()
+                try:
+                    rows = claim_batch(admin_id, args.batch)
+                except OperationalError:
+                    # SQLite: the write lock stayed busy past its timeout
+                    db.session.rollback()
+                    with lock:
+                        errors[0] += 1
+                    continue
+                timings.append(time.perf_counter() - started)
+                if not rows:
+                    break
+                mine.extend((index, row.id) for row in rows)
+            db.session.remove()
+        with lock:
+            claimed.extend(mine)
+            latencies.extend(timings)
+
+    threads = [threading.Thread(target=admin_loop, args=(i, a)) for i, a in enumerate(admin_ids)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        left = db.session.scalar(select(func.count(Incident.id)).where(Incident.status == OPEN))
+        dialect = db.engine.dialect.name
+        sql = ("SELECT id FROM incident WHERE status = 'open' "
+               f"ORDER BY priority, created_at LIMIT {args.batch}")
+        explain = "EXPLAIN QUERY PLAN " if dialect == 'sqlite' else "EXPLAIN "
+        plan = [' '.join(str(c) for c in row) for row in db.session.execute(text(explain + sql))]
+
+    ids = [incident_id for _, incident_id in claimed]
+    duplicates = len(ids) - len(set(ids))
+    per_admin = sorted(sum(1 for a, _ in claimed if a == i) for i in range(args.admins))
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2) if latencies else 0
+
+    print(f"{dialect}: {args.admins} admins claimed {len(ids):,}/{args.incidents:,} incidents "
+          f"in {elapsed:.2f}s ({len(ids) / elapsed:,.0f}/s)")
+    print(f"  claim latency p50 {pct(0.5)} ms, p99 {pct(0.99)} ms; lock timeouts {errors[0]}")
+    print(f"  per admin: min {per_admin[0]:,}, max {per_admin[-1]:,}")
+    print(f"  duplicates {duplicates}, left open {left}")
+    print("  claim plan: " + " | ".join(plan))
+    if duplicates or left:
+        sys.exit("FAILED: incidents were double-claimed or left behind")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--incidents', type=int, default=20000)
+    parser.add_argument('--admins', type=int, default=32, help="concurrent claimers")
+    parser.add_argument('--batch', type=int, default=10, help="incidents per claim")
+    parser.add_argument('--db', help="database URL (default: a fresh temp SQLite file)")
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+# benchmarks/ussd_affinity.py
+"""
+Session affinity through the USSD router (ussd/router.py).
+
+    python -m benchmarks.ussd_affinity --nodes 3 --sessions 600
+
+First measures the hash ring alone: how evenly session ids spread, and how many
+move when a node joins or leaves, against plain `hash % N` placement. Then
+starts --nodes local instances of the async endpoint (uvicorn ussd.asgi:app)
+on one fresh database with the router in front, and runs full report flows
+through it (benchmarks/ussd_load.py): every flow must complete, which only
+happens if each keypress reaches the node holding its session. One node is
+then stopped and the flows are run again; the router should route around it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import Counter
+
+from services.hashring import HashRing, _hash
+from benchmarks.ussd_load import run_load, _free_port, _wait_for
+
+
+def ring_stats(nodes, keys, vnodes):
+    names = [f"http://127.0.0.1:{8001 + i}" for i in range(nodes)]
+    ring = HashRing(names, vnodes=vnodes)
+    before = {k: ring.node_for(k) for k in keys}
+    load = Counter(before.values())
+
+    joined = HashRing(names + [f"http://127.0.0.1:{8001 + nodes}"], vnodes=vnodes)
+    left = HashRing(names[1:], vnodes=vnodes)
+    down = HashRing(names, vnodes=vnodes)
+    down.mark_down(names[0])
+
+    def moved(other):
+        return round(100 * sum(1 for k in keys if other.node_for(k) != before[k]) / len(keys), 1)
+
+    def modulo_moved(n_after):
+        return round(100 * sum(1 for k in keys if _hash(k) % nodes != _hash(k) % n_after) / len(keys), 1)
+
+    return {
+        "nodes": nodes,
+        "max_over_mean": round(max(load.values()) / (len(keys) / nodes), 3),
+        "join_moved_pct": moved(joined),
+        "join_ideal_pct": round(100 / (nodes + 1), 1),
+        "join_modulo_pct": modulo_moved(nodes + 1),
+        "leave_moved_pct": moved(left),
+        "leave_ideal_pct": round(100 / nodes, 1),
+        "leave_modulo_pct": modulo_moved(nodes - 1),
+        "down_moved_pct": moved(down),
+    }
+
+
+def _get_json(url):
+    with urllib.request.urlopen(url, timeout=5) as resp:
+        return json.loads(resp.read())
+
+
+def live(args):
+    env = dict(os.environ)
+    env['DATABASE_URL'] = args.db or f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_ussd_affinity.db')}"
+    env.setdefault('JWT_SECRET_KEY', 'bench')
+    env.setdefault('USSD_SHORTCODE', '*000#')
+    env['AUTO_CREATE_SCHEMA'] = 'false'
+    if not args.db:
+        path = env['DATABASE_URL'][len('sqlite:///'):]
+        if os.path.exists(path):
+            os.remove(path)
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'create-db'], env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+    procs = []
+
+    def start(cmd, port, extra_env=None):
+        proc = subprocess.Popen(cmd, env=dict(env, **(extra_env or {})), stdout=subprocess.DEVNULL)
+        procs.append(proc)
+        _wait_for(port, proc)
+        return proc
+
+    try:
+        node_ports = [_free_port() for _ in range(args.nodes)]
+        nodes = [start([sys.executable, '-m', 'uvicorn', 'ussd.asgi:app', '--port', str(port),
+                        '--log-level', 'warning', '--no-access-log'], port) for port in node_ports]
+        router_port = _free_port()
+        start([sys.executable, '-m', 'uvicorn', 'ussd.router:app', '--port', str(router_port),
+               '--log-level', 'warning', '--no-access-log', '--backlog', '4096'], router_port,
+              {'USSD_ROUTER_NODES': ','.join(f"http://127.0.0.1:{p}" for p in node_ports),
+               'USSD_ROUTER_CHECK_SECONDS': '1'})
+        url = f"http://127.0.0.1:{router_port}"
+
+        results = {}
+        results["all_up"] = asyncio.run(run_load(f"{url}/ussd", args.sessions, args.concurrency, args.think))
+        nodes[0].terminate()
+        nodes[0].wait(timeout=30)
+        time.sleep(2)   # let a health check notice
+        print(f"  stopped node :{node_ports[0]}; router sees "
+              f"{sum(n['up'] for n in _get_json(f'{url}/router/nodes')['nodes'])}/{args.nodes} up", file=sys.stderr)
+        results["one_down"] = asyncio.run(run_load(f"{url}/ussd", args.sessions, args.concurrency, args.think))
+        return results
+    finally:
+        for proc in reversed(procs):   # router first
+            proc.terminate()
+        for proc in procs:
+            proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=3, help="local app instances behind the router")
+    parser.add_argument('--sessions', type=int, default=600, help="full report flows per phase")
+    parser.add_argument('--concurrency', type=int, default=100, help="simultaneous gateway connections")
+    parser.add_argument('--think', type=float, default=0.0, help="mean seconds between steps of a session")
+    parser.add_argument('--keys', type=int, default=100000, help="session ids for the ring statistics")
+    parser.add_argument('--vnodes', type=int, default=160)
+    parser.add_argument('--db', help="database URL (default: a fresh temp SQLite file)")
+    parser.add_argument('--ring-only', action='store_true', help="skip the live instances")
+    args = parser.parse_args()
+
+    keys = [f"ATUid_{i:012x}" for i in range(args.keys)]
+    stats = [ring_stats(n, keys, args.vnodes) for n in sorted({2, 3, args.nodes, 8})]
+    columns = tuple(stats[0])
+    print(" ".join(f"{c:>16}" for c in columns))
+    for row in stats:
+        print(" ".join(f"{row[c]:>16}" for c in columns))
+    if args.ring_only:
+        return
+
+    results = live(args)
+    columns = ("requests", "rps", "p50_ms", "p99_ms", "errors", "completed")
+    print()
+    print(f"{'phase':<9} " + " ".join(f"{c:>10}" for c in columns))
+    for name, r in results.items():
+        print(f"{name:<9} " + " ".join(f"{r[c]:>10}" for c in columns))
+
+
+if __name__ == '__main__':
+    main()
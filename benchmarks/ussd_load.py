@@ -0,0 +1,226 @@
+# benchmarks/ussd_load.py
+"""
+Local load generator for the USSD endpoint: many concurrent gateway
+connections, each walking subscribers through the full report flow
+(dial, menu, category, location, severity, description, submit).
+
+    python -m benchmarks.ussd_load --url http://127.0.0.1:8001/ussd --sessions 2000 --concurrency 1000
+    python -m benchmarks.ussd_load --compare --sessions 2000 --concurrency 1000
+
+--compare starts the sync deployment (gunicorn app:app with gunicorn.conf.py)
+and the async one (uvicorn ussd.asgi:app, one process) against the same fresh
+database and runs the identical load against each. --think adds a per-step
+delay, like a subscriber typing, which is what keeps requests in flight.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+STEPS = ('', '1', '5', None, '3', 'Link asking for my BVN', '1')
+LOCATIONS = ('Lagos', 'lagos ', 'Abuja', 'Twitter @scammer', 'https://free-airtime.ng/claim', 'Kano')
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.completed = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection, reopened when the server closes it."""
+
+    def __init__(self, host, port, path):
+        self.host, self.port, self.path = host, port, path
+        self.reader = self.writer = None
+
+    async def post(self, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write((f"POST {self.path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                           f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body)
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("server closed the connection")
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        data = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return int(status_line.split()[1]), data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def _gateway(url, sessions, stats, think, timeout, run_id):
+    parts = urlsplit(url)
+    conn = Connection(parts.hostname, parts.port or 80, parts.path or '/ussd')
+    rng = random.Random()
+    while True:
+        try:
+            index = next(sessions)
+        except StopIteration:
+            break
+        session_id = f"load-{run_id}-{index}"
+        phone = f"0809{index:07d}"
+        for step in STEPS:
+            text = rng.choice(LOCATIONS) if step is None else step
+            body = json.dumps({'sessionId': session_id, 'phoneNumber': phone, 'text': text}).encode()
+            if think:
+                await asyncio.sleep(rng.uniform(0, 2 * think))
+            stats.in_flight += 1
+            stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+            started = time.perf_counter()
+            try:
+                status, data = await asyncio.wait_for(conn.post(body), timeout)
+                ok = status == 200 and 'raw_response' in json.loads(data)
+            except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                conn.close()
+                ok = False
+                data = b''
+            finally:
+                stats.in_flight -= 1
+            stats.latencies.append(time.perf_counter() - started)
+            if not ok:
+                stats.errors += 1
+                break
+        else:
+            if b'reported successfully' in data:
+                stats.completed += 1
+    conn.close()
+
+
+async def run_load(url, sessions, concurrency, think=0.0, timeout=30.0):
+    stats = Stats()
+    counter = iter(range(sessions))
+    run_id = f"{os.getpid()}-{int(time.time())}"
+    started = time.perf_counter()
+    await asyncio.gather(*(_gateway(url, counter, stats, think, timeout, run_id) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    lat = sorted(stats.latencies) or [0.0]
+
+    def pct(p):
+        return round(lat[min(len(lat) - 1, int(len(lat) * p))] * 1000, 1)
+    return {
+        "requests": len(stats.latencies),
+        "seconds": round(elapsed, 2),
+        "rps": round(len(stats.latencies) / elapsed, 1) if elapsed else 0,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "errors": stats.errors,
+        "completed": stats.completed,
+        "peak_in_flight": stats.peak_in_flight,
+    }
+
+
+# --- --compare ------------------------------------------------------------------------
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(port, proc, seconds=30):
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"server exited with {proc.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    sys.exit(f"server on port {port} did not start")
+
+
+def _servers(args):
+    sync_port, async_port = _free_port(), _free_port()
+    return {
+        "sync": (sync_port, [sys.executable, '-m', 'gunicorn', 'app:app', '-c', 'gunicorn.conf.py',
+                             '--bind', f'127.0.0.1:{sync_port}', '--workers', str(args.sync_workers),
+                             '--threads', str(args.sync_threads), '--log-level', 'warning']),
+        "async": (async_port, [sys.executable, '-m', 'uvicorn', 'ussd.asgi:app', '--port', str(async_port),
+                               '--workers', str(args.async_workers), '--log-level', 'warning',
+                               '--no-access-log', '--backlog', '4096']),
+    }
+
+
+def compare(args):
+    env = dict(os.environ)
+    env['DATABASE_URL'] = args.db or f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_ussd_load.db')}"
+    env.setdefault('JWT_SECRET_KEY', 'bench')
+    env.setdefault('USSD_SHORTCODE', '*000#')
+    env['AUTO_CREATE_SCHEMA'] = 'false'
+    if not args.db:
+        path = env['DATABASE_URL'][len('sqlite:///'):]
+        if os.path.exists(path):
+            os.remove(path)
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'create-db'], env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+    results = {}
+    for name, (port, cmd) in _servers(args).items():
+        proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL)
+        try:
+            _wait_for(port, proc)
+            print(f"  {name}: {' '.join(cmd[2:4])} on :{port}", file=sys.stderr)
+            results[name] = asyncio.run(run_load(f"http://127.0.0.1:{port}/ussd", args.sessions,
+                                                 args.concurrency, args.think, args.timeout))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    columns = ("requests", "seconds", "rps", "p50_ms", "p95_ms", "p99_ms", "errors", "completed", "peak_in_flight")
+    print(f"{'mode':<6} " + " ".join(f"{c:>14}" for c in columns))
+    for name, r in results.items():
+        print(f"{name:<6} " + " ".join(f"{r[c]:>14}" for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help="USSD endpoint to load, e.g. http://127.0.0.1:8001/ussd")
+    parser.add_argument('--compare', action='store_true', help="start sync and async servers and compare")
+    parser.add_argument('--sessions', type=int, default=1000, help="full report flows to run")
+    parser.add_argument('--concurrency', type=int, default=200, help="simultaneous gateway connections")
+    parser.add_argument('--think', type=float, default=0.0, help="mean seconds between steps of a session")
+    parser.add_argument('--timeout', type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument('--db', help="database URL for --compare (default: a fresh temp SQLite file)")
+    parser.add_argument('--sync-workers', type=int, default=2)
+    parser.add_argument('--sync-threads', type=int, default=4)
+    parser.add_argument('--async-workers', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args)
+    elif args.url:
+        print(json.dumps(asyncio.run(run_load(args.url, args.sessions, args.concurrency, args.think, args.timeout)),
+                         indent=2))
+    else:
+        parser.error("pass --url or --compare")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+# benchmarks/ussd_sessions.py
+"""
+Memory held by live USSD sessions, compact USSDSession against the previous
+layout (a __dict__ object with datetimes, an incident_data dict and a
+replay_cache entry holding the full JSON payload).
+
+    python -m benchmarks.ussd_sessions --sessions 100000,1000000
+
+Sessions are spread over the flow's states like a campaign peak: most are in a
+menu, some part-way through a report with free-text fields filled in. Input
+strings (ids, numbers, typed text) are built before measuring, since both
+layouts hold the same ones; what is measured is everything the store adds.
+Also reports the encoded size and encode/decode rate, and the per-request cost
+of the old handler's replay_cache copy at that size.
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from datetime import datetime
+
+from ussd.ussd_flow import USSDSession, SessionState, INCIDENT_CATEGORIES, SEVERITY_LEVELS
+
+CATEGORIES = tuple(INCIDENT_CATEGORIES.values())
+SEVERITIES = tuple(SEVERITY_LEVELS.values())
+LOCATIONS = ('Lagos', 'Abuja', 'Twitter @scammer', 'https://free-airtime.ng/claim', 'Kano', 'WhatsApp group')
+MENU = "CON Cyber Incident Reporting:\n1. Report New Incident\n2. View Previous Reports\n3. Help\n0. Exit"
+
+
+class LegacySession:
+    """The session layout before USSDSession was slotted (kept here as the baseline)."""
+
+    def __init__(self, session_id, phone_number):
+        self.session_id = session_id
+        self.phone_number = phone_number
+        self.state = "INITIAL"
+        self.incident_data = {}
+        self.created_at = datetime.utcnow()
+        self.last_active = datetime.utcnow()
+
+
+def _inputs(count, seed=7):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        state = rng.choice((SessionState.MAIN_MENU, SessionState.MAIN_MENU, SessionState.CATEGORY_SELECT,
+                            SessionState.LOCATION_INPUT, SessionState.SEVERITY_SELECT,
+                            SessionState.DESCRIPTION_INPUT, SessionState.CONFIRMATION))
+        location = f"{rng.choice(LOCATIONS)} {i % 97}" if state >= SessionState.SEVERITY_SELECT else ''
+        description = f"Link asking for my BVN, ref {i}" if state >= SessionState.CONFIRMATION else ''
+        response = f"CON Confirm submission:\n{description}\n1. Submit\n2. Cancel" if description else MENU
+        rows.append((f"ATUid_{i:012x}", f"+23480{i:08d}", state, rng.choice(CATEGORIES),
+                     location, rng.choice(SEVERITIES), description, response))
+    return rows
+
+
+def _legacy(rows):
+    sessions, replay_cache = {}, {}
+    for sid, phone, state, category, location, severity, description, response in rows:
+        s = LegacySession(sid, phone)
+        s.state = state.name
+        if state >= SessionState.LOCATION_INPUT:
+            s.incident_data['category'] = category
+        if location:
+            s.incident_data['location'] = location
+        if state >= SessionState.DESCRIPTION_INPUT:
+            s.incident_data['severity'] = severity
+        if description:
+            s.incident_data['description'] = description
+        sessions[sid] = s
+        payload = {"sessionID": sid, "userID": sid, "msisdn": phone, "message": response[4:],
+                   "continueSession": True, "raw_response": response}
+        replay_cache[sid] = (payload, time.time())
+    return sessions, replay_cache
+
+
+def _compact(rows):
+    sessions = {}
+    for sid, phone, state, category, location, severity, description, response in rows:
+        s = USSDSession(sid, phone)
+        s.state = state
+        if state >= SessionState.LOCATION_INPUT:
+            s.category = category
+        s.location = location
+        if state >= SessionState.DESCRIPTION_INPUT:
+            s.severity = severity
+        s.description = description
+        s.last_response = response
+        sessions[sid] = s
+    return sessions
+
+
+def _measure(build, rows):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    held = build(rows)
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return held, current, elapsed
+
+
+def run(count):
+    rows = _inputs(count)
+    result = {"sessions": count}
+
+    (sessions, replay_cache), legacy_bytes, _ = _measure(_legacy, rows)
+    started = time.perf_counter()
+    {k: v[0] for k, v in replay_cache.items()}
+    result["legacy_copy_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    del sessions, replay_cache
+    gc.collect()
+
+    sessions, compact_bytes, _ = _measure(_compact, rows)
+    result["legacy_mb"] = round(legacy_bytes / 2 ** 20, 1)
+    result["compact_mb"] = round(compact_bytes / 2 ** 20, 1)
+    result["legacy_b_per"] = legacy_bytes // count
+    result["compact_b_per"] = compact_bytes // count
+
+    values = list(sessions.values())
+    started = time.perf_counter()
+    encoded = [s.encode() for s in values]
+    encode_s = time.perf_counter() - started
+    started = time.perf_counter()
+    for data in encoded:
+        USSDSession.decode(data)
+    decode_s = time.perf_counter() - started
+    result["encoded_b_per"] = sum(map(len, encoded)) // count
+    result["encode_k_per_s"] = round(count / encode_s / 1000, 1)
+    result["decode_k_per_s"] = round(count / decode_s / 1000, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', default='100000,1000000', help="comma-separated session counts")
+    args = parser.parse_args()
+
+    columns = ("sessions", "legacy_mb", "compact_mb", "legacy_b_per", "compact_b_per", "encoded_b_per",
+               "encode_k_per_s", "decode_k_per_s", "legacy_copy_ms")
+    print(" ".join(f"{c:>14}" for c in columns))
+    for count in (int(n) for n in args.sessions.split(',')):
+        r = run(count)
+        print(" ".join(f"{r[c]:>14}" for c in columns))
+
+
+if __name__ == '__main__':
+    main()
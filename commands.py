@@ -0,0 +1,131 @@
+# commands.py
+import time
+import click
+from models.database import create_schema
+from models.bulk_import import import_incidents, BATCH_SIZE
+from models.database import db
+from models.partitioning import convert_to_partitioned, ensure_partitions, archive_old_incidents
+from models.locations import resolver, backfill_locations, ensure_location_column
+from models.triage import ensure_triage_columns
+
+
+def register_commands(app):
+
+    @app.cli.command("create-db")
+    def create_db():
+        """Create missing tables on the primary database."""
+        create_schema(app)
+        click.echo("Created tables from models")
+
+    @app.cli.command("partition-incidents")
+    @click.option("--months-ahead", default=3, show_default=True)
+    def partition_incidents(months_ahead):
+        """Convert the incident table to monthly partitions (PostgreSQL, one-off)."""
+        with app.app_context():
+            try:
+                changed = convert_to_partitioned(months_ahead)
+            except RuntimeError as e:
+                raise click.ClickException(str(e))
+        click.echo("Partitioned incident table" if changed else "incident is already partitioned")
+
+    @app.cli.command("ensure-partitions")
+    @click.option("--months-ahead", default=3, show_default=True)
+    def ensure_partitions_command(months_ahead):
+        """Create upcoming monthly partitions (run from cron)."""
+        from datetime import datetime
+        with app.app_context(), db.engine.begin() as conn:
+            created = ensure_partitions(conn, datetime.utcnow(), months_ahead)
+        click.echo(f"Created: {', '.join(created)}" if created else "Partitions up to date")
+
+    @app.cli.command("archive-incidents")
+    @click.option("--retention-months", type=int, default=None,
+                  help="Defaults to INCIDENT_RETENTION_MONTHS.")
+    def archive_incidents(retention_months):
+        """Move months older than the retention window to compressed archive files."""
+        with app.app_context():
+            archived = archive_old_incidents(retention_months)
+        for month, count in archived:
+            click.echo(f"{month:%Y-%m}: {count:,} incidents archived")
+        if not archived:
+            click.echo("Nothing to archive")
+
+    @app.cli.command("purge-submission-keys")
+    @click.option("--hours", default=24, show_default=True)
+    def purge_submission_keys(hours):
+        """Delete USSD idempotency keys older than --hours (retries only arrive within minutes)."""
+        from datetime import datetime, timedelta
+        from models.database import SubmissionKey
+        with app.app_context():
+            deleted = SubmissionKey.query.filter(
+                SubmissionKey.created_at < datetime.utcnow() - timedelta(hours=hours)).delete()
+            db.session.commit()
+        click.echo(f"Deleted {deleted} submission keys")
+
+    @app.cli.command("backfill-locations")
+    def backfill_locations_command():
+        """Add incident.location_id if missing and link unlinked incidents to canonical locations."""
+        with app.app_context():
+            spellings, updated = backfill_locations(
+                progress=lambda n: click.echo(f"  {n:,} incidents linked"))
+        click.echo(f"Linked {updated:,} incidents ({spellings:,} distinct spellings)")
+
+    @app.cli.command("location-alias")
+    @click.argument("alias")
+    @click.argument("name")
+    def location_alias(alias, name):
+        """Resolve ALIAS to the existing location NAME (merging what ALIAS resolved to before)."""
+        with app.app_context():
+            ensure_location_column()
+            location_id = resolver.resolve(name, create=False)
+            if location_id is None:
+                raise click.ClickException(f"No location matches {name!r}")
+            try:
+                moved = resolver.add_alias(alias, location_id)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+            click.echo(f"{alias!r} -> {resolver.name_of(location_id)} ({moved:,} incidents moved)")
+
+    @app.cli.command("add-triage-columns")
+    @click.option("--close-existing", is_flag=True,
+                  help="Mark incidents already in the table as resolved instead of queueing them.")
+    def add_triage_columns(close_existing):
+        """Add the triage columns (status, priority, assignee) and their partial indexes if missing."""
+        with app.app_context():
+            changed = ensure_triage_columns(close_existing)
+        click.echo("Added triage columns" if changed else "Triage columns already present")
+
+    @app.cli.command("replay-spool")
+    def replay_spool():
+        """Persist USSD submissions spooled while the database was unavailable."""
+        from ussd.spool import replay, REJECTED_FILE
+        with app.app_context():
+            counts = replay()
+        click.echo(f"Replayed {counts['inserted']:,} spooled submissions "
+                   f"({counts['duplicate']:,} were already saved)")
+        if counts['rejected']:
+            click.echo(f"{counts['rejected']:,} malformed records were set aside in {REJECTED_FILE}", err=True)
+
+    @app.cli.command("import-incidents")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), default=None,
+                  help="Defaults to the file extension (.ndjson/.jsonl, otherwise csv).")
+    @click.option("--batch-size", default=BATCH_SIZE, show_default=True)
+    def import_incidents_command(path, fmt, batch_size):
+        """Bulk-load incidents from a CSV or NDJSON file."""
+        fmt = fmt or ("ndjson" if path.lower().endswith((".ndjson", ".jsonl")) else "csv")
+        started = time.perf_counter()
+
+        def progress(result):
+            elapsed = time.perf_counter() - started
+            click.echo(f"  {result.processed:,} rows read, {result.inserted:,} inserted, "
+                       f"{result.error_count:,} errors ({result.inserted / max(elapsed, 1e-9):,.0f} rows/s)")
+
+        with app.app_context(), open(path, encoding="utf-8-sig", newline="") as stream:
+            result = import_incidents(stream, fmt=fmt, batch_size=batch_size, progress=progress)
+
+        for line, msg in result.errors:
+            click.echo(f"line {line}: {msg}", err=True)
+        if result.error_count > len(result.errors):
+            click.echo(f"... {result.error_count - len(result.errors)} more errors", err=True)
+        click.echo(f"Imported {result.inserted:,} incidents ({result.users_created:,} new users) "
+                   f"in {time.perf_counter() - started:.1f}s")
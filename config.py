@@ -1,10 +1,13 @@
 # config.py
 from decouple import config
 from datetime import timedelta
+from services.metrics import TimedQueuePool
 
 
-def _get_db_uri():
-    uri = config('DATABASE_URL')
+def _get_db_uri(name='DATABASE_URL', default=None):
+    uri = config(name) if default is None else config(name, default=default)
+    if not uri:
+        return uri
     if uri.startswith('postgres://'):
         uri = uri.replace('postgres://', 'postgresql://', 1)
     if 'sslmode' not in uri:
@@ -24,10 +27,85 @@ class Config:
     USSD_SHORTCODE = config('USSD_SHORTCODE')
     MAX_SESSION_MINUTES = config('MAX_SESSION_MINUTES', default=5, cast=int)
 
+    # Run create_all() on startup (development convenience). Production runs `flask create-db`.
+    AUTO_CREATE_SCHEMA = config('AUTO_CREATE_SCHEMA', default=False, cast=bool)
+
+    # Monthly partitions older than the retention window move to ARCHIVE_DIR
+    INCIDENT_RETENTION_MONTHS = config('INCIDENT_RETENTION_MONTHS', default=12, cast=int)
+    ARCHIVE_DIR = config('ARCHIVE_DIR', default='archive')
+
+    # Dashboard live feed (/api/dashboard/stream)
+    STREAM_POLL_SECONDS = config('STREAM_POLL_SECONDS', default=5, cast=int)
+    STREAM_CLIENT_BUFFER = config('STREAM_CLIENT_BUFFER', default=100, cast=int)
+    STREAM_HISTORY_SIZE = config('STREAM_HISTORY_SIZE', default=500, cast=int)
+    STREAM_KEEPALIVE_SECONDS = config('STREAM_KEEPALIVE_SECONDS', default=15, cast=int)
+    # The stats counters are bumped per incident and recounted this often
+    STREAM_STATS_SECONDS = config('STREAM_STATS_SECONDS', default=300, cast=int)
+
     # Connection pool health
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
         'pool_recycle': 300,
         'pool_size': 5,
-        'max_overflow': 10
-    }
\ No newline at end of file
+        'max_overflow': 10,
+        'poolclass': TimedQueuePool
+    }
+
+    # Optional read replica for read-only admin queries (see models/routing.py).
+    # Locally, point DATABASE_REPLICA_URL at a second database instance.
+    SQLALCHEMY_REPLICA_URI = _get_db_uri('DATABASE_REPLICA_URL', default='')
+    SQLALCHEMY_BINDS = {
+        'replica': {
+            'url': SQLALCHEMY_REPLICA_URI,
+            'pool_pre_ping': True,
+            'pool_recycle': 300,
+            'pool_size': config('REPLICA_POOL_SIZE', default=5, cast=int),
+            'max_overflow': config('REPLICA_MAX_OVERFLOW', default=10, cast=int),
+            'poolclass': TimedQueuePool
+        }
+    } if SQLALCHEMY_REPLICA_URI else {}
+    REPLICA_MAX_LAG_SECONDS = config('REPLICA_MAX_LAG_SECONDS', default=10, cast=int)
+    REPLICA_HEALTH_SECONDS = config('REPLICA_HEALTH_SECONDS', default=5, cast=int)
+    REPLICA_RETRY_SECONDS = config('REPLICA_RETRY_SECONDS', default=30, cast=int)
+
+    # Async USSD serving mode (ussd/asgi.py); the URL defaults to DATABASE_URL with an async driver
+    USSD_ASYNC_DATABASE_URL = config('USSD_ASYNC_DATABASE_URL', default='')
+    USSD_ASYNC_POOL_SIZE = config('USSD_ASYNC_POOL_SIZE', default=20, cast=int)
+    USSD_ASYNC_MAX_OVERFLOW = config('USSD_ASYNC_MAX_OVERFLOW', default=30, cast=int)
+
+    # USSD latency budget: database work on /ussd that would overrun it is answered
+    # degraded (submissions spooled to USSD_SPOOL_DIR) and trips the breaker
+    USSD_DEADLINE_SECONDS = config('USSD_DEADLINE_SECONDS', default=3.0, cast=float)
+    USSD_DB_THREADS = config('USSD_DB_THREADS', default=4, cast=int)
+    USSD_SPOOL_DIR = config('USSD_SPOOL_DIR', default='spool')
+    DB_BREAKER_FAILURES = config('DB_BREAKER_FAILURES', default=3, cast=int)
+    DB_BREAKER_SLOW_SECONDS = config('DB_BREAKER_SLOW_SECONDS', default=1.0, cast=float)
+    DB_BREAKER_RESET_SECONDS = config('DB_BREAKER_RESET_SECONDS', default=30, cast=int)
+
+    # Triage work queue: claims not closed within this many minutes return to the queue
+    TRIAGE_CLAIM_MINUTES = config('TRIAGE_CLAIM_MINUTES', default=30, cast=int)
+
+    # POST /api/import runs in the request; larger files go through `flask import-incidents`
+    BULK_IMPORT_MAX_BYTES = config('BULK_IMPORT_MAX_BYTES', default=5 * 1024 * 1024, cast=int)
+
+    # Spike alerts: a category, severity or location whose count over the window
+    # is SPIKE_THRESHOLD deviations (and SPIKE_MIN_RATIO times) above its baseline.
+    # Detection keeps the stream poller running in every worker; False turns it off.
+    SPIKE_DETECTION = config('SPIKE_DETECTION', default=True, cast=bool)
+    SPIKE_WINDOW_MINUTES = config('SPIKE_WINDOW_MINUTES', default=15, cast=int)
+    SPIKE_BASELINE_HOURS = config('SPIKE_BASELINE_HOURS', default=24, cast=float)
+    SPIKE_HISTORY_HOURS = config('SPIKE_HISTORY_HOURS', default=48, cast=float)
+    SPIKE_THRESHOLD = config('SPIKE_THRESHOLD', default=5.0, cast=float)
+    SPIKE_MIN_COUNT = config('SPIKE_MIN_COUNT', default=10, cast=int)
+    SPIKE_MIN_RATIO = config('SPIKE_MIN_RATIO', default=3.0, cast=float)
+
+    # /metrics needs this bearer token; without one it is refused unless METRICS_PUBLIC is set
+    METRICS_TOKEN = config('METRICS_TOKEN', default='')
+    METRICS_PUBLIC = config('METRICS_PUBLIC', default=False, cast=bool)
+
+    # Opt-in profiling: admins send "X-Profile: 1", or sample a fraction of requests
+    PROFILE_SAMPLE_RATE = config('PROFILE_SAMPLE_RATE', default=0.0, cast=float)
+    PROFILE_DIR = config('PROFILE_DIR', default='profiles')
+    # Warn when one request runs the same statement with the same parameters this often
+    REPEATED_QUERY_THRESHOLD = config('REPEATED_QUERY_THRESHOLD', default=5, cast=int)
+    N_PLUS_ONE_THRESHOLD = config('N_PLUS_ONE_THRESHOLD', default=10, cast=int)
\ No newline at end of file
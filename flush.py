@@ -3,7 +3,7 @@ from app import app  # import the Flask app instance
 from models.database import db
 
 with app.app_context():
-    db.drop_all()
+    db.drop_all(bind_key=None)
     print("Dropped all tables")
-    db.create_all()
+    db.create_all(bind_key=None)
     print("Created tables from models")
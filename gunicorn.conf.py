@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+# Picked up automatically by `gunicorn app:app`. With preload_app the app (and
+# its imports) is loaded once in the master and shared copy-on-write by the
+# workers; connection pools must not be shared across the fork.
+# Not imported as `config`: gunicorn reads every module-level name as a setting
+from decouple import config as decouple_config
+
+bind = decouple_config('GUNICORN_BIND', default='0.0.0.0:8000')
+# A node behind the USSD router (ussd/router.py) keeps sessions in its own
+# memory, so it has to be a single process
+_ussd_router_node = decouple_config('USSD_ROUTER_NODE', default=False, cast=bool)
+workers = decouple_config('GUNICORN_WORKERS', default=1 if _ussd_router_node else 2, cast=int)
+threads = decouple_config('GUNICORN_THREADS', default=4, cast=int)
+preload_app = decouple_config('GUNICORN_PRELOAD', default=True, cast=bool)
+
+
+def on_starting(server):
+    # Checked here so `-w` on the command line is covered too
+    if _ussd_router_node and server.cfg.workers > 1:
+        raise RuntimeError(f"USSD_ROUTER_NODE is set but gunicorn would start {server.cfg.workers} workers; "
+                           "a USSD router node must run exactly one (its sessions live in worker memory)")
+
+
+def post_fork(server, worker):
+    from app import app
+    from models.database import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            # Drop pooled connections inherited from the master without closing
+            # them out from under it; each worker opens its own.
+            engine.dispose(close=False)
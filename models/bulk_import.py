@@ -0,0 +1,293 @@
+# models/bulk_import.py
+"""
+Bulk incident ingestion from CSV or NDJSON (partner hotlines, paper-form backfill).
+
+Rows are validated against the USSD menus, users are upserted by phone number,
+and incidents are inserted in batches using the fastest path the database
+offers: COPY on PostgreSQL, executemany everywhere else. A batch that fails
+(e.g. a duplicate reference) is retried row by row so each bad row is reported
+individually while the rest of the batch still lands. Locations are linked to
+the canonical location dimension once per distinct spelling in each batch.
+"""
+import csv
+import io
+import json
+import random
+import string
+import uuid
+from datetime import datetime, timezone
+from sqlalchemy import select, insert
+from sqlalchemy.exc import SQLAlchemyError
+from models.database import db, User, Incident, SEVERITY_PRIORITY
+from models.locations import resolver
+from ussd.ussd_flow import INCIDENT_CATEGORIES, SEVERITY_LEVELS
+
+BATCH_SIZE = 10000
+MAX_REPORTED_ERRORS = 1000
+
+INCIDENT_FIELDS = ('reference', 'category', 'location', 'location_id', 'severity', 'priority', 'description',
+                   'created_at', 'user_id')
+
+# Accept the menu number or the label, case-insensitively
+_CATEGORY_LOOKUP = {**{v.lower(): v for v in INCIDENT_CATEGORIES.values()}, **INCIDENT_CATEGORIES}
+_SEVERITY_LOOKUP = {**{v.lower(): v for v in SEVERITY_LEVELS.values()}, **SEVERITY_LEVELS}
+
+
+class ImportResult:
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.users_created = 0
+        self.error_count = 0
+        self.errors = []   # (line, message), capped at MAX_REPORTED_ERRORS
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def to_dict(self):
+        return {
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "users_created": self.users_created,
+            "error_count": self.error_count,
+            "errors": [{"line": line, "msg": msg} for line, msg in self.errors],
+        }
+
+
+def iter_records(stream, fmt):
+    """Yield (line_number, dict) from a text stream of CSV (with header) or NDJSON."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'ndjson':
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, ValueError(f"invalid JSON: {e}")
+                continue
+            yield line_no, record if isinstance(record, dict) else ValueError("expected a JSON object")
+    else:
+        raise ValueError(f"unsupported format: {fmt}")
+
+
+def _clean(record):
+    """Validate one input record. Returns (row, None) or (None, error message)."""
+    if isinstance(record, Exception):
+        return None, str(record)
+
+    def get(name):
+        value = record.get(name)
+        return str(value).strip() if value is not None else ''
+
+    phone = get('phone_number')
+    if not phone or len(phone) > 20:
+        return None, "phone_number is required (max 20 chars)"
+
+    category = _CATEGORY_LOOKUP.get(get('category').lower())
+    if not category:
+        return None, f"unknown category {get('category')!r}"
+
+    severity = _SEVERITY_LOOKUP.get(get('severity').lower())
+    if not severity:
+        return None, f"unknown severity {get('severity')!r}"
+
+    location = get('location')
+    if not location or len(location) > 100:
+        return None, "location is required (max 100 chars)"
+
+    reference = get('reference')
+    if len(reference) > 20:
+        return None, "reference longer than 20 chars"
+
+    created_at = None
+    if get('created_at'):
+        try:
+            created_at = datetime.fromisoformat(get('created_at').replace('Z', '+00:00'))
+        except ValueError:
+            return None, f"invalid created_at {get('created_at')!r}"
+        if created_at.tzinfo is not None:
+            # Stored as naive UTC, like every other writer
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return {
+        "phone_number": phone,
+        "reference": reference or None,
+        "category": category,
+        "location": location,
+        "severity": severity,
+        "description": get('description'),
+        "created_at": created_at,
+    }, None
+
+
+class _ReferenceGenerator:
+    """IMP-<run>-<seq>: unique within a run, random across runs, fits String(20)."""
+
+    def __init__(self):
+        self.prefix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+        self.seq = 0
+
+    def __call__(self):
+        self.seq += 1
+        return f"IMP-{self.prefix}-{_base36(self.seq).rjust(6, '0')}"
+
+
+def _base36(n):
+    digits = string.digits + string.ascii_uppercase
+    out = ''
+    while n:
+        n, r = divmod(n, 36)
+        out = digits[r] + out
+    return out or '0'
+
+
+def _upsert_users(phones, user_ids, result):
+    """Fill user_ids (phone -> id) for every phone, creating missing users."""
+    missing = [p for p in phones if p not in user_ids]
+    if not missing:
+        return
+    for chunk_start in range(0, len(missing), 1000):
+        chunk = missing[chunk_start:chunk_start + 1000]
+        rows = db.session.execute(select(User.phone_number, User.id).where(User.phone_number.in_(chunk)))
+        user_ids.update(rows.tuples().all())
+
+    new_users = [{"id": uuid.uuid4(), "phone_number": p, "created_at": datetime.utcnow()}
+                 for p in missing if p not in user_ids]
+    if not new_users:
+        return
+
+    dialect = db.engine.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = (dialect_insert(User.__table__)
+                .on_conflict_do_nothing(index_elements=['phone_number'])
+                .returning(User.phone_number, User.id))
+        created = db.session.execute(stmt, new_users).tuples().all()
+        user_ids.update(created)
+        # Phones another writer created meanwhile weren't returned; read their ids
+        raced = [u["phone_number"] for u in new_users if u["phone_number"] not in user_ids]
+        if raced:
+            rows = db.session.execute(select(User.phone_number, User.id).where(User.phone_number.in_(raced)))
+            user_ids.update(rows.tuples().all())
+    else:
+        db.session.execute(insert(User.__table__), new_users)
+        user_ids.update((u["phone_number"], u["id"]) for u in new_users)
+        created = new_users
+    # Users are committed on their own so a failed incident batch can't orphan ids in user_ids
+    db.session.commit()
+    result.users_created += len(created)
+
+
+def _copy_incidents(rows):
+    """PostgreSQL COPY ... FROM STDIN over the session's connection."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([
+            row["reference"], row["category"], row["location"], row["location_id"], row["severity"],
+            row["priority"], row["description"], row["created_at"].isoformat(sep=' '), str(row["user_id"]),
+        ])
+    buf.seek(0)
+    raw = db.session.connection().connection
+    with raw.cursor() as cursor:
+        # An unquoted empty CSV field is NULL to COPY; keep description '' as executemany does
+        cursor.copy_expert(
+            f"COPY incident ({', '.join(INCIDENT_FIELDS)}) FROM STDIN "
+            f"WITH (FORMAT csv, FORCE_NOT_NULL (description))", buf)
+
+
+def _insert_batch(batch, result):
+    """batch: list of (line, row). Commits on success, falls back to per-row on failure."""
+    rows = [row for _, row in batch]
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            _copy_incidents(rows)
+        else:
+            db.session.execute(insert(Incident.__table__), rows)
+        db.session.commit()
+        result.inserted += len(rows)
+        return
+    except Exception as e:
+        # Catch broadly: psycopg2 raises its own exception types from COPY
+        db.session.rollback()
+        batch_error = e
+
+    if len(batch) == 1:
+        result.add_error(batch[0][0], _first_line(batch_error))
+        return
+    for line, row in batch:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Incident.__table__), [row])
+            result.inserted += 1
+        except (SQLAlchemyError, ValueError, KeyError, TypeError) as e:
+            # Rejected rows are reported; only the rest of the batch is kept
+            result.add_error(line, _first_line(e))
+    db.session.commit()
+
+
+def _first_line(error):
+    message = str(getattr(error, 'orig', None) or error).strip()
+    return message.splitlines()[0] if message else type(error).__name__
+
+
+def import_incidents(stream, fmt='csv', batch_size=BATCH_SIZE, progress=None):
+    """
+    Import incidents from a text stream. Returns an ImportResult.
+    progress: optional callable(result) invoked after every batch.
+    """
+    result = ImportResult()
+    user_ids = {}
+    make_reference = _ReferenceGenerator()
+    pending = []
+
+    def flush():
+        location_ids = resolver.resolve_many(row["location"] for _, row in pending)
+        phones = list({row["phone_number"] for _, row in pending})
+        _upsert_users(phones, user_ids, result)
+        batch = []
+        now = datetime.utcnow()
+        for line, row in pending:
+            try:
+                batch.append((line, {
+                    "reference": row["reference"] or make_reference(),
+                    "category": row["category"],
+                    "location": row["location"],
+                    "location_id": location_ids[row["location"]],
+                    "severity": row["severity"],
+                    # Set here because COPY bypasses the column default
+                    "priority": SEVERITY_PRIORITY[row["severity"]],
+                    "description": row["description"],
+                    "created_at": row["created_at"] or now,
+                    "user_id": user_ids[row["phone_number"]],
+                }))
+            except (KeyError, ValueError, TypeError) as e:
+                result.add_error(line, f"could not prepare row: {e!r}")
+        if batch:
+            _insert_batch(batch, result)
+        pending.clear()
+        if progress:
+            progress(result)
+
+    for line, record in iter_records(stream, fmt):
+        result.processed += 1
+        row, error = _clean(record)
+        if error:
+            result.add_error(line, error)
+            continue
+        pending.append((line, row))
+        if len(pending) >= batch_size:
+            flush()
+
+    if pending:
+        flush()
+    return result
@@ -1,4 +1,5 @@
 import uuid
+from sqlalchemy import text
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
@@ -39,16 +40,68 @@ class Admin(db.Model):
         return f"<Admin {self.phone_number}>"
 
 
+# Canonical location / platform / domain that free-text locations resolve to
+class Location(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)    # place / platform / domain
+    name = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Set when merged into another location (flask location-alias). The row is
+    # kept so ids that running workers still have cached stay valid.
+    merged_into = db.Column(db.Integer, db.ForeignKey('location.id'))
+    merged_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.UniqueConstraint('kind', 'name'),)
+
+    def __repr__(self):
+        return f"<Location {self.kind}:{self.name}>"
+
+
+# Normalized spelling -> canonical location ("place:portharcourt", "platform:twitter")
+class LocationAlias(db.Model):
+    key = db.Column(db.String(120), primary_key=True)
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Triage priority by severity (1 is most urgent)
+SEVERITY_PRIORITY = {'Emergency': 1, 'High': 2, 'Medium': 3, 'Low': 4}
+DEFAULT_PRIORITY = 3
+
+# Claimable incidents / incidents being worked on; the partial indexes below
+# cover only these, so they stay small as closed incidents pile up
+TRIAGE_OPEN = text("status = 'open'")
+TRIAGE_IN_PROGRESS = text("status = 'in_progress'")
+
+
+def _priority_default(context):
+    return SEVERITY_PRIORITY.get(context.get_current_parameters().get('severity'), DEFAULT_PRIORITY)
+
+
 # Incident model
 class Incident(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     reference = db.Column(db.String(20), unique=True, nullable=False)
     category = db.Column(db.String(50), nullable=False)
     location = db.Column(db.String(100), nullable=False)
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'))
     severity = db.Column(db.String(20), nullable=False)
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.UUID(as_uuid=True), db.ForeignKey('user.id'), nullable=False)
+    # Triage (models/triage.py): open -> in_progress (claimed) -> resolved / dismissed
+    status = db.Column(db.String(20), nullable=False, default='open', server_default='open')
+    priority = db.Column(db.SmallInteger, nullable=False, default=_priority_default)
+    assignee_id = db.Column(UUID(as_uuid=True), db.ForeignKey('admin.id'))
+    claimed_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_incident_location_created', 'location_id', 'created_at'),
+        db.Index('ix_incident_triage_open', 'priority', 'created_at',
+                 postgresql_where=TRIAGE_OPEN, sqlite_where=TRIAGE_OPEN),
+        db.Index('ix_incident_triage_claimed', 'assignee_id', 'claimed_at',
+                 postgresql_where=TRIAGE_IN_PROGRESS, sqlite_where=TRIAGE_IN_PROGRESS),
+    )
     
     def summary(self):
         return (
@@ -60,6 +113,31 @@ class Incident(db.Model):
         )
 
 
+# Idempotency key for USSD submissions: one incident per gateway session.
+# Kept out of the incident table so it stays unique when incident is partitioned.
+class SubmissionKey(db.Model):
+    key = db.Column(db.String(128), primary_key=True)   # "<phone>:<session id>"
+    reference = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+# Incident rate spike found by services/spikes.py. Every worker runs a detector;
+# the unique key keeps one row (and one log line) per value per window.
+class SpikeAlert(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    dimension = db.Column(db.String(20), nullable=False)    # category / severity / location
+    series_key = db.Column(db.String(120), nullable=False)  # value, or location id
+    value = db.Column(db.String(100), nullable=False)
+    window_start = db.Column(db.DateTime, nullable=False)
+    window_minutes = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    expected = db.Column(db.Float, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    detected_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('dimension', 'series_key', 'window_start'),)
+
+
 # JWT Model
 class TokenBlocklist(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -70,5 +148,13 @@ class TokenBlocklist(db.Model):
 # Database initiator
 def init_db(app):
     db.init_app(app)
+    # Schema creation is an explicit step (`flask create-db` / setup_db.py) so
+    # workers and utility scripts don't run DDL checks at boot.
+    if app.config.get('AUTO_CREATE_SCHEMA'):
+        create_schema(app)
+
+
+def create_schema(app):
     with app.app_context():
-        db.create_all()
+        # The replica bind (if any) receives its schema through replication
+        db.create_all(bind_key=None)
@@ -0,0 +1,357 @@
+# models/locations.py
+"""
+Canonical location dimension for the free-text incident location.
+
+Subscribers type the same place many ways ("Lagos", "lagos ", "LAGOS",
+"Twitter @user", "https://example.com/login"). canonicalize() reduces an input
+to a match key and a display name:
+
+- URLs, bare domains and e-mail addresses become a `domain` (host without www.);
+  hosts of known social networks become that `platform`
+- inputs starting with a known platform name or nickname ("fb", "ig", "x")
+  become a `platform`; the handle after it is dropped
+- everything else is a `place`, keyed by its lowercase letters and digits
+
+The resolver keeps every alias key in memory. Unknown place keys are matched
+against known places by trigram similarity (so "Lagoss" joins "Lagos") before
+a new location is created; every new key is stored in location_alias so other
+workers and later runs resolve it with a dictionary lookup.
+
+Merging a location into another (flask location-alias) keeps the old row as a
+tombstone pointing at its target. Workers look for new merges every
+REVALIDATE_SECONDS, follow the redirect from then on, and move incidents they
+linked to the old id in the meantime.
+"""
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import select, update, inspect, text, func, or_
+from sqlalchemy.exc import IntegrityError
+from models.database import db, Incident, Location, LocationAlias
+
+SIMILARITY_THRESHOLD = 0.5
+MIN_FUZZY_KEY = 4
+REVALIDATE_SECONDS = 30
+
+PLATFORMS = {
+    "twitter": "Twitter", "x": "Twitter", "tw": "Twitter",
+    "facebook": "Facebook", "fb": "Facebook", "messenger": "Facebook",
+    "instagram": "Instagram", "ig": "Instagram", "insta": "Instagram",
+    "whatsapp": "WhatsApp", "wa": "WhatsApp", "whatsap": "WhatsApp",
+    "telegram": "Telegram", "tg": "Telegram",
+    "tiktok": "TikTok", "youtube": "YouTube", "linkedin": "LinkedIn", "snapchat": "Snapchat",
+    "email": "Email", "e-mail": "Email", "gmail": "Email", "sms": "SMS",
+}
+
+# Nicknames that are also ordinary words; only a platform when a handle or more text follows
+AMBIGUOUS_PLATFORMS = {"x"}
+
+PLATFORM_DOMAINS = {
+    "twitter.com": "Twitter", "x.com": "Twitter", "t.co": "Twitter",
+    "facebook.com": "Facebook", "fb.com": "Facebook", "m.facebook.com": "Facebook", "messenger.com": "Facebook",
+    "instagram.com": "Instagram", "whatsapp.com": "WhatsApp", "wa.me": "WhatsApp", "chat.whatsapp.com": "WhatsApp",
+    "t.me": "Telegram", "telegram.org": "Telegram", "tiktok.com": "TikTok", "youtube.com": "YouTube",
+    "youtu.be": "YouTube", "linkedin.com": "LinkedIn", "snapchat.com": "Snapchat",
+}
+
+_URL = re.compile(r'^(?:[a-z][a-z0-9+.-]*://)?(?:www\.)?((?:[a-z0-9-]+\.)+[a-z]{2,})(?::\d+)?(?:[/?#]|$)')
+_EMAIL = re.compile(r'^[^@\s]+@((?:[a-z0-9-]+\.)+[a-z]{2,})$')
+_TOKEN = re.compile(r'[\s@:/,;]+')
+
+
+def canonicalize(raw):
+    """Return (key, kind, display name) for a raw location, or (None, None, None) if empty."""
+    cleaned = ' '.join(str(raw or '').split())
+    if not cleaned:
+        return None, None, None
+    low = cleaned.lower()
+
+    email = _EMAIL.match(low)
+    url = None if email else _URL.match(low)
+    if email or url:
+        host = (email or url).group(1)
+        platform = PLATFORM_DOMAINS.get(host)
+        if platform:
+            return f"platform:{platform.lower()}", 'platform', platform
+        return f"domain:{host}"[:120], 'domain', host[:100]
+
+    first = _TOKEN.split(low.lstrip('@'), 1)[0]
+    platform = PLATFORMS.get(first)
+    if platform and (first not in AMBIGUOUS_PLATFORMS or first != low):
+        return f"platform:{platform.lower()}", 'platform', platform
+
+    key = _place_key(low)
+    if not key:
+        return None, None, None
+    name = cleaned.title() if cleaned in (low, cleaned.upper()) else cleaned
+    return f"place:{key}"[:120], 'place', name[:100]
+
+
+def _place_key(value):
+    return re.sub(r'[^0-9a-z]+', '', value.lower())
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class LocationResolver:
+    """In-memory alias table backed by location / location_alias."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the cached table (after the tables were dropped or rewritten)."""
+        self._aliases = {}                # alias key -> location id
+        self._locations = {}              # location id -> (kind, name)
+        self._grams = defaultdict(set)    # trigram -> place location ids
+        self._place_grams = {}            # location id -> trigrams of its canonical key
+        self._redirects = {}              # merged location id -> location it was merged into
+        self._merge_stamp = None          # newest merged_at seen
+        self._next_check = 0.0
+        self._max_id = 0
+        self._loaded = False
+
+    # --- cache ----------------------------------------------------------------------
+
+    def _index(self, location_id, kind, name, merged_into=None):
+        self._locations[location_id] = (kind, name)
+        self._max_id = max(self._max_id, location_id)
+        if merged_into is not None:
+            self._redirects[location_id] = merged_into
+        elif kind == 'place':
+            grams = _trigrams(_place_key(name))
+            self._place_grams[location_id] = grams
+            for gram in grams:
+                self._grams[gram].add(location_id)
+
+    def _refresh(self, conn):
+        """Load locations (and their aliases) created since the last refresh."""
+        rows = conn.execute(select(Location.id, Location.kind, Location.name, Location.merged_into,
+                                   Location.merged_at).where(Location.id > self._max_id))
+        since = self._max_id
+        for location_id, kind, name, merged_into, merged_at in rows:
+            self._index(location_id, kind, name, merged_into)
+            if merged_at and (self._merge_stamp is None or merged_at > self._merge_stamp):
+                self._merge_stamp = merged_at
+        aliases = conn.execute(select(LocationAlias.key, LocationAlias.location_id)
+                               .where(LocationAlias.location_id > since))
+        self._aliases.update(aliases.tuples().all())
+        if not self._loaded:
+            self._next_check = time.monotonic() + REVALIDATE_SECONDS
+        self._loaded = True
+
+    def _revalidate(self):
+        """Follow merges made by other processes since the last check."""
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + REVALIDATE_SECONDS
+            stmt = select(Location.id, Location.merged_into, Location.merged_at).where(Location.merged_into.isnot(None))
+            if self._merge_stamp is not None:
+                stmt = stmt.where(Location.merged_at >= self._merge_stamp)
+            with db.engine.connect() as conn:
+                merged = {}
+                for location_id, target, merged_at in conn.execute(stmt):
+                    if self._merge_stamp is None or merged_at > self._merge_stamp:
+                        self._merge_stamp = merged_at
+                    if self._redirects.get(location_id) != target:
+                        self._redirects[location_id] = target
+                        for gram in self._place_grams.pop(location_id, ()):
+                            self._grams[gram].discard(location_id)
+                        merged[location_id] = target
+                # Incidents this process linked to a merged id before it knew
+                for location_id in merged:
+                    conn.execute(update(Incident.__table__).where(Incident.location_id == location_id)
+                                 .values(location_id=self._follow(location_id)))
+                conn.commit()
+
+    def _follow(self, location_id):
+        while location_id in self._redirects:
+            location_id = self._redirects[location_id]
+        return location_id
+
+    def load(self):
+        with db.engine.connect() as conn:
+            self._refresh(conn)
+
+    def name_of(self, location_id):
+        if not self._loaded:
+            self.load()
+        return self._locations.get(self._follow(location_id), (None, None))[1]
+
+    def cached(self, raw):
+        """
+        Location id from the in-memory table only; None if unknown, not loaded
+        yet or due for a merge check (resolve() does those).
+        """
+        key = canonicalize(raw)[0]
+        if not key or time.monotonic() >= self._next_check:
+            return None
+        location_id = self._aliases.get(key)
+        return self._follow(location_id) if location_id is not None else None
+
+    def _similar_place(self, key):
+        """Best fuzzy match for a place key above SIMILARITY_THRESHOLD, or None."""
+        bare = key[len('place:'):]
+        if len(bare) < MIN_FUZZY_KEY:
+            return None
+        grams = _trigrams(bare)
+        best, best_score = None, SIMILARITY_THRESHOLD
+        candidates = set().union(*(self._grams.get(g, ()) for g in grams))
+        for location_id in candidates:
+            other = self._place_grams[location_id]
+            score = len(grams & other) / len(grams | other)
+            if score >= best_score:
+                best, best_score = location_id, score
+        return best
+
+    # --- resolution -----------------------------------------------------------------
+
+    def resolve(self, raw, create=True):
+        """
+        Location id for a raw location. With create=False nothing is written and
+        None is returned for inputs that match no known location.
+        """
+        key, kind, name = canonicalize(raw)
+        if key is None:
+            return None
+        just_loaded = not self._loaded
+        if just_loaded:
+            self.load()
+        elif time.monotonic() >= self._next_check:
+            self._revalidate()
+        location_id = self._aliases.get(key)
+        if location_id is not None:
+            return self._follow(location_id)
+        if not create:
+            return self._similar_place(key) if kind == 'place' else None
+
+        with self._lock, db.engine.connect() as conn:
+            location_id = self._aliases.get(key)
+            if location_id is None:
+                location_id = self._persist(conn, key, kind, name, refresh=not just_loaded)
+                self._aliases[key] = location_id
+        return self._follow(location_id)
+
+    def resolve_many(self, raws):
+        """{raw: location id} for an iterable of raw locations (bulk paths)."""
+        return {raw: self.resolve(raw) for raw in set(raws)}
+
+    def _persist(self, conn, key, kind, name, refresh=True):
+        # Another worker may already have seen this spelling or its location
+        location_id = conn.execute(select(LocationAlias.location_id).where(LocationAlias.key == key)).scalar()
+        if location_id is not None:
+            return location_id
+        if refresh:
+            self._refresh(conn)
+        conn.commit()
+
+        location_id = self._similar_place(key) if kind == 'place' else None
+        if location_id is None:
+            location_id = self._insert_location(conn, kind, name)
+        try:
+            conn.execute(LocationAlias.__table__.insert().values(key=key, location_id=location_id))
+            conn.commit()
+        except IntegrityError:
+            conn.rollback()
+            location_id = conn.execute(select(LocationAlias.location_id).where(LocationAlias.key == key)).scalar()
+        return location_id
+
+    def _insert_location(self, conn, kind, name):
+        try:
+            location_id = conn.execute(Location.__table__.insert().values(kind=kind, name=name)).inserted_primary_key[0]
+            conn.commit()
+        except IntegrityError:
+            conn.rollback()
+            # Created concurrently, or a merged location's name
+            return conn.execute(select(func.coalesce(Location.merged_into, Location.id))
+                                .where(Location.kind == kind, Location.name == name)).scalar()
+        self._index(location_id, kind, name)
+        return location_id
+
+    def add_alias(self, alias, location_id):
+        """
+        Point an alias spelling at an existing location, merging the location it
+        resolved to before (its incidents and aliases) into the target.
+        Returns the number of incidents moved.
+        """
+        key = canonicalize(alias)[0]
+        if key is None:
+            raise ValueError("alias is empty")
+        moved = 0
+        with self._lock, db.engine.begin() as conn:
+            previous = conn.execute(select(LocationAlias.location_id).where(LocationAlias.key == key)).scalar()
+            if previous == location_id:
+                return 0
+            if previous is None:
+                conn.execute(LocationAlias.__table__.insert().values(key=key, location_id=location_id))
+            else:
+                moved = conn.execute(update(Incident.__table__).where(Incident.location_id == previous)
+                                     .values(location_id=location_id)).rowcount
+                conn.execute(update(LocationAlias.__table__).where(LocationAlias.location_id == previous)
+                             .values(location_id=location_id))
+                # Tombstone instead of delete: other workers still have `previous`
+                # cached and keep saving incidents with it until their next check
+                conn.execute(update(Location.__table__)
+                             .where(or_(Location.id == previous, Location.merged_into == previous))
+                             .values(merged_into=location_id, merged_at=datetime.utcnow()))
+        self.reset()
+        return moved
+
+
+resolver = LocationResolver()
+
+
+def ensure_location_column():
+    """
+    Add incident.location_id (and its index) and the location merge columns to
+    databases created before them.
+    """
+    engine = db.engine
+    db.metadata.create_all(engine, tables=[Location.__table__, LocationAlias.__table__])
+    changed = False
+    if 'merged_into' not in {c['name'] for c in inspect(engine).get_columns('location')}:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE location ADD COLUMN merged_into INTEGER REFERENCES location (id)"))
+            conn.execute(text("ALTER TABLE location ADD COLUMN merged_at TIMESTAMP"))
+        changed = True
+    if 'location_id' not in {c['name'] for c in inspect(engine).get_columns('incident')}:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE incident ADD COLUMN location_id INTEGER REFERENCES location (id)"))
+            conn.execute(text("CREATE INDEX ix_incident_location_created ON incident (location_id, created_at)"))
+        changed = True
+    return changed
+
+
+def backfill_locations(batch_size=500, progress=None):
+    """
+    Link incidents without a location_id to the dimension.
+    Returns (distinct spellings, incidents updated).
+    """
+    ensure_location_column()
+    with db.engine.connect() as conn:
+        spellings = conn.execute(select(Incident.location).where(Incident.location_id.is_(None))
+                                 .group_by(Incident.location)).scalars().all()
+
+    by_location = defaultdict(list)
+    for raw, location_id in resolver.resolve_many(spellings).items():
+        if location_id is not None:
+            by_location[location_id].append(raw)
+
+    updated = 0
+    for location_id, raws in by_location.items():
+        for start in range(0, len(raws), batch_size):
+            with db.engine.begin() as conn:
+                updated += conn.execute(
+                    update(Incident.__table__)
+                    .where(Incident.location_id.is_(None), Incident.location.in_(raws[start:start + batch_size]))
+                    .values(location_id=location_id)).rowcount
+        if progress:
+            progress(updated)
+    return len(spellings), updated
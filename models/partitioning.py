@@ -0,0 +1,297 @@
+# models/partitioning.py
+"""
+Monthly partitioning of the incident table and cold-archive tiering.
+
+On PostgreSQL `incident` becomes a table partitioned by RANGE (created_at) with
+one partition per month (incident_pYYYY_MM) plus a default partition. Old
+months are archived by writing their rows to gzipped NDJSON files under
+ARCHIVE_DIR and then detaching and dropping the partition. Rows that landed in
+the default partition (months with no partition of their own) are archived by
+month too, and moved into their partition if one is created for them later.
+On other databases (SQLite in development) archiving deletes the archived rows
+instead.
+
+A month's file is written next to its final name (.tmp) and renamed into place
+only after the transaction removing its rows commits, so a failed run leaves
+no duplicate rows behind. A .tmp left by a crash between the commit and the
+rename is finished (or discarded, if its rows are still there) by the next run.
+
+Archived months stay readable through iter_archived(), which the search and
+export endpoints use when asked for ?include_archive=1.
+"""
+import glob
+import gzip
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, delete, func, text
+from models.database import db, Incident
+from models.triage import create_triage_indexes, ensure_triage_columns
+
+ARCHIVE_PATTERN = 'incident_*.ndjson.gz'
+
+
+def month_start(dt):
+    return datetime(dt.year, dt.month, 1)
+
+
+def add_months(dt, n):
+    index = dt.year * 12 + dt.month - 1 + n
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"incident_p{month:%Y_%m}"
+
+
+def archive_path(month, directory=None):
+    directory = directory or current_app.config.get('ARCHIVE_DIR', 'archive')
+    return os.path.join(directory, f"incident_{month:%Y_%m}.ndjson.gz")
+
+
+# --- PostgreSQL partitions ----------------------------------------------------
+
+def is_partitioned(conn):
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'incident'"
+    )).scalar())
+
+
+def _has_default_partition(conn):
+    return bool(conn.execute(text("SELECT to_regclass('incident_pdefault')")).scalar())
+
+
+def _month_range(month):
+    return f"created_at >= '{month:%Y-%m-%d}' AND created_at < '{add_months(month, 1):%Y-%m-%d}'"
+
+
+def ensure_partitions(conn, start, months_ahead=3):
+    """Create monthly partitions from `start` up to `months_ahead` months past now."""
+    month = month_start(start)
+    last = add_months(month_start(datetime.utcnow()), months_ahead)
+    default = _has_default_partition(conn)
+    created = []
+    while month <= last:
+        name = partition_name(month)
+        exists = conn.execute(text("SELECT to_regclass(:n)"), {"n": name}).scalar()
+        if not exists:
+            # PostgreSQL refuses a partition whose range the default partition
+            # holds rows for, so those rows move into the new partition
+            stray = default and conn.execute(text(
+                f"SELECT 1 FROM incident_pdefault WHERE {_month_range(month)} LIMIT 1")).scalar()
+            if stray:
+                conn.execute(text(
+                    f"CREATE TEMP TABLE incident_moving AS SELECT * FROM incident_pdefault WHERE {_month_range(month)}"))
+                conn.execute(text(f"DELETE FROM incident_pdefault WHERE {_month_range(month)}"))
+            conn.execute(text(
+                f"CREATE TABLE {name} PARTITION OF incident "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+            ))
+            if stray:
+                conn.execute(text("INSERT INTO incident SELECT * FROM incident_moving"))
+                conn.execute(text("DROP TABLE incident_moving"))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def convert_to_partitioned(months_ahead=3):
+    """
+    One-off migration: rebuild `incident` as a monthly-partitioned table.
+    PostgreSQL requires the partition key in every unique constraint, so the
+    primary key becomes (id, created_at) and reference is unique per created_at.
+    """
+    engine = db.engine
+    if engine.dialect.name != 'postgresql':
+        raise RuntimeError("Native partitioning requires PostgreSQL")
+    # LIKE copies the columns, so the source table must have them all
+    ensure_triage_columns()
+
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            return False
+        oldest = conn.execute(text("SELECT min(created_at) FROM incident")).scalar() or datetime.utcnow()
+        conn.execute(text("UPDATE incident SET created_at = now() AT TIME ZONE 'utc' WHERE created_at IS NULL"))
+        conn.execute(text("ALTER TABLE incident RENAME TO incident_unpartitioned"))
+        for name in ('location_created', 'triage_open', 'triage_claimed'):
+            conn.execute(text(f"ALTER INDEX IF EXISTS ix_incident_{name} "
+                              f"RENAME TO ix_incident_unpartitioned_{name}"))
+        conn.execute(text(
+            "CREATE TABLE incident (LIKE incident_unpartitioned INCLUDING DEFAULTS) "
+            "PARTITION BY RANGE (created_at)"
+        ))
+        conn.execute(text("ALTER TABLE incident ALTER COLUMN created_at SET NOT NULL"))
+        conn.execute(text("ALTER TABLE incident ADD PRIMARY KEY (id, created_at)"))
+        conn.execute(text("ALTER TABLE incident ADD UNIQUE (reference, created_at)"))
+        conn.execute(text('ALTER TABLE incident ADD FOREIGN KEY (user_id) REFERENCES "user" (id)'))
+        conn.execute(text("ALTER TABLE incident ADD FOREIGN KEY (location_id) REFERENCES location (id)"))
+        conn.execute(text("ALTER TABLE incident ADD FOREIGN KEY (assignee_id) REFERENCES admin (id)"))
+        conn.execute(text("CREATE INDEX ix_incident_created_at ON incident (created_at)"))
+        conn.execute(text("CREATE INDEX ix_incident_reference ON incident (reference)"))
+        conn.execute(text("CREATE INDEX ix_incident_location_created ON incident (location_id, created_at)"))
+        create_triage_indexes(conn)
+        conn.execute(text("CREATE TABLE incident_pdefault PARTITION OF incident DEFAULT"))
+        ensure_partitions(conn, oldest, months_ahead)
+        conn.execute(text("INSERT INTO incident SELECT * FROM incident_unpartitioned"))
+        conn.execute(text("ALTER SEQUENCE incident_id_seq OWNED BY incident.id"))
+        conn.execute(text("DROP TABLE incident_unpartitioned"))
+    return True
+
+
+def _partitions(conn):
+    """(name, lower bound month) for every monthly partition, oldest first."""
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'incident' AND c.relname LIKE 'incident_p____\\___' ORDER BY c.relname"
+    )).scalars()
+    return [(name, datetime.strptime(name[len('incident_p'):], '%Y_%m')) for name in rows]
+
+
+# --- Archiving ---------------------------------------------------------------------
+
+def _row_to_json(row):
+    out = {}
+    for key, value in row._mapping.items():
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, uuid.UUID):
+            value = str(value)
+        out[key] = value
+    return out
+
+
+def _write_archive(month, rows, directory):
+    """
+    Write the month's archive, with rows appended, to its .tmp file (published
+    by _archive_month). Returns the number of rows written.
+    """
+    path = archive_path(month, directory)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if os.path.exists(path):
+        # Late rows for a month archived before; keep what is already there
+        shutil.copyfile(path, path + '.tmp')
+    else:
+        open(path + '.tmp', 'wb').close()
+    count = 0
+    with open(path + '.tmp', 'ab') as raw:
+        # Appending adds a new gzip member; readers see one continuous stream
+        with gzip.open(raw, 'wt', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(_row_to_json(row)) + '\n')
+                count += 1
+        raw.flush()
+        os.fsync(raw.fileno())
+    return count
+
+
+def _archive_month(engine, month, directory, remove):
+    """Archive one month: remove(conn) drops its rows, and the file goes live once that commits."""
+    path = archive_path(month, directory)
+    try:
+        with engine.begin() as conn:
+            count = _write_archive(month, _month_rows(conn, month), directory)
+            remove(conn)
+    except BaseException:
+        if os.path.exists(path + '.tmp'):
+            os.remove(path + '.tmp')
+        raise
+    if count:
+        os.replace(path + '.tmp', path)
+    else:
+        os.remove(path + '.tmp')
+    return count
+
+
+def _recover_archives(engine, directory):
+    """Finish (or discard) .tmp files a crashed run left behind."""
+    for tmp in glob.glob(os.path.join(directory, ARCHIVE_PATTERN + '.tmp')):
+        month = datetime.strptime(os.path.basename(tmp)[len('incident_'):][:7], '%Y_%m')
+        with engine.connect() as conn:
+            pending = conn.execute(select(Incident.id).where(
+                Incident.created_at >= month, Incident.created_at < add_months(month, 1)).limit(1)).first()
+        if pending:
+            # The run died before its commit; the rows are archived again below
+            os.remove(tmp)
+        else:
+            os.replace(tmp, tmp[:-len('.tmp')])
+
+
+def _month_rows(conn, month):
+    stmt = (select(Incident.__table__)
+            .where(Incident.created_at >= month, Incident.created_at < add_months(month, 1))
+            .order_by(Incident.created_at.desc())
+            .execution_options(stream_results=True, yield_per=5000))
+    return conn.execute(stmt)
+
+
+def archive_old_incidents(retention_months=None, directory=None):
+    """
+    Move whole months older than the retention window to archive files.
+    Returns [(month, rows_archived)].
+    """
+    retention_months = retention_months or current_app.config.get('INCIDENT_RETENTION_MONTHS', 12)
+    directory = directory or current_app.config.get('ARCHIVE_DIR', 'archive')
+    cutoff = add_months(month_start(datetime.utcnow()), -retention_months)
+    engine = db.engine
+    archived = []
+    _recover_archives(engine, directory)
+
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conn:
+            partitioned = is_partitioned(conn)
+        if partitioned:
+            with engine.connect() as conn:
+                partitions = [(n, m) for n, m in _partitions(conn) if m < cutoff]
+                stray = []
+                if _has_default_partition(conn):
+                    stray = conn.execute(text(
+                        "SELECT DISTINCT date_trunc('month', created_at) FROM incident_pdefault "
+                        "WHERE created_at < :cutoff ORDER BY 1"), {"cutoff": cutoff}).scalars().all()
+
+            def drop_partition(name):
+                def remove(conn):
+                    conn.execute(text(f"ALTER TABLE incident DETACH PARTITION {name}"))
+                    conn.execute(text(f"DROP TABLE {name}"))
+                return remove
+
+            def delete_default(month):
+                return lambda conn: conn.execute(text(f"DELETE FROM incident_pdefault WHERE {_month_range(month)}"))
+
+            for name, month in partitions:
+                archived.append((month, _archive_month(engine, month, directory, drop_partition(name))))
+            for month in stray:
+                archived.append((month, _archive_month(engine, month, directory, delete_default(month))))
+            return archived
+
+    # Unpartitioned: archive month by month, then delete the rows
+    with engine.connect() as conn:
+        oldest = conn.execute(select(func.min(Incident.created_at))).scalar()
+    if oldest is None:
+        return archived
+    month = month_start(oldest)
+    while month < cutoff:
+        def remove(conn, month=month):
+            conn.execute(delete(Incident.__table__).where(
+                Incident.created_at >= month, Incident.created_at < add_months(month, 1)))
+        count = _archive_month(engine, month, directory, remove)
+        if count:
+            archived.append((month, count))
+        month = add_months(month, 1)
+    return archived
+
+
+def iter_archived(predicate=None, directory=None):
+    """Yield archived incident dicts, newest month first, optionally filtered."""
+    directory = directory or current_app.config.get('ARCHIVE_DIR', 'archive')
+    for path in sorted(glob.glob(os.path.join(directory, ARCHIVE_PATTERN)), reverse=True):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                row['created_at'] = datetime.fromisoformat(row['created_at']) if row.get('created_at') else None
+                if predicate is None or predicate(row):
+                    yield row
@@ -0,0 +1,63 @@
+# models/queries.py
+from sqlalchemy import select, func
+from models.database import Incident, Location
+from models.routing import read_execute
+
+
+# Columns rendered by the list endpoints. Selecting these directly returns
+# lightweight rows instead of identity-mapped Incident objects.
+REPORT_COLUMNS = (
+    Incident.id,
+    Incident.category,
+    Incident.severity,
+    Incident.location,
+    Incident.location_id,
+    Incident.description,
+    Incident.created_at,
+    Incident.status,
+    Incident.priority,
+)
+
+EXPORT_COLUMNS = REPORT_COLUMNS + (Incident.reference, Incident.user_id)
+
+
+def report_rows(*criteria, columns=REPORT_COLUMNS, limit=None, order_by=Incident.created_at.desc()):
+    """Read-only projection of incidents, newest first unless order_by says otherwise, without ORM hydration."""
+    stmt = select(*columns).where(*criteria).order_by(order_by)
+    if limit:
+        stmt = stmt.limit(limit)
+    return read_execute(stmt).all()
+
+
+def count_incidents(*criteria):
+    return read_execute(select(func.count(Incident.id)).where(*criteria)).scalar()
+
+
+def location_counts(*criteria, kind=None, limit=None):
+    """Incident counts per canonical location, largest first."""
+    total = func.count(Incident.id).label('count')
+    stmt = (select(Location.id, Location.kind, Location.name, total)
+            .join(Incident, Incident.location_id == Location.id)
+            .where(*criteria)
+            .group_by(Location.id, Location.kind, Location.name)
+            .order_by(total.desc(), Location.name))
+    if kind:
+        stmt = stmt.where(Location.kind == kind)
+    if limit:
+        stmt = stmt.limit(limit)
+    return read_execute(stmt).all()
+
+
+def serialize_report(row):
+    return {
+        "id": row.id,
+        "category": row.category,
+        "severity": row.severity,
+        "location": row.location,
+        "location_id": getattr(row, 'location_id', None),
+        "description": row.description or "",
+        "status": getattr(row, 'status', None),
+        "priority": getattr(row, 'priority', None),
+        "date": row.created_at.date().isoformat() if row.created_at else '',
+        "created_at": row.created_at.isoformat(timespec='seconds') if row.created_at else None
+    }
@@ -0,0 +1,93 @@
+# models/routing.py
+"""
+Read/write routing between the primary database and an optional read replica.
+
+Writes and read-your-own-writes paths (USSD, auth) keep using db.session as-is
+and always hit the primary. Read-only admin queries go through read_execute(),
+which sends them to the 'replica' bind when one is configured, healthy and not
+lagging, and falls back to the primary otherwise.
+"""
+import threading
+import time
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from models.database import db
+
+REPLICA_BIND = 'replica'
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._healthy = False
+        self._checked_at = 0.0
+        self._down_until = 0.0
+
+    def read_engine(self):
+        """Engine to use for a read-only query."""
+        engine = db.engines.get(REPLICA_BIND)
+        if engine is None:
+            return db.engine
+        return engine if self._is_usable(engine) else db.engine
+
+    def mark_down(self, reason):
+        retry = current_app.config.get('REPLICA_RETRY_SECONDS', 30)
+        with self._lock:
+            self._healthy = False
+            self._down_until = time.monotonic() + retry
+        current_app.logger.warning(f"Read replica unavailable, using primary for {retry}s: {reason}")
+
+    def _is_usable(self, engine):
+        now = time.monotonic()
+        with self._lock:
+            if now < self._down_until:
+                return False
+            if now - self._checked_at < current_app.config.get('REPLICA_HEALTH_SECONDS', 5):
+                return self._healthy
+            self._checked_at = now
+
+        try:
+            lag = self._replication_lag(engine)
+        except (DBAPIError, PoolTimeoutError) as e:
+            self.mark_down(e)
+            return False
+
+        max_lag = current_app.config.get('REPLICA_MAX_LAG_SECONDS', 10)
+        healthy = lag <= max_lag
+        if not healthy:
+            current_app.logger.warning(f"Read replica lagging {lag:.1f}s (max {max_lag}s), using primary")
+        with self._lock:
+            self._healthy = healthy
+        return healthy
+
+    def _replication_lag(self, engine):
+        with engine.connect() as conn:
+            if engine.dialect.name != 'postgresql':
+                conn.execute(text("SELECT 1"))
+                return 0.0
+            # The last replayed commit's age only counts while WAL is still waiting
+            # to be replayed: on an idle primary it grows with nothing to catch up.
+            # The receive LSN is NULL when the server is not a streaming standby.
+            lag = conn.execute(text(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() IS NULL "
+                "OR pg_last_wal_receive_lsn() <= pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+            )).scalar()
+            return float(lag or 0)
+
+
+router = ReplicaRouter()
+
+
+def read_execute(stmt):
+    """Execute a read-only statement on the replica, falling back to the primary."""
+    engine = router.read_engine()
+    if engine is db.engine:
+        return db.session.execute(stmt)
+    try:
+        return db.session.execute(stmt, bind_arguments={"bind": engine})
+    except (DBAPIError, PoolTimeoutError) as e:
+        db.session.rollback()
+        router.mark_down(e)
+        return db.session.execute(stmt)
@@ -0,0 +1,172 @@
+# models/triage.py
+"""
+Triage work queue over incidents.
+
+open         new incidents, waiting to be claimed
+in_progress  claimed by an admin (assignee_id, claimed_at); claims older than
+             TRIAGE_CLAIM_MINUTES go back to the queue
+resolved / dismissed  closed by the assignee
+
+claim_batch() hands each admin a distinct batch, highest priority and oldest
+first, in a single UPDATE ... WHERE id IN (SELECT ... LIMIT n). On PostgreSQL
+the inner select takes its rows FOR UPDATE SKIP LOCKED, so concurrent claims
+pass over each other's rows instead of queuing behind them. SQLite has no row
+locks, but it runs one writer at a time, so the same statement is already
+atomic there; claims in one process also take a lock first, so they queue in
+order instead of backing off in SQLite's busy handler.
+"""
+import threading
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, func, inspect, text
+from models.database import db, Incident, SEVERITY_PRIORITY, DEFAULT_PRIORITY
+from models.queries import REPORT_COLUMNS, serialize_report
+from models.routing import read_execute
+
+OPEN, IN_PROGRESS, RESOLVED, DISMISSED = 'open', 'in_progress', 'resolved', 'dismissed'
+STATUSES = (OPEN, IN_PROGRESS, RESOLVED, DISMISSED)
+
+TRIAGE_COLUMNS = REPORT_COLUMNS + (
+    Incident.reference,
+    Incident.assignee_id,
+    Incident.claimed_at,
+)
+
+TRIAGE_INDEXES = ('ix_incident_triage_open', 'ix_incident_triage_claimed')
+
+_sqlite_claims = threading.Lock()
+
+
+def serialize_triage(row):
+    report = serialize_report(row)
+    report.update({
+        "reference": row.reference,
+        "assignee_id": str(row.assignee_id) if row.assignee_id else None,
+        "claimed_at": row.claimed_at.isoformat() if row.claimed_at else None,
+    })
+    return report
+
+
+def _claim_minutes():
+    return current_app.config.get('TRIAGE_CLAIM_MINUTES', 30)
+
+
+def _locked_ids(*criteria, order_by=(), limit=None):
+    """Ids matching criteria, row-locked and skipping rows other claims hold (PostgreSQL)."""
+    stmt = select(Incident.id).where(*criteria).order_by(*order_by).with_for_update(skip_locked=True)
+    if limit:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def release_expired_claims(now=None):
+    """Return claims older than TRIAGE_CLAIM_MINUTES to the queue. Returns the number released."""
+    cutoff = (now or datetime.utcnow()) - timedelta(minutes=_claim_minutes())
+    expired = _locked_ids(Incident.status == IN_PROGRESS, Incident.claimed_at < cutoff)
+    result = db.session.execute(
+        update(Incident.__table__)
+        .where(Incident.id.in_(expired), Incident.status == IN_PROGRESS)
+        .values(status=OPEN, assignee_id=None, claimed_at=None))
+    return result.rowcount
+
+
+def claim_batch(admin_id, limit, *criteria):
+    """Atomically assign up to `limit` open incidents to admin_id. Returns their rows."""
+    serialize = _sqlite_claims if db.engine.dialect.name == 'sqlite' else nullcontext()
+    with serialize:
+        now = datetime.utcnow()
+        release_expired_claims(now)
+        picked = _locked_ids(Incident.status == OPEN, *criteria,
+                             order_by=(Incident.priority, Incident.created_at), limit=limit)
+        rows = db.session.execute(
+            update(Incident.__table__)
+            .where(Incident.id.in_(picked), Incident.status == OPEN)
+            .values(status=IN_PROGRESS, assignee_id=admin_id, claimed_at=now)
+            .returning(*TRIAGE_COLUMNS)).all()
+        db.session.commit()
+    # RETURNING order is unspecified
+    return sorted(rows, key=lambda r: (r.priority, r.created_at))
+
+
+def set_status(incident_id, admin_id, status):
+    """
+    Move one incident on behalf of admin_id. Admins can claim an open incident
+    and close or release incidents they hold. Returns (row, None), or
+    (None, current row) if the incident isn't in a state that allows it, or
+    (None, None) if it doesn't exist.
+    """
+    now = datetime.utcnow()
+    if status == IN_PROGRESS:
+        allowed = (Incident.status == OPEN,)
+        values = {"status": IN_PROGRESS, "assignee_id": admin_id, "claimed_at": now}
+    elif status == OPEN:
+        allowed = (Incident.status == IN_PROGRESS, Incident.assignee_id == admin_id)
+        values = {"status": OPEN, "assignee_id": None, "claimed_at": None}
+    else:
+        allowed = (Incident.status == IN_PROGRESS, Incident.assignee_id == admin_id)
+        values = {"status": status}
+    # One conditional UPDATE, so two admins acting at once can't both succeed
+    row = db.session.execute(
+        update(Incident.__table__)
+        .where(Incident.id == incident_id, *allowed)
+        .values(**values)
+        .returning(*TRIAGE_COLUMNS)).first()
+    db.session.commit()
+    if row:
+        return row, None
+    current = db.session.execute(select(*TRIAGE_COLUMNS).where(Incident.id == incident_id)).first()
+    return None, current
+
+
+def assigned_to(admin_id, limit=100):
+    return db.session.execute(
+        select(*TRIAGE_COLUMNS)
+        .where(Incident.status == IN_PROGRESS, Incident.assignee_id == admin_id)
+        .order_by(Incident.claimed_at)
+        .limit(limit)).all()
+
+
+def queue_counts():
+    """{'open': {priority: n}, 'in_progress': n}; only touches the partial indexes."""
+    by_priority = read_execute(
+        select(Incident.priority, func.count(Incident.id))
+        .where(Incident.status == OPEN)
+        .group_by(Incident.priority)).all()
+    in_progress = read_execute(select(func.count(Incident.id)).where(Incident.status == IN_PROGRESS)).scalar()
+    return {"open": {priority: count for priority, count in sorted(by_priority)}, "in_progress": in_progress}
+
+
+# --- Schema ------------------------------------------------------------------------
+
+def create_triage_indexes(conn):
+    for index in Incident.__table__.indexes:
+        if index.name in TRIAGE_INDEXES:
+            index.create(conn, checkfirst=True)
+
+
+def ensure_triage_columns(close_existing=False):
+    """
+    Add the triage columns and partial indexes to databases created before them.
+    close_existing marks the incidents already there as resolved instead of
+    putting the whole history in the queue.
+    """
+    engine = db.engine
+    columns = {c['name'] for c in inspect(engine).get_columns('incident')}
+    if 'status' in columns:
+        return False
+    priority = ' '.join(f"WHEN '{severity}' THEN {p}" for severity, p in SEVERITY_PRIORITY.items())
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE incident ADD COLUMN status VARCHAR(20) NOT NULL DEFAULT 'open'"))
+        conn.execute(text(f"ALTER TABLE incident ADD COLUMN priority SMALLINT NOT NULL DEFAULT {DEFAULT_PRIORITY}"))
+        conn.execute(text(f"UPDATE incident SET priority = CASE severity {priority} ELSE {DEFAULT_PRIORITY} END"))
+        if close_existing:
+            conn.execute(text(f"UPDATE incident SET status = '{RESOLVED}'"))
+        if engine.dialect.name == 'postgresql':
+            conn.execute(text("ALTER TABLE incident ALTER COLUMN priority DROP DEFAULT"))
+            conn.execute(text("ALTER TABLE incident ADD COLUMN assignee_id UUID REFERENCES admin (id)"))
+        else:
+            conn.execute(text("ALTER TABLE incident ADD COLUMN assignee_id CHAR(32) REFERENCES admin (id)"))
+        conn.execute(text("ALTER TABLE incident ADD COLUMN claimed_at TIMESTAMP"))
+        create_triage_indexes(conn)
+    return True
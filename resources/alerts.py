@@ -0,0 +1,30 @@
+# app/resources/alerts.py
+from flask_restful import Resource, reqparse
+from services.events import broker
+from services.spikes import detector
+from .utils import authenticate_admin
+
+
+class AlertsResource(Resource):
+    def get(self):
+        admin, error = authenticate_admin()
+        if error:
+            return error
+
+        parser = reqparse.RequestParser()
+        parser.add_argument("since", type=int, location="args", default=0)
+        parser.add_argument("limit", type=int, location="args", default=50)
+        args = parser.parse_args()
+
+        # A worker that hasn't saved anything yet still needs its detector running
+        detector.warm_up()
+        broker.ensure_poller()
+
+        alerts = detector.alerts(since=args["since"], limit=max(1, min(args["limit"], 200)))
+        return {
+            "success": True,
+            "ready": detector.ready,
+            "active": detector.active(),
+            "count": len(alerts),
+            "alerts": alerts
+        }, 200
@@ -0,0 +1,40 @@
+# app/resources/analytics.py
+from datetime import datetime, timedelta
+from flask_restful import Resource, reqparse
+from models.database import Incident
+from models.queries import location_counts, count_incidents
+from .utils import authenticate_admin
+
+
+class LocationAnalyticsResource(Resource):
+    def get(self):
+        admin, error = authenticate_admin()
+        if error:
+            return error
+
+        parser = reqparse.RequestParser()
+        parser.add_argument("days", type=int, location="args")
+        parser.add_argument("category", type=str, location="args")
+        parser.add_argument("severity", type=str, location="args")
+        parser.add_argument("kind", type=str, location="args", choices=("place", "platform", "domain"))
+        parser.add_argument("limit", type=int, location="args", default=50)
+        args = parser.parse_args()
+
+        criteria = []
+        if args["days"]:
+            criteria.append(Incident.created_at >= datetime.utcnow() - timedelta(days=args["days"]))
+        if args["category"]:
+            criteria.append(Incident.category == args["category"])
+        if args["severity"]:
+            criteria.append(Incident.severity == args["severity"])
+
+        rows = location_counts(*criteria, kind=args["kind"], limit=max(1, min(args["limit"], 1000)))
+        locations = [{"id": row.id, "kind": row.kind, "name": row.name, "count": row.count} for row in rows]
+
+        return {
+            "success": True,
+            "count": len(locations),
+            "locations": locations,
+            # Incidents not linked yet (run `flask backfill-locations`)
+            "unlinked": count_incidents(Incident.location_id.is_(None), *criteria)
+        }, 200
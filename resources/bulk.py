@@ -0,0 +1,44 @@
+# app/resources/bulk.py
+import io
+from flask_restful import Resource
+from flask import request, current_app
+from models.bulk_import import import_incidents
+from .utils import authenticate_admin
+
+
+def _detect_format(filename, mimetype):
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in (mimetype or '') or 'jsonl' in (mimetype or ''):
+        return 'ndjson'
+    return 'csv'
+
+
+class BulkImportResource(Resource):
+    def post(self):
+        admin, error = authenticate_admin()
+        if error:
+            return error
+
+        # Imports run inside the request; bigger files belong to `flask import-incidents`
+        limit = current_app.config.get('BULK_IMPORT_MAX_BYTES', 5 * 1024 * 1024)
+        if request.content_length and request.content_length > limit:
+            return {"success": False,
+                    "msg": f"File too large for upload (max {limit // 1024} KB); use the import-incidents command"}, 413
+        # Also enforced while parsing uploads sent without a Content-Length
+        request.max_content_length = limit
+
+        upload = request.files.get("file")
+        if upload:
+            fmt = request.args.get("format") or _detect_format(upload.filename, upload.mimetype)
+            stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+        elif request.content_length:
+            fmt = request.args.get("format") or _detect_format(None, request.mimetype)
+            stream = io.TextIOWrapper(request.stream, encoding="utf-8-sig", newline="")
+        else:
+            return {"success": False, "msg": "Upload a CSV or NDJSON file"}, 400
+
+        if fmt not in ("csv", "ndjson"):
+            return {"success": False, "msg": "format must be csv or ndjson"}, 400
+
+        result = import_incidents(stream, fmt=fmt)
+        return {"success": result.error_count == 0, **result.to_dict()}, 200
@@ -7,13 +7,29 @@ from datetime import datetime, timedelta
 from sqlalchemy import or_
 import csv
 from io import StringIO
-from flask import Response
+from flask import Response, request
 from .utils import authenticate_admin
+from models.queries import EXPORT_COLUMNS, report_rows, count_incidents, serialize_report
+from models.partitioning import iter_archived
+from models.locations import resolver
+from models.triage import STATUSES
+from types import SimpleNamespace
 import uuid
-import pandas as pd
 from io import BytesIO
 
 
+def location_filter(args):
+    """
+    Location id requested via ?location_id= or ?location= (any spelling of a
+    known location), 0 if the name matches nothing, None if not filtering.
+    """
+    if args.get("location_id"):
+        return args["location_id"]
+    if args.get("location"):
+        return resolver.resolve(args["location"], create=False) or 0
+    return None
+
+
 class DashboardResource(Resource):
     def get(self):
         admin, error = authenticate_admin()
@@ -23,44 +39,18 @@ class DashboardResource(Resource):
         now = datetime.utcnow()
 
         # Total reports
-        total_reports = db.session.query(Incident).count()
+        total_reports = count_incidents()
 
         # Last 30 days
         thirty_days_ago = now - timedelta(days=30)
-        this_month_count = (
-            db.session.query(Incident)
-            .filter(Incident.created_at >= thirty_days_ago)
-            .count()
-        )
+        this_month_count = count_incidents(Incident.created_at >= thirty_days_ago)
 
         # Today (UTC)
         start_of_today = datetime(now.year, now.month, now.day)
-        today_incidents = (
-            Incident.query
-            .filter(Incident.created_at >= start_of_today)
-            .order_by(Incident.created_at.desc())
-            .all()
-        )
+        today_count = count_incidents(Incident.created_at >= start_of_today)
 
         # Last 8 incidents
-        last_reports = (
-            Incident.query
-            .order_by(Incident.created_at.desc())
-            .limit(8)
-            .all()
-        )
-
-        report_history = [
-            {
-                "id": inc.id,
-                "category": inc.category,
-                "severity": inc.severity,
-                "location": inc.location,
-                "description": inc.description or "",
-                "date": inc.created_at.date().isoformat() if inc.created_at else ''
-            }
-            for inc in last_reports
-        ]
+        report_history = [serialize_report(row) for row in report_rows(limit=8)]
 
         return {
             "success": True,
@@ -72,7 +62,7 @@ class DashboardResource(Resource):
             "stats": {
                 "total_reports_count": total_reports,
                 "this_month_count": this_month_count,
-                "today_count": len(today_incidents)
+                "today_count": today_count
             },
             "report_history": report_history
         }, 200
@@ -88,27 +78,23 @@ class ReportsResource(Resource):
         parser = reqparse.RequestParser()
         parser.add_argument("category", type=str, location="args")
         parser.add_argument("severity", type=str, location="args")
+        parser.add_argument("location", type=str, location="args")
+        parser.add_argument("location_id", type=int, location="args")
+        parser.add_argument("status", type=str, location="args", choices=STATUSES)
         args = parser.parse_args()
 
-        query = Incident.query
+        criteria = []
         if args["category"]:
-            query = query.filter(Incident.category == args["category"])
+            criteria.append(Incident.category == args["category"])
         if args["severity"]:
-            query = query.filter(Incident.severity == args["severity"])
-
-        reports = query.order_by(Incident.created_at.desc()).all()
-
-        report_history = [
-            {
-                "id": inc.id,
-                "category": inc.category,
-                "severity": inc.severity,
-                "location": inc.location,
-                "description": inc.description or "",
-                "date": inc.created_at.date().isoformat() if inc.created_at else ''
-            }
-            for inc in reports
-        ]
+            criteria.append(Incident.severity == args["severity"])
+        if args["status"]:
+            criteria.append(Incident.status == args["status"])
+        location_id = location_filter(args)
+        if location_id is not None:
+            criteria.append(Incident.location_id == location_id)
+
+        report_history = [serialize_report(row) for row in report_rows(*criteria)]
 
         return {
             "success": True,
@@ -128,9 +114,14 @@ class IncidentSearchResource(Resource):
         parser.add_argument("q", type=str, location="args")
         parser.add_argument("category", type=str, location="args")
         parser.add_argument("severity", type=str, location="args")
+        parser.add_argument("location", type=str, location="args")
+        parser.add_argument("location_id", type=int, location="args")
+        parser.add_argument("include_archive", type=int, location="args", default=0)
         args = parser.parse_args()
 
-        query = Incident.query
+        criteria = []
+        # Same filters, applied in Python to archived months
+        archive_filters = []
 
         # 🔍 Text search (optional)
         query_term = args.get("q")
@@ -138,7 +129,7 @@ class IncidentSearchResource(Resource):
             query_term = query_term.strip()
             if not query_term:
                 return {"success": False, "msg": "Search query cannot be empty"}, 400
-            query = query.filter(
+            criteria.append(
                 or_(
                     Incident.description.ilike(f"%{query_term}%"),
                     Incident.category.ilike(f"%{query_term}%"),
@@ -147,28 +138,34 @@ class IncidentSearchResource(Resource):
                     Incident.reference.ilike(f"%{query_term}%")
                 )
             )
+            needle = query_term.lower()
+            archive_filters.append(lambda r: any(
+                needle in (r.get(f) or '').lower()
+                for f in ("description", "category", "location", "severity", "reference")))
 
         # 🧩 Category filter
         if args.get("category"):
-            query = query.filter(Incident.category == args["category"])
+            criteria.append(Incident.category == args["category"])
+            archive_filters.append(lambda r: r["category"] == args["category"])
 
         # ⚠️ Severity filter
         if args.get("severity"):
-            query = query.filter(Incident.severity == args["severity"])
-
-        incidents = query.order_by(Incident.created_at.desc()).all()
-
-        results = [
-            {
-                "id": inc.id,
-                "category": inc.category,
-                "severity": inc.severity,
-                "location": inc.location,
-                "description": inc.description or "",
-                "date": inc.created_at.date().isoformat() if inc.created_at else ''
-            }
-            for inc in incidents
-        ]
+            criteria.append(Incident.severity == args["severity"])
+            archive_filters.append(lambda r: r["severity"] == args["severity"])
+
+        # 📍 Canonical location filter
+        location_id = location_filter(args)
+        if location_id is not None:
+            criteria.append(Incident.location_id == location_id)
+            # Months archived before the dimension existed carry only the raw text
+            archive_filters.append(lambda r: (r.get("location_id") or resolver.resolve(r["location"], create=False))
+                                   == location_id)
+
+        results = [serialize_report(row) for row in report_rows(*criteria)]
+
+        if args.get("include_archive"):
+            archived = iter_archived(lambda r: all(f(r) for f in archive_filters))
+            results.extend({**serialize_report(SimpleNamespace(**r)), "archived": True} for r in archived)
 
         return {
             "success": True,
@@ -186,7 +183,9 @@ class ExportReportsExcelResource(Resource):
             return error
 
         # Fetch incidents
-        incidents = Incident.query.order_by(Incident.created_at.desc()).all()
+        incidents = report_rows(columns=EXPORT_COLUMNS)
+        if request.args.get("include_archive") == "1":
+            incidents = incidents + [SimpleNamespace(**r) for r in iter_archived()]
 
         # Prepare data for Excel
         data = []
@@ -202,6 +201,9 @@ class ExportReportsExcelResource(Resource):
                 "User ID": str(inc.user_id)
             })
 
+        # pandas/openpyxl are only needed here; keep them out of worker startup
+        import pandas as pd
+
         # Convert to DataFrame
         df = pd.DataFrame(data)
 
@@ -0,0 +1,48 @@
+# app/resources/stream.py
+import queue
+from flask_restful import Resource
+from flask import Response, request, stream_with_context, current_app
+from models.database import db
+from services.events import broker, format_sse
+from .utils import authenticate_admin
+
+
+class IncidentStreamResource(Resource):
+    def get(self):
+        admin, error = authenticate_admin()
+        if error:
+            return error
+
+        last_id = request.headers.get("Last-Event-ID") or request.args.get("last_id")
+        try:
+            last_id = int(last_id) if last_id else None
+        except ValueError:
+            return {"success": False, "msg": "Invalid Last-Event-ID"}, 400
+
+        sub, backlog = broker.subscribe(last_event_id=last_id)
+
+        # Don't pin a pooled connection for the lifetime of the stream
+        db.session.remove()
+
+        keepalive = current_app.config.get('STREAM_KEEPALIVE_SECONDS', 15)
+
+        def generate():
+            try:
+                yield "retry: 3000\n\n"
+                for event in backlog:
+                    yield format_sse(*event)
+                while not sub.overflowed:
+                    try:
+                        event = sub.queue.get(timeout=keepalive)
+                    except queue.Empty:
+                        yield ": keepalive\n\n"
+                        continue
+                    yield format_sse(*event)
+            finally:
+                broker.unsubscribe(sub)
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
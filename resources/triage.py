@@ -0,0 +1,73 @@
+# app/resources/triage.py
+from flask_restful import Resource
+from flask import request
+from models.database import Incident
+from models.triage import (STATUSES, claim_batch, set_status, assigned_to, queue_counts, serialize_triage)
+from .utils import authenticate_admin
+
+MAX_CLAIM = 50
+
+
+class TriageQueueResource(Resource):
+    def get(self):
+        admin, error = authenticate_admin()
+        if error:
+            return error
+
+        mine = [serialize_triage(row) for row in assigned_to(admin.id)]
+        return {
+            "success": True,
+            "queue": queue_counts(),
+            "count": len(mine),
+            "assigned": mine
+        }, 200
+
+
+class TriageClaimResource(Resource):
+    def post(self):
+        admin, error = authenticate_admin()
+        if error:
+            return error
+
+        # JSON body or query string
+        data = {**request.args.to_dict(), **(request.get_json(silent=True) or {})}
+        try:
+            limit = max(1, min(int(data.get("limit", 10)), MAX_CLAIM))
+        except (TypeError, ValueError):
+            return {"success": False, "msg": "limit must be a number"}, 400
+
+        criteria = []
+        if data.get("category"):
+            criteria.append(Incident.category == data["category"])
+        if data.get("severity"):
+            criteria.append(Incident.severity == data["severity"])
+
+        claimed = [serialize_triage(row) for row in claim_batch(admin.id, limit, *criteria)]
+        return {
+            "success": True,
+            "count": len(claimed),
+            "claimed": claimed
+        }, 200
+
+
+class TriageIncidentResource(Resource):
+    def post(self, incident_id):
+        admin, error = authenticate_admin()
+        if error:
+            return error
+
+        data = request.get_json(silent=True) or {}
+        status = data.get("status")
+        if status not in STATUSES:
+            return {"success": False, "msg": f"status must be one of {', '.join(STATUSES)}"}, 400
+
+        row, current = set_status(incident_id, admin.id, status)
+        if row:
+            return {"success": True, "incident": serialize_triage(row)}, 200
+        if current is None:
+            return {"success": False, "msg": "Incident not found"}, 404
+        return {
+            "success": False,
+            "msg": "Incident is not claimable" if status == "in_progress" else "Incident is not assigned to you",
+            "incident": serialize_triage(current)
+        }, 409
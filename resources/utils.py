@@ -1,6 +1,6 @@
 # app/utils/auth.py
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
-from flask import current_app
+from flask import current_app, g
 from models.database import Admin
 import uuid
 
@@ -9,7 +9,10 @@ def authenticate_admin():
     Returns (admin, error_response) tuple.
     If admin exists → (admin, None)
     If error → (None, (json_response, status_code))
+    The admin is memoized for the rest of the request.
     """
+    if g.get('current_admin') is not None:
+        return g.current_admin, None
     try:
         verify_jwt_in_request()
         identity = get_jwt_identity()
@@ -26,6 +29,7 @@ def authenticate_admin():
         if not admin:
             return None, ({"success": False, "msg": "Admin not found"}, 404)
 
+        g.current_admin = admin
         return admin, None
 
     except Exception as e:
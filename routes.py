@@ -1,6 +1,11 @@
 from flask_restful import Api
 from resources.auth import RegisterResource, LoginResource, LogoutAccessResource, LogoutRefreshResource, RefreshResource
 from resources.dashboard import DashboardResource,IncidentSearchResource,ReportsResource,ExportReportsExcelResource
+from resources.stream import IncidentStreamResource
+from resources.bulk import BulkImportResource
+from resources.analytics import LocationAnalyticsResource
+from resources.triage import TriageQueueResource, TriageClaimResource, TriageIncidentResource
+from resources.alerts import AlertsResource
 #from resources.incidents import IncidentListResource, IncidentResource, IncidentSummaryResource, IncidentStatsResource
 
 def register_routes(app):
@@ -15,6 +20,13 @@ def register_routes(app):
 
 
     api.add_resource(DashboardResource, "/api/dashboard")
+    api.add_resource(IncidentStreamResource, "/api/dashboard/stream")
     api.add_resource(ReportsResource, "/api/reports")
     api.add_resource(IncidentSearchResource, "/api/search")
     api.add_resource(ExportReportsExcelResource, "/api/export")
+    api.add_resource(LocationAnalyticsResource, "/api/analytics/locations")
+    api.add_resource(BulkImportResource, "/api/import")
+    api.add_resource(TriageQueueResource, "/api/triage")
+    api.add_resource(TriageClaimResource, "/api/triage/claim")
+    api.add_resource(TriageIncidentResource, "/api/triage/<int:incident_id>")
+    api.add_resource(AlertsResource, "/api/alerts")
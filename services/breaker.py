@@ -0,0 +1,110 @@
+# services/breaker.py
+"""
+Circuit breaker for calls that must answer within a latency budget.
+
+closed     calls go through; failures and calls slower than `slow_seconds` are
+           counted, and `failure_threshold` of them in a row open the breaker
+open       calls are refused (callers answer a degraded response) until
+           `reset_seconds` have passed
+half-open  one probe call is let through; success closes the breaker, a
+           failure or slow answer opens it again
+
+State changes are logged and exported as metrics.
+"""
+import logging
+import threading
+import time
+
+from services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+breaker_transitions = registry.counter(
+    'circuit_breaker_transitions_total', 'Circuit breaker state changes', ('breaker', 'state'))
+breaker_failures = registry.counter(
+    'circuit_breaker_failures_total', 'Calls counted against a breaker', ('breaker', 'reason'))
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=3, slow_seconds=1.0, reset_seconds=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_seconds = slow_seconds
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._listeners = []
+        registry.gauge(f'{name}_breaker_state', f'{name} breaker: 0 closed, 1 half-open, 2 open',
+                       lambda: STATE_VALUES[self._state])
+
+    def configure(self, failure_threshold=None, slow_seconds=None, reset_seconds=None):
+        if failure_threshold is not None:
+            self.failure_threshold = failure_threshold
+        if slow_seconds is not None:
+            self.slow_seconds = slow_seconds
+        if reset_seconds is not None:
+            self.reset_seconds = reset_seconds
+
+    def on_close(self, fn):
+        """Call fn() (outside the lock) whenever the breaker closes again."""
+        self._listeners.append(fn)
+        return fn
+
+    @property
+    def state(self):
+        return self._state
+
+    def allow(self):
+        """True if a call may go through now (in half-open, only the single probe)."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    return False
+                self._transition(HALF_OPEN)
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record(self, elapsed):
+        """Record a completed call; slow calls count as failures."""
+        if elapsed > self.slow_seconds:
+            self.record_failure('slow')
+            return
+        closed = False
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            if self._state != CLOSED:
+                self._transition(CLOSED)
+                closed = True
+        if closed:
+            for fn in self._listeners:
+                fn()
+
+    def record_failure(self, reason='error'):
+        breaker_failures.inc(self.name, reason)
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def _transition(self, state):
+        previous, self._state = self._state, state
+        breaker_transitions.inc(self.name, state)
+        log = logger.warning if state == OPEN else logger.info
+        log("%s circuit breaker %s -> %s (%d consecutive failures)", self.name, previous, state, self._failures)
+
+
+# Guards database calls on the USSD path (see ussd/resilience.py)
+db_breaker = CircuitBreaker('ussd_db')
@@ -0,0 +1,246 @@
+# services/events.py
+"""
+In-process fan-out of new incidents to admin dashboard subscribers (SSE).
+
+One broker per process. Incidents saved by this process are published as soon
+as save_incident commits; incidents committed by other workers are picked up
+by a single poller thread per process, so database load does not grow with the
+number of open dashboards.
+
+Listeners registered with on_incident() (the spike detector) see every
+incident the broker publishes. While there are any, the poller keeps running
+without subscribers too, so they also see other workers' incidents. With spike
+detection on (SPIKE_DETECTION, the default) that means every worker polls for
+as long as it runs: one indexed query per STREAM_POLL_SECONDS. The dashboard
+stats (three COUNTs, recounted every STREAM_STATS_SECONDS) are only kept while
+a dashboard is subscribed, so with no viewers that query is all a worker runs.
+
+Spike alerts are pushed to subscribers without an event id and are not kept
+for replay. Event ids stay incident ids, so a reconnect's Last-Event-ID never
+skips an incident; alerts missed while disconnected are in GET /api/alerts.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from models.database import db, Incident
+from models.queries import report_rows, count_incidents, serialize_report
+from services.metrics import registry, timed_job
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+
+class IncidentBroker:
+    def __init__(self, history_size=500, client_buffer=100, poll_seconds=5, stats_seconds=300, page_size=500):
+        self.client_buffer = client_buffer
+        self.poll_seconds = poll_seconds
+        self.stats_seconds = stats_seconds
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history_size)   # (incident_id, event_name, data)
+        self._seen_ids = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._listeners = []
+        self._high_water = 0
+        self._stats = None
+        self._stats_day = None
+        self._stats_at = 0.0
+        self._caught_up = False   # high-water mark seeded for this poller run
+        self._poller = None
+        self._app = None
+
+    def configure(self, app):
+        """Bind the broker to the app (needed by the poller thread)."""
+        self._app = app
+        self.client_buffer = app.config.get('STREAM_CLIENT_BUFFER', self.client_buffer)
+        self.poll_seconds = app.config.get('STREAM_POLL_SECONDS', self.poll_seconds)
+        self.stats_seconds = app.config.get('STREAM_STATS_SECONDS', self.stats_seconds)
+        history_size = app.config.get('STREAM_HISTORY_SIZE', self._history.maxlen)
+        if history_size != self._history.maxlen:
+            self._history = deque(self._history, maxlen=history_size)
+            self._seen_ids = deque(self._seen_ids, maxlen=history_size)
+
+    def on_incident(self, fn):
+        """Call fn(report) (outside the lock) for every incident published."""
+        if fn not in self._listeners:
+            self._listeners.append(fn)
+        return fn
+
+    # --- publishing -------------------------------------------------------
+
+    def publish_incident(self, report):
+        """Record a committed incident (serialize_report() shape) and fan it out."""
+        with self._lock:
+            if report["id"] in self._seen_ids:
+                return
+            self._seen_ids.append(report["id"])
+            self._high_water = max(self._high_water, report["id"])
+            self._bump_stats()
+            data = {"incident": report, "stats": dict(self._stats) if self._stats else None}
+            self._history.append((report["id"], "incident", data))
+            subscribers = list(self._subscribers)
+
+        self._fan_out(subscribers, (report["id"], "incident", data))
+
+        for fn in self._listeners:
+            try:
+                fn(report)
+            except Exception:
+                # Never fail the save that published the incident
+                logger.exception("Incident listener failed")
+        if self._listeners and not (self._poller and self._poller.is_alive()):
+            self.ensure_poller()
+
+    def publish_alert(self, alert):
+        """Send a spike alert (services/spikes.py) to dashboard subscribers."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        # No event id: it would move the client's Last-Event-ID past incidents
+        self._fan_out(subscribers, (None, "alert", alert))
+
+    def _fan_out(self, subscribers, event):
+        for sub in subscribers:
+            try:
+                sub.queue.put_nowait(event)
+            except queue.Full:
+                # Slow client: drop it; the browser reconnects with Last-Event-ID.
+                sub.overflowed = True
+
+    def _bump_stats(self):
+        if self._stats is None:
+            return
+        if self._stats_day != datetime.utcnow().date():
+            # Rolling counters are re-seeded by the poller on the next tick
+            self._stats = None
+            return
+        for key in self._stats:
+            self._stats[key] += 1
+
+    # --- subscribing ------------------------------------------------------
+
+    def subscribe(self, last_event_id=None):
+        """
+        Returns (subscription, backlog). backlog holds events newer than
+        last_event_id, from memory when possible and from the database otherwise.
+        """
+        sub = Subscription(self.client_buffer)
+        with self._lock:
+            self._subscribers.add(sub)
+            oldest = self._history[0][0] if self._history else None
+            backlog = []
+            if last_event_id is not None:
+                backlog = [e for e in self._history if e[0] > last_event_id]
+        if last_event_id is not None and (oldest is None or last_event_id < oldest - 1):
+            backlog = self._load_since(last_event_id)
+        self.ensure_poller()
+        return sub, backlog
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def _load_since(self, last_event_id, limit=500):
+        rows = report_rows(Incident.id > last_event_id, limit=limit, order_by=Incident.id)
+        return [(row.id, "incident", {"incident": serialize_report(row), "stats": None}) for row in rows]
+
+    # --- cross-worker poller ----------------------------------------------
+
+    def ensure_poller(self):
+        """Start the poller thread if it isn't running (it stops once there are no subscribers or listeners)."""
+        if self._app is None:
+            return
+        with self._lock:
+            if self._poller and self._poller.is_alive():
+                return
+            self._poller = threading.Thread(target=self._poll_loop, name="incident-stream-poller", daemon=True)
+            self._poller.start()
+
+    def _poll_loop(self):
+        while True:
+            with self._lock:
+                if not self._subscribers and not self._listeners:
+                    # Counters drift while nobody is listening; re-seed next time
+                    self._poller = None
+                    self._stats = None
+                    self._caught_up = False
+                    return
+            try:
+                with self._app.app_context():
+                    self._poll_once()
+                    db.session.remove()
+            except Exception as e:
+                self._app.logger.warning(f"Incident stream poll failed: {e}")
+            time.sleep(self.poll_seconds)
+
+    @timed_job('incident_stream_poll')
+    def _poll_once(self):
+        if not self._caught_up:
+            self._seed_high_water()
+        with self._lock:
+            watched = bool(self._subscribers)
+        if not watched:
+            # The counts are for dashboards only; listeners (the spike detector)
+            # just need the page query below, so an unwatched worker never counts
+            self._stats = None
+        elif self._stats is None or time.monotonic() - self._stats_at >= self.stats_seconds:
+            # Re-seeded too because bumping never lets incidents age out of the
+            # rolling 30-day count
+            self._seed_stats()
+        # Pages in id order from the high-water mark, so a burst bigger than a
+        # page is caught up rather than skipped. The small overlap catches ids
+        # committed out of order by other workers.
+        while True:
+            since = max(self._high_water - 50, 0)
+            rows = report_rows(Incident.id > since, limit=self.page_size, order_by=Incident.id)
+            for row in rows:
+                self.publish_incident(serialize_report(row))
+            if len(rows) < self.page_size:
+                return
+
+    def _seed_stats(self):
+        now = datetime.utcnow()
+        start_of_today = datetime(now.year, now.month, now.day)
+        stats = {
+            "total_reports_count": count_incidents(),
+            "this_month_count": count_incidents(Incident.created_at >= now - timedelta(days=30)),
+            "today_count": count_incidents(Incident.created_at >= start_of_today),
+        }
+        with self._lock:
+            self._stats = stats
+            self._stats_day = now.date()
+            self._stats_at = time.monotonic()
+
+    def _seed_high_water(self):
+        # Incidents that already existed are not news to a fresh subscriber. By id,
+        # not created_at: backdated rows (imports, spool replay) would seed it too low
+        recent = report_rows(columns=(Incident.id,), limit=50, order_by=Incident.id.desc())
+        with self._lock:
+            for row in recent:
+                if row.id not in self._seen_ids:
+                    self._seen_ids.append(row.id)
+                self._high_water = max(self._high_water, row.id)
+            self._caught_up = True
+
+
+def format_sse(event_id, event, data):
+    if event_id is None:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Shared per-process broker
+broker = IncidentBroker()
+registry.gauge('incident_stream_subscribers', 'Open dashboard stream connections', broker.subscriber_count)
@@ -0,0 +1,85 @@
+# services/hashring.py
+"""
+Consistent hash ring.
+
+Each node is placed on the ring at `vnodes` pseudo-random points; a key
+belongs to the first point clockwise from its own hash. Adding or removing a
+node therefore moves only the keys on the arcs that node gains or loses
+(about 1/N of them) and leaves every other key where it was.
+
+Nodes can also be marked down without leaving the ring: their keys fall
+through to the next live node clockwise, and return once the node is back.
+"""
+import hashlib
+import threading
+from bisect import bisect_right
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    def __init__(self, nodes=(), vnodes=160):
+        self.vnodes = vnodes
+        self._lock = threading.Lock()
+        self._nodes = set()
+        self._down = set()
+        self._ring = ([], [])   # (sorted point hashes, node owning each point); replaced, never mutated
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self):
+        return sorted(self._nodes)
+
+    @property
+    def live_nodes(self):
+        return sorted(self._nodes - self._down)
+
+    def add(self, node):
+        with self._lock:
+            if node in self._nodes:
+                return
+            self._nodes.add(node)
+            self._rebuild()
+
+    def remove(self, node):
+        with self._lock:
+            if node not in self._nodes:
+                return
+            self._nodes.discard(node)
+            self._down.discard(node)
+            self._rebuild()
+
+    def mark_down(self, node):
+        """Route around node without changing membership. True if it was up."""
+        with self._lock:
+            if node not in self._nodes or node in self._down:
+                return False
+            self._down.add(node)
+            return True
+
+    def mark_up(self, node):
+        """True if node was down."""
+        with self._lock:
+            if node not in self._down:
+                return False
+            self._down.discard(node)
+            return True
+
+    def _rebuild(self):
+        ring = sorted((_hash(f"{node}#{i}"), node) for node in self._nodes for i in range(self.vnodes))
+        self._ring = ([point for point, _ in ring], [node for _, node in ring])
+
+    def node_for(self, key, skip=()):
+        """Live node owning key (or None); nodes in skip are treated as down."""
+        (points, owners), down = self._ring, self._down
+        if not points:
+            return None
+        start = bisect_right(points, _hash(key))
+        for i in range(len(points)):
+            node = owners[(start + i) % len(points)]
+            if node not in down and node not in skip:
+                return node
+        return None
@@ -0,0 +1,245 @@
+# services/metrics.py
+"""
+Low-overhead in-process metrics exposed in Prometheus text format at /metrics.
+
+Each worker process keeps its own counters; scrape every worker (or run a
+single worker per container) to get the full picture.
+"""
+import functools
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, g, request, current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    # Label values may contain backslashes, quotes and newlines (exposition format escapes)
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_str(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, doc, labels=()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _label_str(self.labels, k), v) for k, v in items]
+
+
+class Gauge:
+    """Value read from a callback at scrape time: fn() -> {label_values: value}."""
+    kind = 'gauge'
+
+    def __init__(self, name, doc, fn, labels=()):
+        self.name, self.doc, self.labels, self.fn = name, doc, tuple(labels), fn
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [(self.name, _label_str(self.labels, k), v) for k, v in values.items()]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}   # label_values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            state[idx] += 1
+            state[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        out = []
+        for label_values, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), state[:-1]):
+                cumulative += count
+                labels = _label_str(self.labels + ('le',), label_values + (bound,))
+                out.append((f'{self.name}_bucket', labels, cumulative))
+            base = _label_str(self.labels, label_values)
+            out.append((f'{self.name}_sum', base, state[-1]))
+            out.append((f'{self.name}_count', base, cumulative))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, doc, labels=()):
+        return self.register(Counter(name, doc, labels))
+
+    def gauge(self, name, doc, fn, labels=()):
+        return self.register(Gauge(name, doc, fn, labels))
+
+    def histogram(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, doc, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.doc}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# --- HTTP / SQL -----------------------------------------------------------
+http_latency = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint', ('endpoint', 'method', 'status'))
+sql_per_request = registry.histogram(
+    'sql_statements_per_request', 'SQL statements issued per request', ('endpoint',),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100))
+sql_statements = registry.counter('sql_statements_total', 'SQL statements executed')
+
+# --- Pool -----------------------------------------------------------------
+pool_checkout_wait = registry.histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent obtaining a pooled connection', ('pool',),
+    buckets=(.0005, .001, .005, .01, .05, .1, .5, 1, 5, 30))
+
+# --- USSD -----------------------------------------------------------------
+ussd_transitions = registry.counter(
+    'ussd_state_transitions_total', 'USSD state machine transitions', ('from_state', 'to_state'))
+ussd_handle_seconds = registry.histogram(
+    'ussd_handle_seconds', 'Time spent in handle_ussd by starting state', ('state',))
+ussd_replay = registry.counter(
+    'ussd_replay_cache_lookups_total', 'Replay cache lookups on initial dial', ('result',))
+
+# --- Background jobs ------------------------------------------------------
+job_duration = registry.histogram(
+    'background_job_duration_seconds', 'Background job run time', ('job',))
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts take, waiting for a free connection included."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - start, getattr(self, 'metrics_name', 'primary'))
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    sql_statements.inc()
+    # Requests, and work they hand to other threads (capture_sql in services/profiling.py)
+    if has_app_context() and '_sql_count' in g:
+        g._sql_count += 1
+
+
+def timed_job(name):
+    """Decorator recording a background job's duration."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                job_duration.observe(time.perf_counter() - start, name)
+        return inner
+    return wrap
+
+
+def scrape_allowed(authorization, token, public):
+    """Whether a /metrics request may be answered: with the bearer token if one is set, else only if public."""
+    if token:
+        return hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    return public
+
+
+def _pool_stats(db):
+    def collect(attr):
+        out = {}
+        for key, engine in db.engines.items():
+            pool = engine.pool
+            if hasattr(pool, attr):
+                out[(key or 'primary',)] = getattr(pool, attr)()
+        return out
+    return collect
+
+
+def init_metrics(app, db):
+    """Install request hooks, pool/cache gauges and the /metrics route."""
+
+    @app.before_request
+    def _start_timer():
+        g._request_start = time.perf_counter()
+        g._sql_count = 0
+
+    @app.after_request
+    def _record_request(response):
+        start = g.get('_request_start')
+        if start is not None:
+            endpoint = request.endpoint or 'unmatched'
+            http_latency.observe(time.perf_counter() - start, endpoint, request.method, response.status_code)
+            sql_per_request.observe(g.get('_sql_count', 0), endpoint)
+        return response
+
+    with app.app_context():
+        for key, engine in db.engines.items():
+            engine.pool.metrics_name = key or 'primary'
+        stats = _pool_stats(db)
+
+    def in_app(fn):
+        def wrapped():
+            with app.app_context():
+                return fn()
+        return wrapped
+
+    for attr, doc in (('size', 'Configured pool size'), ('checkedout', 'Connections checked out'),
+                      ('checkedin', 'Idle connections in the pool'), ('overflow', 'Overflow connections open')):
+        registry.gauge(f'db_pool_{attr}', doc, in_app(lambda attr=attr: stats(attr)), ('pool',))
+
+    @app.route('/metrics')
+    def metrics():
+        if not scrape_allowed(request.headers.get('Authorization', ''), current_app.config.get('METRICS_TOKEN'),
+                              current_app.config.get('METRICS_PUBLIC')):
+            return Response('unauthorized\n', status=401, mimetype='text/plain')
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
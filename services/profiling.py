@@ -0,0 +1,185 @@
+# services/profiling.py
+"""
+Opt-in per-request profiling and repeated-query detection.
+
+A request is profiled when an authenticated admin sends "X-Profile: 1", or when
+it is picked by PROFILE_SAMPLE_RATE. The report (cProfile stats plus every SQL
+statement with its timing) is written to PROFILE_DIR. One request is profiled
+at a time per process (Python 3.12+ allows only one active profiler); others
+that ask meanwhile, or while another profiling tool is attached, are served
+unprofiled.
+
+Independently of profiling, every request counts its SQL statements and logs a
+warning when the same statement runs repeatedly, which usually means a lookup
+belongs outside a loop or should be cached for the request. Detection is per
+request only: a lookup repeated across requests (a report's details, then the
+recent reports list) is not flagged here; compare sql_statements_per_request
+across endpoints for that. executemany batches (bulk imports) count once per
+call and are never keyed on their rows.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from flask import g, request, current_app, has_request_context, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_profiler_lock = threading.Lock()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    context._profile_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_app_context() or '_sql_seen' not in g:
+        return
+    if executemany:
+        # Batches differ by their rows; repr() of 10k of them costs more than the insert
+        parameters = f"<{len(parameters)} rows>"
+        g._sql_seen[(statement, None)] += 1
+    else:
+        g._sql_seen[(statement, repr(parameters))] += 1
+    if g.get('_sql_log') is not None:
+        started = getattr(context, '_profile_start', time.perf_counter())
+        g._sql_log.append((time.perf_counter() - started, statement, parameters))
+
+
+def capture_sql(fn, *args, profiling=False):
+    """
+    Run fn on another thread's app context (push one first), tallying its SQL
+    the way a request does. Returns (result, captured) for merge_sql().
+    """
+    g._sql_count = 0
+    g._sql_seen = Counter()
+    g._sql_log = [] if profiling else None
+    result = fn(*args)
+    return result, (g._sql_count, g._sql_seen, g._sql_log)
+
+
+def merge_sql(captured):
+    """Add SQL captured on another thread to the current request's counts."""
+    if not has_request_context():
+        return
+    count, seen, log = captured
+    g._sql_count = g.get('_sql_count', 0) + count
+    if '_sql_seen' in g:
+        g._sql_seen.update(seen)
+    if log and g.get('_sql_log') is not None:
+        g._sql_log.extend(log)
+
+
+def is_profiling():
+    return has_request_context() and g.get('_sql_log') is not None
+
+
+def _wants_profile():
+    rate = current_app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+    if rate and random.random() < rate:
+        return True
+    if request.headers.get('X-Profile') != '1':
+        return False
+    # Only admins may ask for a profile on demand
+    from resources.utils import authenticate_admin
+    admin, error = authenticate_admin()
+    return error is None
+
+
+def _warn_repeats():
+    seen = g.get('_sql_seen')
+    if not seen:
+        return
+    threshold = current_app.config.get('REPEATED_QUERY_THRESHOLD', 5)
+    by_statement = Counter()
+    for (statement, parameters), count in seen.items():
+        by_statement[statement] += count
+        if parameters is not None and count >= threshold:
+            current_app.logger.warning(
+                f"{request.endpoint}: identical query ran {count}x in one request: {' '.join(statement.split())[:200]}")
+    n_plus_one = current_app.config.get('N_PLUS_ONE_THRESHOLD', 10)
+    for statement, count in by_statement.items():
+        if count >= n_plus_one:
+            current_app.logger.warning(
+                f"{request.endpoint}: possible N+1, statement ran {count}x with different parameters: "
+                f"{' '.join(statement.split())[:200]}")
+
+
+def _write_report(profiler, sql_log, elapsed):
+    directory = current_app.config.get('PROFILE_DIR', 'profiles')
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    base = os.path.join(directory, f"{stamp}-{request.endpoint or 'unmatched'}")
+
+    profiler.dump_stats(base + '.prof')
+
+    out = io.StringIO()
+    out.write(f"{request.method} {request.full_path}\n")
+    out.write(f"total: {elapsed * 1000:.1f} ms, "
+              f"sql: {sum(d for d, _, _ in sql_log) * 1000:.1f} ms in {len(sql_log)} statements\n\n")
+    out.write("== SQL ==\n")
+    for duration, statement, parameters in sql_log:
+        out.write(f"{duration * 1000:8.2f} ms  {' '.join(statement.split())}  {parameters!r}\n")
+    out.write("\n== Profile (cumulative) ==\n")
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(40)
+
+    with open(base + '.txt', 'w') as f:
+        f.write(out.getvalue())
+    return base + '.txt'
+
+
+def _stop_profiler():
+    profiler = g.pop('_profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profiler_lock.release()
+    return profiler
+
+
+def init_profiling(app):
+    """Install the request hooks. Detection is always on; profiling is opt-in."""
+
+    @app.before_request
+    def _maybe_profile():
+        g._sql_seen = Counter()
+        g._sql_log = None
+        if not _wants_profile():
+            return
+        if not _profiler_lock.acquire(blocking=False):
+            current_app.logger.info(f"{request.endpoint}: not profiled, another request is being profiled")
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another profiling tool is active
+            _profiler_lock.release()
+            current_app.logger.info(f"{request.endpoint}: not profiled: {e}")
+            return
+        g._sql_log = []
+        g._profile_start = time.perf_counter()
+        g._profiler = profiler
+
+    @app.after_request
+    def _finish_profile(response):
+        profiler = _stop_profiler()
+        if profiler is not None:
+            try:
+                path = _write_report(profiler, g._sql_log, time.perf_counter() - g._profile_start)
+                response.headers['X-Profile-Report'] = os.path.basename(path)
+            except OSError as e:
+                current_app.logger.warning(f"Could not write profile report: {e}")
+        _warn_repeats()
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # after_request is skipped when the request fails; free the profiler anyway
+        _stop_profiler()
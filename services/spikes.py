@@ -0,0 +1,436 @@
+# services/spikes.py
+"""
+Streaming spike detection over incoming incidents.
+
+Every incident this process learns about is counted per category, severity
+and location, in the bucket of its created_at: its own saves (save_incident,
+the async and spool paths) and, through the broker's poller, those committed by
+other workers. Incidents older than the window (a bulk import, a poller that
+fell behind) are dropped rather than counted as current traffic. Each tracked
+value keeps a sliding window of recent time buckets and an exponentially
+weighted baseline (mean and variance of per-bucket counts). That is a fixed
+handful of numbers per value, updated in O(1) on each insert. The number of
+values is capped, and the least recently seen is dropped first. Nothing
+queries the incidents table per insert.
+
+A value is spiking when its window count reaches a threshold. The threshold
+is the largest of min_count, min_ratio times the baseline's expectation for
+the window, and that expectation plus `threshold` standard deviations. The
+same counters also run over all incidents. When the rest of the traffic is
+busier than its own baseline (the daily peak), expectations scale up with it,
+so only values growing faster than everything else stand out. An alert fires
+once when a value crosses its threshold and re-arms when the count falls
+below half of it.
+
+Every worker sees every incident, so every worker runs a detector and they
+usually raise the same alert. Alerts are stored in spike_alert, one row per
+value per window (a unique key on the window's start, and a check for one in
+the window before). The worker whose row lands logs it and counts it in
+incident_spike_alerts_total; each worker pushes it to its own dashboard
+streams as an "alert" event with the stored id. GET /api/alerts reads the
+table, so every worker serves the same feed. Set SPIKE_DETECTION=False to turn
+detection (and the poller it keeps running) off on a deployment.
+
+On restart the state is rebuilt in the background by replaying the last
+history_hours of incidents. Values found spiking during the replay are marked
+active but not alerted again.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from models.database import db, Incident, SpikeAlert
+from models.routing import read_execute
+from services.events import broker
+from services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+COLD, SEEDING, READY = 'cold', 'seeding', 'ready'
+MAX_PENDING = 10000
+EPOCH = datetime(1970, 1, 1)
+
+spike_alerts = registry.counter('incident_spike_alerts_total', 'Incident rate spikes detected', ('dimension',))
+
+
+class _Series:
+    """Window and baseline for one value of one dimension."""
+    __slots__ = ('label', 'bucket', 'counts', 'total', 'mean', 'var', 'seen', 'active')
+
+    def __init__(self, label, bucket, size, seen):
+        self.label = label
+        self.bucket = bucket        # newest bucket counted
+        self.counts = [0] * size    # ring: bucket b lives at b % size
+        self.total = 0              # sum(counts), the window count
+        self.mean = 0.0             # baseline per-bucket count
+        self.var = 0.0
+        self.seen = seen            # buckets in the baseline so far
+        self.active = False
+
+
+def _series_keys(report):
+    """(dimension, key, label) for each value the incident counts towards."""
+    if report.get("category"):
+        yield 'category', report["category"], report["category"]
+    if report.get("severity"):
+        yield 'severity', report["severity"], report["severity"]
+    location = (report.get("location") or '').strip()
+    if report.get("location_id"):
+        # Canonical location, so "lagos " and "LAGOS" count together
+        yield 'location', report["location_id"], location
+    elif location:
+        yield 'location', location.lower(), location
+
+
+def _report_time(report):
+    """Epoch seconds of the incident's created_at, or now if the report has none."""
+    created_at = report.get("created_at")
+    if not created_at:
+        return time.time()
+    return (datetime.fromisoformat(created_at) - EPOCH).total_seconds()
+
+
+def serialize_alert(row):
+    return {
+        "id": row.id,
+        "dimension": row.dimension,
+        "value": row.value,
+        "key": row.series_key,
+        "count": row.count,
+        "expected": row.expected,
+        "score": row.score,
+        "window_minutes": row.window_minutes,
+        "window_start": row.window_start.isoformat(timespec='seconds'),
+        "at": row.detected_at.isoformat(timespec='seconds'),
+    }
+
+
+class SpikeDetector:
+    def __init__(self, bucket_seconds=60, window_minutes=15, baseline_hours=24, history_hours=48,
+                 threshold=5.0, min_count=10, min_ratio=3.0, max_series=10000):
+        self.bucket_seconds = bucket_seconds
+        self.threshold = threshold
+        self.min_count = min_count
+        self.min_ratio = min_ratio
+        self.max_series = max_series
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._app = None
+        self._state = COLD
+        self._pending = []
+        self._seed_high_water = 0
+        self._set_periods(window_minutes, baseline_hours, history_hours)
+        self._reset()
+
+    def configure(self, app):
+        self._app = app
+        cfg = app.config
+        self.enabled = cfg.get('SPIKE_DETECTION', True)
+        if self.enabled:
+            broker.on_incident(self.observe)
+        self.threshold = cfg.get('SPIKE_THRESHOLD', self.threshold)
+        self.min_count = cfg.get('SPIKE_MIN_COUNT', self.min_count)
+        self.min_ratio = cfg.get('SPIKE_MIN_RATIO', self.min_ratio)
+        self._set_periods(cfg.get('SPIKE_WINDOW_MINUTES', self.window_minutes),
+                          cfg.get('SPIKE_BASELINE_HOURS', self.baseline_hours),
+                          cfg.get('SPIKE_HISTORY_HOURS', self.history_hours))
+        self._reset()
+
+    def _set_periods(self, window_minutes, baseline_hours, history_hours):
+        self.window_minutes = window_minutes
+        self.baseline_hours = baseline_hours
+        self.history_hours = history_hours
+        self.window_buckets = max(1, round(window_minutes * 60 / self.bucket_seconds))
+        # Per-bucket weight that gives the baseline a half-life of baseline_hours
+        self.alpha = 1 - 0.5 ** (self.bucket_seconds / (baseline_hours * 3600))
+        # Until a series has this many buckets its baseline is their plain average,
+        # so a young baseline isn't dragged towards its zero starting point
+        self.ramp_buckets = math.ceil(1 / self.alpha)
+        # No alerts until the baseline has seen a few windows
+        self.warmup_buckets = 4 * self.window_buckets
+
+    def _reset(self):
+        self._series = OrderedDict()   # (dimension, key) -> _Series, least recently seen first
+        self._all = None               # every incident, for how busy it is overall
+        self._first_bucket = None
+
+    def on_alert(self, fn):
+        """Call fn(alert) (on the alert's own thread) for every live alert."""
+        self._listeners.append(fn)
+        return fn
+
+    @property
+    def ready(self):
+        return self._state == READY
+
+    def series_count(self):
+        return len(self._series)
+
+    # --- counting ---------------------------------------------------------
+
+    def observe(self, report, at=None):
+        """
+        Count one committed incident (serialize_report() shape) at `at` (epoch
+        seconds), by default its created_at.
+        """
+        at = _report_time(report) if at is None else at
+        with self._lock:
+            if self._state != READY:
+                if len(self._pending) < MAX_PENDING:
+                    self._pending.append((report, at))
+                alerts = []
+            elif report["id"] <= self._seed_high_water:
+                # Already counted by the replay (the poller catching up)
+                return []
+            else:
+                alerts = self._count(report, at)
+        if self._state == COLD:
+            self.warm_up()
+        self._emit(alerts)
+        return alerts
+
+    def _count(self, report, at, replayed=False):
+        bucket = int(at // self.bucket_seconds)
+        if self._first_bucket is None:
+            self._first_bucket = bucket
+            self._all = _Series('', bucket, self.window_buckets, 0)
+        if not self._add(self._all, bucket):
+            # Created before the current window: old rows are not new traffic
+            return []
+        warm = bucket - self._first_bucket >= self.warmup_buckets
+        alerts = []
+        for dimension, key, label in _series_keys(report):
+            series = self._series_for(dimension, key, label, bucket)
+            if not self._add(series, bucket):
+                continue
+            alert = self._check(dimension, key, series, at, warm, replayed)
+            if alert:
+                alerts.append(alert)
+        return alerts
+
+    def _add(self, series, bucket):
+        if bucket > series.bucket:
+            self._advance(series, bucket)
+        elif series.bucket - bucket >= self.window_buckets:
+            return False
+        series.counts[bucket % self.window_buckets] += 1
+        series.total += 1
+        return True
+
+    def _series_for(self, dimension, key, label, bucket):
+        series = self._series.get((dimension, key))
+        if series is None:
+            # A new value had no reports in the buckets seen so far
+            seen = min(max(bucket - self._first_bucket, 0), self.ramp_buckets)
+            series = self._series[(dimension, key)] = _Series(label, bucket, self.window_buckets, seen)
+            if len(self._series) > self.max_series:
+                self._series.popitem(last=False)
+        else:
+            self._series.move_to_end((dimension, key))
+        return series
+
+    def _advance(self, series, bucket):
+        """Move the window forward to `bucket`, folding completed buckets into the baseline."""
+        gap = bucket - series.bucket
+        if gap <= 0:
+            return
+        size = self.window_buckets
+        x = series.counts[series.bucket % size]
+        weight = max(self.alpha, 1 / (series.seen + 1))
+        diff = x - series.mean
+        series.mean += weight * diff
+        series.var = (1 - weight) * (series.var + diff * weight * diff)
+        series.seen = min(series.seen + 1, self.ramp_buckets)
+        if gap > 1:
+            # The gap-1 buckets in between were empty; this is the same update
+            # applied once per empty bucket, in closed form
+            empty = gap - 1
+            ramp = min(empty, self.ramp_buckets - series.seen)
+            decay = series.seen / (series.seen + ramp) * (1 - self.alpha) ** (empty - ramp)
+            series.var = decay * (series.var + series.mean ** 2 * (1 - decay))
+            series.mean *= decay
+            series.seen = min(series.seen + empty, self.ramp_buckets)
+        for b in range(series.bucket + 1, series.bucket + 1 + min(gap, size)):
+            series.counts[b % size] = 0
+        series.total = sum(series.counts)
+        series.bucket = bucket
+
+    def _limit(self, series):
+        """Window count that counts as a spike, and the expectation it is measured against."""
+        size = self.window_buckets
+        expected = series.mean * size
+        # How much busier than usual everything else is (never scaled down)
+        rest_expected = (self._all.mean - series.mean) * size
+        if rest_expected > 0:
+            expected *= max(1.0, (self._all.total - series.total) / rest_expected)
+        # At least Poisson spread, since a quiet baseline underestimates it
+        spread = math.sqrt(max(series.var * size, expected, 1.0))
+        return max(self.min_count, self.min_ratio * expected, expected + self.threshold * spread), expected, spread
+
+    def _check(self, dimension, key, series, at, warm, replayed):
+        limit, expected, spread = self._limit(series)
+        if series.active:
+            if series.total < limit / 2:
+                series.active = False
+            return None
+        if series.total < limit or not warm:
+            return None
+        series.active = True
+        if replayed:
+            # Alerted (or missed) while this worker was down; don't repeat it
+            return None
+        window_start = (series.bucket - series.bucket % self.window_buckets) * self.bucket_seconds
+        return {
+            "dimension": dimension,
+            "value": series.label,
+            "key": key,
+            "count": series.total,
+            "expected": round(expected, 1),
+            "score": round((series.total - expected) / spread, 1),
+            "window_minutes": self.window_minutes,
+            "window_start": datetime.utcfromtimestamp(window_start).isoformat(timespec='seconds'),
+            "at": datetime.utcfromtimestamp(at).isoformat(timespec='seconds'),
+        }
+
+    def _emit(self, alerts):
+        if alerts and self._app is not None:
+            # Recording needs the database; keep that off the save (or event loop) that counted it
+            threading.Thread(target=self._publish, args=(alerts,), name="spike-alert", daemon=True).start()
+
+    def _publish(self, alerts):
+        with self._app.app_context():
+            for alert in alerts:
+                if self._record(alert):
+                    spike_alerts.inc(alert["dimension"])
+                    logger.warning("Incident spike: %s %r has %d reports in %d min (expected %.1f)",
+                                   alert["dimension"], alert["value"], alert["count"], alert["window_minutes"],
+                                   alert["expected"])
+                for fn in self._listeners:
+                    try:
+                        fn(alert)
+                    except Exception:
+                        logger.exception("Spike alert listener failed")
+
+    def _record(self, alert):
+        """
+        Store the alert and set its id. False when another worker already
+        stored one for this value in this window or the one before.
+        """
+        window_start = datetime.fromisoformat(alert["window_start"])
+        same = (SpikeAlert.dimension == alert["dimension"], SpikeAlert.series_key == str(alert["key"]))
+        earlier = select(SpikeAlert.id).where(
+            *same, SpikeAlert.window_start >= window_start - timedelta(minutes=alert["window_minutes"]))
+        try:
+            with db.engine.begin() as conn:
+                existing = conn.execute(earlier.order_by(SpikeAlert.id.desc()).limit(1)).scalar()
+                if existing is None:
+                    alert["id"] = conn.execute(insert(SpikeAlert).values(
+                        dimension=alert["dimension"], series_key=str(alert["key"]), value=alert["value"][:100],
+                        window_start=window_start, window_minutes=alert["window_minutes"],
+                        count=alert["count"], expected=alert["expected"], score=alert["score"],
+                        detected_at=datetime.fromisoformat(alert["at"]))).inserted_primary_key[0]
+                    return True
+        except IntegrityError:
+            # Another worker stored it between our check and insert
+            with db.engine.connect() as conn:
+                existing = conn.execute(earlier.order_by(SpikeAlert.id.desc()).limit(1)).scalar()
+        except SQLAlchemyError as e:
+            # Still worth a log line; the feed just won't have it
+            logger.warning("Could not store spike alert: %s", e)
+            alert["id"] = None
+            return True
+        alert["id"] = existing
+        return False
+
+    # --- reading ----------------------------------------------------------
+
+    def alerts(self, since=0, limit=50):
+        """Stored alerts newer than id `since`, newest first (needs an app context)."""
+        rows = read_execute(
+            select(SpikeAlert).where(SpikeAlert.id > since).order_by(SpikeAlert.id.desc()).limit(limit))
+        return [serialize_alert(row) for row in rows.scalars()]
+
+    def active(self, now=None):
+        """Values currently over their limit, as of now."""
+        if not self.ready:
+            return []
+        bucket = int((time.time() if now is None else now) // self.bucket_seconds)
+        spikes = []
+        with self._lock:
+            if self._all is None:
+                return []
+            self._advance(self._all, bucket)
+            for (dimension, key), series in self._series.items():
+                if not series.active:
+                    continue
+                self._advance(series, bucket)
+                limit, expected, _ = self._limit(series)
+                if series.total < limit / 2:
+                    series.active = False
+                    continue
+                spikes.append({"dimension": dimension, "value": series.label, "key": key,
+                               "count": series.total, "expected": round(expected, 1)})
+        return spikes
+
+    # --- rebuilding from history ------------------------------------------
+
+    def warm_up(self):
+        """Start rebuilding from recent history, once per process."""
+        with self._lock:
+            if self._state != COLD or not self.enabled:
+                return
+            if self._app is None:
+                self._state = READY
+                return
+            self._state = SEEDING
+        threading.Thread(target=self._rebuild_in_background, name="spike-detector-rebuild", daemon=True).start()
+
+    def _rebuild_in_background(self):
+        try:
+            with self._app.app_context():
+                self.rebuild()
+                db.session.remove()
+        except Exception as e:
+            logger.warning("Spike detector rebuild failed, starting from empty state: %s", e)
+            self._reset()
+        alerts = []
+        with self._lock:
+            for report, at in self._pending:
+                if report["id"] > self._seed_high_water:
+                    alerts.extend(self._count(report, at))
+            self._pending = []
+            self._state = READY
+        self._emit(alerts)
+
+    def rebuild(self):
+        """
+        Replay the last history_hours of incidents into fresh state (needs an
+        app context). Runs while observe() only queues, so it works unlocked.
+        """
+        self._reset()
+        since = datetime.utcnow() - timedelta(hours=self.history_hours)
+        rows = read_execute(
+            select(Incident.id, Incident.category, Incident.severity, Incident.location,
+                   Incident.location_id, Incident.created_at)
+            .where(Incident.created_at >= since)
+            .order_by(Incident.created_at))
+        replayed = 0
+        for row in rows:
+            self._count(row._mapping, (row.created_at - EPOCH).total_seconds(), replayed=True)
+            self._seed_high_water = max(self._seed_high_water, row.id)
+            replayed += 1
+        logger.info("Spike detector rebuilt from %d incidents (%d series)", replayed, len(self._series))
+        return replayed
+
+
+# Shared per-process detector, fed by the broker once configured
+detector = SpikeDetector()
+detector.on_alert(broker.publish_alert)
+registry.gauge('incident_spike_series', 'Values tracked by the spike detector', detector.series_count)
@@ -2,5 +2,5 @@ from app import app
 from models.database import db
 
 with app.app_context():
-    db.create_all()
+    db.create_all(bind_key=None)
 
@@ -0,0 +1,63 @@
+# tests/test_bulk_import.py
+from datetime import datetime
+
+from sqlalchemy import select
+
+import models.bulk_import as bulk_import
+from models.bulk_import import import_incidents
+from models.database import db, Incident
+
+HEADER = "phone_number,category,location,severity,description,reference,created_at\n"
+
+
+def _import(app, lines, **kwargs):
+    with app.app_context():
+        result = import_incidents((HEADER + ''.join(lines)).splitlines(keepends=True), fmt='csv', **kwargs)
+        rows = db.session.execute(select(Incident.reference, Incident.created_at)).all()
+    return result, dict(rows)
+
+
+def test_offset_timestamps_are_stored_as_utc(app):
+    result, stored = _import(app, [
+        "08011111111,Phishing,Lagos,Low,,OFFSET-1,2024-01-01T10:00:00+01:00\n",
+        "08011111112,Phishing,Lagos,Low,,ZULU-1,2024-01-01T10:00:00Z\n",
+        "08011111113,Phishing,Lagos,Low,,NAIVE-1,2024-01-01T10:00:00\n",
+    ])
+    assert result.error_count == 0
+    assert stored == {
+        "OFFSET-1": datetime(2024, 1, 1, 9, 0),
+        "ZULU-1": datetime(2024, 1, 1, 10, 0),
+        "NAIVE-1": datetime(2024, 1, 1, 10, 0),
+    }
+
+
+def test_rows_failing_on_insert_are_rejected_not_fatal(app, monkeypatch):
+    real_clean = bulk_import._clean
+
+    def clean(record):
+        row, error = real_clean(record)
+        if row and row["reference"] == "BAD-1":
+            # A value the driver can't bind: not an IntegrityError or DataError
+            row["description"] = object()
+        return row, error
+
+    monkeypatch.setattr(bulk_import, "_clean", clean)
+    result, stored = _import(app, [
+        "08011111111,Phishing,Lagos,Low,,GOOD-1,\n",
+        "08011111112,Phishing,Lagos,Low,,BAD-1,\n",
+        "08011111113,Phishing,Lagos,Low,,GOOD-2,\n",
+    ])
+    assert result.inserted == 2
+    assert [line for line, _ in result.errors] == [3]
+    assert set(stored) == {"GOOD-1", "GOOD-2"}
+
+
+def test_duplicate_reference_rejects_only_that_row(app):
+    result, stored = _import(app, [
+        "08011111111,Phishing,Lagos,Low,,DUP-1,\n",
+        "08011111112,Phishing,Lagos,Low,,DUP-1,\n",
+        "08011111113,Phishing,Lagos,Low,,OTHER-1,\n",
+    ])
+    assert result.inserted == 2
+    assert result.error_count == 1
+    assert set(stored) == {"DUP-1", "OTHER-1"}
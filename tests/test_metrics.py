@@ -0,0 +1,30 @@
+# tests/test_metrics.py
+from services.metrics import Registry
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    counter = registry.counter('things_total', 'Things', ('name',))
+    counter.inc('a "quoted"\\path\nnext')
+    assert 'things_total{name="a \\"quoted\\"\\\\path\\nnext"} 1\n' in registry.render()
+
+
+def test_metrics_are_refused_without_a_token_unless_public(app, monkeypatch):
+    client = app.test_client()
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', '')
+    monkeypatch.setitem(app.config, 'METRICS_PUBLIC', False)
+    assert client.get('/metrics').status_code == 401
+
+    monkeypatch.setitem(app.config, 'METRICS_PUBLIC', True)
+    assert client.get('/metrics').status_code == 200
+
+
+def test_metrics_token_is_required_when_set(app, monkeypatch):
+    client = app.test_client()
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 's3cret')
+    monkeypatch.setitem(app.config, 'METRICS_PUBLIC', True)
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert response.status_code == 200
+    assert b'db_pool_checkout_wait_seconds' in response.data
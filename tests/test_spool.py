@@ -0,0 +1,45 @@
+# tests/test_spool.py
+import json
+import os
+from types import SimpleNamespace
+
+from sqlalchemy import select
+
+from models.database import db, Incident
+from ussd.spool import spool_submission, replay, REJECTED_FILE
+
+
+def _session(phone):
+    return SimpleNamespace(phone_number=phone, category="Phishing", location="Lagos", severity="Low",
+                           description="fake bank sms")
+
+
+def test_malformed_records_are_set_aside_and_the_rest_replayed(app, tmp_path):
+    directory = str(tmp_path)
+    spool_submission("08011111111:s1", "REF-GOOD-1", _session("08011111111"), directory)
+    with open(next(tmp_path.glob('*.ndjson')), 'a', encoding='utf-8') as f:
+        f.write(json.dumps({"key": "08011111112:s2", "reference": "REF-NOLOC"}) + '\n')
+        f.write(json.dumps({"key": "08011111113:s3", "reference": "REF-BADDATE", "phone_number": "08011111113",
+                            "category": "Phishing", "location": "Lagos", "severity": "Low",
+                            "description": "", "created_at": "yesterday"}) + '\n')
+        f.write(json.dumps(["not", "a", "record"]) + '\n')
+    spool_submission("08011111114:s4", "REF-GOOD-2", _session("08011111114"), directory)
+
+    with app.app_context():
+        counts = replay(directory)
+        references = set(db.session.scalars(select(Incident.reference)))
+
+    assert counts == {'inserted': 2, 'duplicate': 0, 'rejected': 3}
+    assert references == {"REF-GOOD-1", "REF-GOOD-2"}
+    # Nothing left to be picked up again
+    assert sorted(os.listdir(directory)) == [REJECTED_FILE]
+    with open(os.path.join(directory, REJECTED_FILE), encoding='utf-8') as f:
+        rejected = [json.loads(line) for line in f]
+    assert [json.loads(r["record"]) for r in rejected][:2] == [
+        {"key": "08011111112:s2", "reference": "REF-NOLOC"},
+        {"key": "08011111113:s3", "reference": "REF-BADDATE", "phone_number": "08011111113",
+         "category": "Phishing", "location": "Lagos", "severity": "Low", "description": "", "created_at": "yesterday"},
+    ]
+
+    with app.app_context():
+        assert replay(directory) == {'inserted': 0, 'duplicate': 0, 'rejected': 0}
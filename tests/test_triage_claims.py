@@ -0,0 +1,75 @@
+# tests/test_triage_claims.py
+import threading
+
+import pytest
+from sqlalchemy import select
+
+from models.database import db, Admin, Incident
+from models.triage import claim_batch, IN_PROGRESS
+from benchmarks.synthetic import load
+
+ADMINS = 8
+INCIDENTS = 400
+BATCH = 7
+
+
+def _claim_concurrently(app):
+    """Every admin claims batches at once until the queue is empty. Returns {admin_id: [ids]}."""
+    with app.app_context():
+        load(50, INCIDENTS)
+        admins = [Admin(email=f"claims{i}@example.com") for i in range(ADMINS)]
+        db.session.add_all(admins)
+        db.session.commit()
+        admin_ids = [a.id for a in admins]
+
+    start = threading.Barrier(ADMINS)
+    claimed, errors = {}, []
+
+    def claimer(admin_id):
+        mine = []
+        with app.app_context():
+            start.wait()
+            try:
+                while rows := claim_batch(admin_id, BATCH):
+                    mine.extend(row.id for row in rows)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.session.remove()
+        claimed[admin_id] = mine
+
+    threads = [threading.Thread(target=claimer, args=(a,)) for a in admin_ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    return claimed
+
+
+def _assert_disjoint(app, claimed):
+    sets = {admin_id: set(ids) for admin_id, ids in claimed.items()}
+    for admin_id, ids in claimed.items():
+        assert len(ids) == len(sets[admin_id]), "an admin was handed the same incident twice"
+    everyone = set().union(*sets.values())
+    assert sum(len(s) for s in sets.values()) == len(everyone), "an incident was claimed by two admins"
+
+    with app.app_context():
+        rows = db.session.execute(select(Incident.id, Incident.status, Incident.assignee_id)).all()
+    assert everyone == {row.id for row in rows}, "incidents were left unclaimed"
+    for row in rows:
+        assert row.status == IN_PROGRESS
+        assert row.id in sets[row.assignee_id]
+
+
+def test_concurrent_claims_are_disjoint(app):
+    _assert_disjoint(app, _claim_concurrently(app))
+
+
+def test_concurrent_claims_skip_locked_rows_on_postgresql(app):
+    with app.app_context():
+        dialect = db.engine.dialect.name
+    if dialect != 'postgresql':
+        pytest.skip("FOR UPDATE SKIP LOCKED needs PostgreSQL; set TEST_DATABASE_URL to a scratch "
+                    f"PostgreSQL database to run it (running on {dialect})")
+    _assert_disjoint(app, _claim_concurrently(app))
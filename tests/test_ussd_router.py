@@ -0,0 +1,65 @@
+# tests/test_ussd_router.py
+import asyncio
+import json
+import socket
+
+from ussd.router import USSDRouter
+
+BODY = {"sessionId": "ATUid_42", "phoneNumber": "+2348012345678", "serviceCode": "*000#", "text": "1"}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def _post(router, body=BODY):
+    sent = []
+    messages = iter([{'type': 'http.request', 'body': json.dumps(body).encode()}])
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'path': '/ussd', 'method': 'POST', 'headers': [(b'content-type', b'application/json')]}
+    await router(scope, receive, send)
+    return sent[0]['status'], dict(sent[0]['headers']), json.loads(sent[1]['body'])
+
+
+def _assert_unavailable(status, headers, payload):
+    assert status == 200
+    assert headers[b'content-type'] == b'application/json'
+    assert payload == {
+        "sessionID": "ATUid_42",
+        "userID": "ATUid_42",
+        "msisdn": "+2348012345678",
+        "message": "Service temporarily unavailable. Please try again later.",
+        "continueSession": False,
+        "raw_response": "END Service temporarily unavailable. Please try again later.",
+    }
+
+
+def test_no_node_available_answers_with_an_end_payload():
+    router = USSDRouter([f"http://127.0.0.1:{_free_port()}"])
+    _assert_unavailable(*asyncio.run(_post(router)))
+
+
+def test_node_failing_mid_request_answers_with_an_end_payload():
+    requests = []
+
+    async def run():
+        async def handle(reader, writer):
+            # Read the request, then die without answering
+            requests.append(await reader.readuntil(b'\r\n\r\n'))
+            writer.close()
+
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await _post(USSDRouter([f"http://127.0.0.1:{port}"]))
+
+    _assert_unavailable(*asyncio.run(run()))
+    assert len(requests) == 1, "the request was sent to the node again"
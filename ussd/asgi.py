@@ -0,0 +1,223 @@
+# ussd/asgi.py
+"""
+Async serving mode for the USSD endpoint.
+
+    uvicorn ussd.asgi:app --host 0.0.0.0 --port 8001
+    gunicorn ussd.asgi:app -k uvicorn.workers.UvicornWorker -w 2
+
+Runs the same flow as the Flask /ussd endpoint (ussd_steps) with the same
+request and response payloads, but awaits its database actions, so one process
+holds thousands of in-flight gateway requests instead of one per thread.
+Requests for the same session are serialized by a per-session lock; other
+sessions never wait on it. Only /ussd and /metrics are served here; the admin
+API stays on the WSGI app.
+"""
+import asyncio
+import json
+import logging
+import time
+import weakref
+
+from app import app as flask_app
+from services.metrics import (registry, http_latency, ussd_transitions, ussd_handle_seconds, ussd_replay,
+                              scrape_allowed)
+from ussd.ussd_flow import ussd_steps, run_steps_async
+from ussd.ussd_handler import (_parse_body, _is_initial_dial, _make_response_payload, _replayable,
+                               SESSION_TTL_MINUTES)
+from ussd.async_flow import AsyncActions
+from ussd.resilience import DeadlineGuard
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 64 * 1024
+CLEANUP_SECONDS = 30
+
+
+class AsyncSessionStore:
+    """Sessions owned by one event loop."""
+
+    def __init__(self):
+        self.sessions = {}    # session_id -> USSDSession
+        self._locks = weakref.WeakValueDictionary()
+
+    def lock(self, session_id):
+        # Locks live only while a request holds or waits on them
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        return lock
+
+    def cleanup(self):
+        for sid in [sid for sid, s in self.sessions.items() if s.is_expired(SESSION_TTL_MINUTES)]:
+            del self.sessions[sid]
+
+
+async def _read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise ValueError("request body too large")
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _respond(send, status, body, content_type=b'application/json'):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class USSDApp:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.store = AsyncSessionStore()
+        self.actions = None
+        self.guard = None
+        self.in_flight = 0
+        self._started = None
+        self._cleanup_task = None
+
+    # --- lifecycle ------------------------------------------------------------------
+
+    async def startup(self):
+        if self._started is None:
+            self._started = asyncio.ensure_future(self._start())
+        await self._started
+
+    async def _start(self):
+        self.actions = AsyncActions(self.flask_app)
+        self.guard = DeadlineGuard(self.flask_app)
+        await self.actions.warm_up()
+        self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def shutdown(self):
+        if self._cleanup_task:
+            self._cleanup_task.cancel()
+        if self.actions:
+            await self.actions.close()
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(CLEANUP_SECONDS)
+            self.store.cleanup()
+            await asyncio.to_thread(self.guard.replay_spool)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # --- requests -------------------------------------------------------------------
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        path, method = scope['path'], scope['method']
+        headers = dict(scope['headers'])
+        if path == '/metrics' and method == 'GET':
+            config = self.flask_app.config
+            if not scrape_allowed(headers.get(b'authorization', b'').decode('latin-1'),
+                                  config.get('METRICS_TOKEN'), config.get('METRICS_PUBLIC')):
+                return await _respond(send, 401, b'unauthorized\n', b'text/plain')
+            return await _respond(send, 200, registry.render().encode(), b'text/plain; version=0.0.4')
+        if path != '/ussd':
+            return await _respond(send, 404, b'{"msg": "Not found"}')
+        if method != 'POST':
+            return await _respond(send, 405, b'{"msg": "Method not allowed"}')
+
+        started = time.perf_counter()
+        arrived = time.monotonic()
+        self.in_flight += 1
+        status = 200
+        try:
+            try:
+                body = await _read_body(receive)
+            except ValueError:
+                status = 413
+                return await _respond(send, status, b'{"msg": "Request body too large"}')
+            if body is None:
+                return
+            await self.startup()
+            payload = await self.handle(_parse_body(headers, body), arrived)
+            await _respond(send, status, json.dumps(payload).encode())
+        finally:
+            self.in_flight -= 1
+            http_latency.observe(time.perf_counter() - started, 'ussd_async', method, status)
+
+    async def handle(self, parsed, arrived=None):
+        """Same contract as ussd_handler.ussd_handler(), minus the request logging."""
+        deadline = self.guard.deadline(time.monotonic() if arrived is None else arrived)
+        merged = parsed['merged']
+        session_id = parsed['session_id']
+        service_code = parsed['service_code']
+        phone_number = parsed['phone_number']
+        text = parsed['text']
+        new_session = parsed['new_session']
+
+        if not session_id or not phone_number:
+            return {
+                "error": "Missing required parameters",
+                "expected": ["sessionId | sessionID | session_id", "phoneNumber | msisdn"],
+                "received": merged
+            }
+
+        store = self.store
+        if new_session and _is_initial_dial(text, service_code):
+            replay_text = _replayable(store.sessions.get(session_id))
+            if replay_text:
+                ussd_replay.inc("hit")
+                return _make_response_payload(session_id, merged, replay_text)
+            ussd_replay.inc("miss")
+
+        try:
+            async with store.lock(session_id):
+                existing = store.sessions.get(session_id)
+                from_state = existing.state.name if existing else "NONE"
+                started = time.perf_counter()
+                steps = ussd_steps(store.sessions, session_id, phone_number, text, new_session,
+                                   session_ttl_minutes=SESSION_TTL_MINUTES)
+                response_text = await run_steps_async(steps, self.guard.async_actions(self.actions.table, deadline))
+                ussd_handle_seconds.observe(time.perf_counter() - started, from_state)
+                ussd_transitions.inc(from_state, store.sessions[session_id].state.name)
+                payload = _make_response_payload(session_id, merged, response_text)
+                if not payload['continueSession']:
+                    store.sessions.pop(session_id, None)
+        except Exception:
+            logger.exception("Error in async handle_ussd")
+            return {
+                "sessionID": session_id,
+                "userID": merged.get('userID') or session_id,
+                "msisdn": phone_number,
+                "message": "Internal server error",
+                "continueSession": False,
+                "raw_response": "END Internal server error."
+            }
+        return payload
+
+
+app = USSDApp(flask_app)
+
+registry.gauge('ussd_async_sessions', 'Sessions held by the async USSD store', lambda: len(app.store.sessions))
+registry.gauge('ussd_async_in_flight', 'USSD requests in progress on the async endpoint', lambda: app.in_flight)
@@ -0,0 +1,159 @@
+# ussd/async_flow.py
+"""
+Async counterparts of the database actions yielded by ussd_steps(), on
+SQLAlchemy's asyncio engine (used by the ASGI serving mode, ussd/asgi.py).
+
+The async driver is optional and follows the primary database URL: asyncpg for
+PostgreSQL, aiosqlite for SQLite. USSD_ASYNC_DATABASE_URL overrides it.
+"""
+import asyncio
+import importlib.util
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from models.database import User, Incident, SubmissionKey
+from models.locations import resolver, canonicalize
+from models.queries import serialize_report
+from services.events import broker
+from ussd.ussd_flow import (recent_submissions, submission_key, _remember_submission, build_incident,
+                            format_recent_reports, format_report_details, parse_report_selection)
+
+ASYNC_DRIVERS = {'postgresql': 'asyncpg', 'sqlite': 'aiosqlite'}
+
+
+def async_database_url(url):
+    """postgresql://... -> postgresql+asyncpg://..., sqlite:///x -> sqlite+aiosqlite:///x"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None:
+        raise RuntimeError(f"No async driver known for {backend}; set USSD_ASYNC_DATABASE_URL")
+    query = dict(url.query)
+    sslmode = query.pop('sslmode', None)
+    if backend == 'postgresql' and sslmode:
+        # asyncpg spells libpq's sslmode as ssl
+        query['ssl'] = sslmode
+    return url.set(drivername=f"{backend}+{driver}", query=query)
+
+
+class AsyncActions:
+    """One async engine per process; `table` plugs into run_steps_async()."""
+
+    def __init__(self, app):
+        # Imported here so the sync app never needs the asyncio extension's extras
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+        self.app = app
+        url = app.config.get('USSD_ASYNC_DATABASE_URL') or async_database_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        driver = make_url(url).get_driver_name()
+        if importlib.util.find_spec(driver) is None:
+            raise RuntimeError(f"The async USSD endpoint needs the {driver} package (pip install {driver})")
+
+        pool_size = app.config.get('USSD_ASYNC_POOL_SIZE', 20)
+        max_overflow = app.config.get('USSD_ASYNC_MAX_OVERFLOW', 30)
+        if make_url(url).get_backend_name() == 'sqlite':
+            # One writer at a time: queue in the pool rather than fail with "database is locked"
+            pool_size, max_overflow = 1, 0
+        self.engine = create_async_engine(
+            url,
+            pool_pre_ping=True,
+            pool_recycle=300,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+        )
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.table = {
+            'find_submission': self.find_submission,
+            'recent_reports': self.recent_reports,
+            'report_details': self.report_details,
+            'save_incident': self.save_incident,
+        }
+
+    async def warm_up(self):
+        """Load the location table before traffic (it is read from memory per request)."""
+        await asyncio.to_thread(self._in_app, resolver.load)
+
+    async def close(self):
+        await self.engine.dispose()
+
+    def _in_app(self, fn, *args):
+        with self.app.app_context():
+            return fn(*args)
+
+    async def _recent_incidents(self, phone_number):
+        stmt = (select(Incident)
+                .join(User, Incident.user_id == User.id)
+                .where(User.phone_number == phone_number)
+                .order_by(Incident.created_at.desc())
+                .limit(5))
+        async with self.sessions() as s:
+            return (await s.scalars(stmt)).all()
+
+    async def find_submission(self, session_id, phone_number):
+        key = submission_key(session_id, phone_number)
+        ref = recent_submissions.get(key)
+        if ref:
+            return ref
+        async with self.sessions() as s:
+            ref = await s.scalar(select(SubmissionKey.reference).where(SubmissionKey.key == key))
+        if ref:
+            _remember_submission(key, ref)
+        return ref
+
+    async def recent_reports(self, phone_number):
+        return format_recent_reports(await self._recent_incidents(phone_number))
+
+    async def report_details(self, phone_number, selection):
+        index, error = parse_report_selection(selection)
+        if error:
+            return error
+        return format_report_details(await self._recent_incidents(phone_number), index)
+
+    async def resolve_location(self, raw):
+        location_id = resolver.cached(raw)
+        if location_id is None and canonicalize(raw)[0]:
+            # First sighting of this spelling: the resolver writes it through the sync engine
+            location_id = await asyncio.to_thread(self._in_app, resolver.resolve, raw)
+        return location_id
+
+    async def _user_id(self, s, phone_number):
+        user_id = await s.scalar(select(User.id).where(User.phone_number == phone_number))
+        if user_id is not None:
+            return user_id
+        user = User(phone_number=phone_number)
+        try:
+            async with s.begin_nested():
+                s.add(user)
+            return user.id
+        except IntegrityError:
+            # Concurrent first report from the same phone created the user
+            return await s.scalar(select(User.id).where(User.phone_number == phone_number))
+
+    async def save_incident(self, session):
+        """Async save_incident(): same idempotency key, one transaction."""
+        key = submission_key(session.session_id, session.phone_number)
+        existing = await self.find_submission(session.session_id, session.phone_number)
+        if existing:
+            return existing
+
+        location_id = await self.resolve_location(session.location)
+
+        async with self.sessions() as s:
+            user_id = await self._user_id(s, session.phone_number)
+            incident = build_incident(session, user_id, location_id)
+            s.add(incident)
+            s.add(SubmissionKey(key=key, reference=incident.reference))
+            try:
+                await s.flush()
+                report = serialize_report(incident)
+                await s.commit()
+            except IntegrityError:
+                await s.rollback()
+                existing = await self.find_submission(session.session_id, session.phone_number)
+                if existing:
+                    return existing
+                raise
+
+        _remember_submission(key, incident.reference)
+        broker.publish_incident(report)
+        return incident.reference
@@ -0,0 +1,186 @@
+# ussd/resilience.py
+"""
+Latency budget for the USSD path.
+
+Gateways drop a session that is not answered within a few seconds, and the
+subscriber's typed input goes with it. Every request gets a deadline
+(USSD_DEADLINE_SECONDS from arrival); the flow's database actions run against
+what is left of it and through db_breaker. A call that times out, fails, or is
+refused by an open breaker is answered in degraded mode instead:
+
+find_submission   in-memory recent submissions only
+recent_reports /  "reports temporarily unavailable"
+report_details
+save_incident     spooled locally (ussd/spool.py) under the reference the
+                  subscriber is given, and replayed once the database is back
+
+Menus never touch the database and are unaffected.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from services.breaker import db_breaker, CLOSED
+from services.metrics import registry
+from services.profiling import capture_sql, merge_sql, is_profiling
+from ussd import spool
+from ussd.ussd_flow import SYNC_ACTIONS, recent_submissions, submission_key, session_reference, _remember_submission
+
+logger = logging.getLogger(__name__)
+
+REPORTS_UNAVAILABLE = "END Reports are temporarily unavailable. Please try again later."
+# With less budget than this left, answer degraded without starting the call
+MIN_CALL_SECONDS = 0.05
+
+degraded_total = registry.counter(
+    'ussd_degraded_total', 'USSD actions answered without the database', ('action', 'reason'))
+
+
+class DeadlineGuard:
+    def __init__(self, app, breaker=db_breaker):
+        self.app = app
+        self.breaker = breaker
+        self.budget = app.config.get('USSD_DEADLINE_SECONDS', 3.0)
+        self.spool_dir = app.config.get('USSD_SPOOL_DIR', 'spool')
+        self.threads = app.config.get('USSD_DB_THREADS', 4)
+        breaker.configure(
+            failure_threshold=app.config.get('DB_BREAKER_FAILURES'),
+            slow_seconds=app.config.get('DB_BREAKER_SLOW_SECONDS'),
+            reset_seconds=app.config.get('DB_BREAKER_RESET_SECONDS'),
+        )
+        breaker.on_close(self.replay_spool_soon)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+
+    def deadline(self, started):
+        """started: time.monotonic() when the request arrived."""
+        return started + self.budget
+
+    # --- degraded answers -------------------------------------------------------
+
+    def degraded(self, name, args, reason):
+        degraded_total.inc(name, reason)
+        if name == 'find_submission':
+            return recent_submissions.get(submission_key(*args))
+        if name == 'save_incident':
+            session = args[0]
+            key = submission_key(session.session_id, session.phone_number)
+            reference = recent_submissions.get(key)
+            if reference is None:
+                reference = session_reference(session)
+                spool.spool_submission(key, reference, session, self.spool_dir)
+                _remember_submission(key, reference)
+            return reference
+        return REPORTS_UNAVAILABLE
+
+    def _admit(self, name, args, deadline):
+        """Remaining seconds for the call, or (None, reason) if it must not start."""
+        remaining = deadline - time.monotonic()
+        if remaining < MIN_CALL_SECONDS:
+            return None, 'deadline'
+        if not self.breaker.allow():
+            return None, 'breaker_open'
+        if name == 'save_incident':
+            # Fixed up front so a commit that lands after the deadline and the spool agree
+            session_reference(args[0])
+        return remaining, None
+
+    def _failed(self, name, reason, error=None):
+        self.breaker.record_failure(reason)
+        logger.warning("USSD %s answered degraded (%s)%s", name, reason, f": {error}" if error else "")
+
+    # --- sync (Flask) -----------------------------------------------------------
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # Created on first use so it lives in the worker process, not the preload master
+                self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='ussd-db')
+            return self._executor
+
+    def _in_app(self, fn, args, profiling):
+        with self.app.app_context():
+            # The request's g isn't visible here; its SQL is carried back to it
+            return capture_sql(fn, *args, profiling=profiling)
+
+    def sync_actions(self, deadline, actions=SYNC_ACTIONS):
+        return {name: self._sync_call(name, fn, deadline) for name, fn in actions.items()}
+
+    def _sync_call(self, name, fn, deadline):
+        def call(*args):
+            remaining, refused = self._admit(name, args, deadline)
+            if refused:
+                return self.degraded(name, args, refused)
+            started = time.monotonic()
+            # A worker thread, so an unresponsive database can't hold the request past its deadline
+            future = self._pool().submit(self._in_app, fn, args, is_profiling())
+            try:
+                result, captured = future.result(timeout=remaining)
+            except FutureTimeout:
+                self._failed(name, 'timeout')
+                return self.degraded(name, args, 'timeout')
+            except SQLAlchemyError as e:
+                self._failed(name, 'error', e)
+                return self.degraded(name, args, 'error')
+            except BaseException:
+                # Not a database failure, but it must still settle a half-open probe
+                self.breaker.record_failure('exception')
+                raise
+            self.breaker.record(time.monotonic() - started)
+            merge_sql(captured)
+            return result
+        return call
+
+    # --- async (ASGI) -----------------------------------------------------------
+
+    def async_actions(self, actions, deadline):
+        return {name: self._async_call(name, fn, deadline) for name, fn in actions.items()}
+
+    def _async_call(self, name, fn, deadline):
+        async def call(*args):
+            remaining, refused = self._admit(name, args, deadline)
+            if refused is None:
+                started = time.monotonic()
+                try:
+                    result = await asyncio.wait_for(fn(*args), remaining)
+                except asyncio.TimeoutError:
+                    self._failed(name, 'timeout')
+                    refused = 'timeout'
+                except SQLAlchemyError as e:
+                    self._failed(name, 'error', e)
+                    refused = 'error'
+                except BaseException:
+                    # Bugs and cancellation must still settle a half-open probe
+                    self.breaker.record_failure('exception')
+                    raise
+                else:
+                    self.breaker.record(time.monotonic() - started)
+                    return result
+            if name == 'save_incident':
+                # Spooling fsyncs; keep it off the event loop
+                return await asyncio.to_thread(self.degraded, name, args, refused)
+            return self.degraded(name, args, refused)
+        return call
+
+    # --- spool replay -----------------------------------------------------------
+
+    def replay_spool_soon(self):
+        threading.Thread(target=self.replay_spool, name='ussd-spool-replay', daemon=True).start()
+
+    def replay_spool(self):
+        """Replay spooled submissions if the breaker is closed (one replay at a time per process)."""
+        if self.breaker.state != CLOSED or not self._replay_lock.acquire(blocking=False):
+            return
+        try:
+            with self.app.app_context():
+                if spool.pending(self.spool_dir):
+                    spool.replay(self.spool_dir)
+        except Exception as e:
+            logger.warning("Spool replay failed: %s", e)
+        finally:
+            self._replay_lock.release()
@@ -0,0 +1,341 @@
+# ussd/router.py
+"""
+Session-affinity router for the USSD endpoint.
+
+    USSD_ROUTER_NODES=http://10.0.0.11:8001,http://10.0.0.12:8001 \\
+        uvicorn ussd.router:app --host 0.0.0.0 --port 8000
+
+Sessions live in the memory of the process serving them (session_store in
+ussd_handler.py, AsyncSessionStore in asgi.py), so every keypress of a session
+has to reach the same process. The router consistent-hashes sessionId onto
+the configured nodes (services/hashring.py) and proxies POST /ussd there over
+pooled keep-alive connections. Each node must be one serving process, since
+the workers behind one port do not share sessions: uvicorn ussd.asgi:app
+without --workers, or gunicorn with USSD_ROUTER_NODE=true, which makes
+gunicorn.conf.py run a single worker and refuse to start with more.
+
+A node that refuses connections or fails its health check is routed around:
+only its own sessions move, to the next node on the ring, and they return
+when it is back. Adding or removing a node moves about 1/N of sessions.
+Membership is read from USSD_ROUTER_NODES at startup only. To change it,
+update the list on every router and restart them all: routers with different
+lists send the same session to different nodes.
+A request is never sent twice: once it is written to a node, a failure is
+answered with an END message (as ussd_handler does when degraded) rather than
+retried, since the node may already have run it.
+GET /router/nodes shows membership; GET /metrics serves the router's metrics.
+"""
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import urlsplit, parse_qsl
+
+from decouple import config, Csv
+
+from services.hashring import HashRing
+from services.metrics import registry, http_latency, scrape_allowed
+from ussd.ussd_handler import _parse_body, _make_response_payload
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_IDLE_PER_NODE = 64
+# Below the nodes' keep-alive timeouts (gunicorn 2s, uvicorn 5s), so the router
+# drops an idle connection before the node does and never writes into one closing
+MAX_IDLE_SECONDS = 1.5
+CONNECT_TIMEOUT = 1.0
+SESSION_KEYS = ('sessionid', 'session_id', 'session')   # as accepted by _normalize_payload, lowercased
+HOP_BY_HOP = {b'connection', b'keep-alive', b'proxy-connection', b'transfer-encoding', b'te', b'trailer',
+              b'upgrade', b'host', b'content-length'}
+UNAVAILABLE = "END Service temporarily unavailable. Please try again later."
+
+routed_total = registry.counter(
+    'ussd_router_requests_total', 'USSD requests proxied, by node and upstream status', ('node', 'status'))
+rerouted_total = registry.counter(
+    'ussd_router_rerouted_total', 'Requests sent past their session\'s node because it was unreachable', ('node',))
+
+
+def _session_key(headers, body):
+    content_type = headers.get(b'content-type', b'').decode('latin-1').lower()
+    try:
+        if 'json' in content_type:
+            data = json.loads(body or b'null')
+        else:
+            data = dict(parse_qsl(body.decode('utf-8', 'replace'), keep_blank_values=True))
+    except ValueError:
+        return ''
+    if not isinstance(data, dict):
+        return ''
+    lowered = {str(k).lower(): v for k, v in data.items()}
+    for name in SESSION_KEYS:
+        if lowered.get(name):
+            return str(lowered[name])
+    return ''
+
+
+def _unavailable(headers, body):
+    """The END reply a node gives when degraded, in the gateway's payload, for when none can answer."""
+    parsed = _parse_body(headers, body)
+    payload = _make_response_payload(parsed['session_id'], parsed['merged'], UNAVAILABLE)
+    return 200, [(b'content-type', b'application/json')], json.dumps(payload).encode()
+
+
+class NodeUnavailable(Exception):
+    pass
+
+
+class NodePool:
+    """Keep-alive HTTP/1.1 connections to one node."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.url = url
+        self.host, self.port = parts.hostname, parts.port or 80
+        self._idle = []   # (reader, writer, idle since)
+
+    async def request(self, head, body, timeout):
+        """
+        Send one request; returns (status, headers, body). Raises NodeUnavailable
+        if it can't connect. Once written the request is not resent, even on a
+        reused connection: the node may have run it before the connection broke.
+        """
+        connection = self._reusable()
+        if connection:
+            reader, writer = connection
+        else:
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), CONNECT_TIMEOUT)
+            except (OSError, asyncio.TimeoutError) as e:
+                raise NodeUnavailable(f"{self.url}: {e}") from e
+        try:
+            writer.write(head + body)
+            status, headers, data, keep_alive = await asyncio.wait_for(_read_response(reader), timeout)
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive and len(self._idle) < MAX_IDLE_PER_NODE:
+            self._idle.append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+        return status, headers, data
+
+    def _reusable(self):
+        """The most recent idle connection the node should still be holding open, or None."""
+        while self._idle:
+            reader, writer, since = self._idle.pop()
+            if time.monotonic() - since < MAX_IDLE_SECONDS and not reader.at_eof() and not writer.is_closing():
+                return reader, writer
+            writer.close()
+        return None
+
+    def close(self):
+        for _, writer, _ in self._idle:
+            writer.close()
+        self._idle.clear()
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    version, status = status_line.split(None, 2)[:2]
+    headers = []
+    length, chunked, keep_alive = None, False, version == b'HTTP/1.1'
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.partition(b':')
+        name, value = name.strip().lower(), value.strip()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'transfer-encoding':
+            chunked = b'chunked' in value.lower()
+        elif name == b'connection':
+            keep_alive = value.lower() == b'keep-alive'
+        if name not in HOP_BY_HOP:
+            headers.append((name, value))
+    if chunked:
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            chunk = await reader.readexactly(size + 2)
+            if not size:
+                break
+            chunks.append(chunk[:-2])
+        data = b''.join(chunks)
+    elif length is not None:
+        data = await reader.readexactly(length)
+    else:
+        data, keep_alive = await reader.read(), False
+    return int(status), headers, data, keep_alive
+
+
+async def _read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise ValueError("request body too large")
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _respond(send, status, body, headers=((b'content-type', b'application/json'),)):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': list(headers) + [(b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class USSDRouter:
+    def __init__(self, nodes, timeout=10.0, check_seconds=5.0, vnodes=160, metrics_token=None,
+                 metrics_public=False):
+        self.ring = HashRing(nodes, vnodes=vnodes)
+        self.pools = {node: NodePool(node) for node in nodes}
+        self.timeout = timeout
+        self.check_seconds = check_seconds
+        self.metrics_token = metrics_token
+        self.metrics_public = metrics_public
+        self._health_task = None
+
+    # --- membership -----------------------------------------------------------------
+
+    def _down(self, node, reason):
+        if self.ring.mark_down(node):
+            logger.warning("USSD router: %s is down (%s); its sessions move to the next node", node, reason)
+        self.pools[node].close()
+
+    def _up(self, node):
+        if self.ring.mark_up(node):
+            logger.info("USSD router: %s is back; its sessions return to it", node)
+
+    async def check_nodes(self):
+        async def probe(node):
+            pool = self.pools[node]
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(pool.host, pool.port), CONNECT_TIMEOUT)
+            except (OSError, asyncio.TimeoutError) as e:
+                self._down(node, str(e) or 'timeout')
+                return
+            writer.close()
+            self._up(node)
+        await asyncio.gather(*(probe(node) for node in self.ring.nodes))
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.check_seconds)
+            await self.check_nodes()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.check_nodes()
+                self._health_task = asyncio.create_task(self._health_loop())
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._health_task:
+                    self._health_task.cancel()
+                for pool in self.pools.values():
+                    pool.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # --- requests -------------------------------------------------------------------
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        path, method = scope['path'], scope['method']
+        headers = dict(scope['headers'])
+        if path == '/metrics' and method == 'GET':
+            if not scrape_allowed(headers.get(b'authorization', b'').decode('latin-1'),
+                                  self.metrics_token, self.metrics_public):
+                return await _respond(send, 401, b'unauthorized\n', [(b'content-type', b'text/plain')])
+            return await _respond(send, 200, registry.render().encode(),
+                                  [(b'content-type', b'text/plain; version=0.0.4')])
+        if path == '/router/nodes' and method == 'GET':
+            live = set(self.ring.live_nodes)
+            nodes = [{"node": node, "up": node in live} for node in self.ring.nodes]
+            return await _respond(send, 200, json.dumps({"nodes": nodes}).encode())
+        if path != '/ussd':
+            return await _respond(send, 404, b'{"msg": "Not found"}')
+        if method != 'POST':
+            return await _respond(send, 405, b'{"msg": "Method not allowed"}')
+
+        started = time.perf_counter()
+        status = 502
+        try:
+            try:
+                body = await _read_body(receive)
+            except ValueError:
+                status = 413
+                return await _respond(send, status, b'{"msg": "Request body too large"}')
+            if body is None:
+                return
+            status, response_headers, data = await self.forward(scope, headers, body)
+            await _respond(send, status, data, response_headers)
+        finally:
+            http_latency.observe(time.perf_counter() - started, 'ussd_router', method, status)
+
+    def _request_head(self, scope, headers, body, pool):
+        target = scope.get('raw_path') or scope['path'].encode()
+        if scope.get('query_string'):
+            target += b'?' + scope['query_string']
+        lines = [b'POST ' + target + b' HTTP/1.1', b'Host: ' + f'{pool.host}:{pool.port}'.encode()]
+        lines += [name + b': ' + value for name, value in headers.items() if name not in HOP_BY_HOP]
+        client = scope.get('client')
+        if client and b'x-forwarded-for' not in headers:
+            lines.append(b'X-Forwarded-For: ' + client[0].encode())
+        lines.append(b'Content-Length: ' + str(len(body)).encode())
+        return b'\r\n'.join(lines) + b'\r\n\r\n'
+
+    async def forward(self, scope, headers, body):
+        """Proxy to the session's node, falling through the ring past unreachable ones."""
+        key = _session_key(headers, body)
+        tried = set()
+        while True:
+            node = self.ring.node_for(key, skip=tried)
+            if node is None:
+                return _unavailable(headers, body)
+            if tried:
+                rerouted_total.inc(node)
+            pool = self.pools[node]
+            try:
+                status, response_headers, data = await pool.request(
+                    self._request_head(scope, headers, body, pool), body, self.timeout)
+            except NodeUnavailable as e:
+                self._down(node, e)
+                tried.add(node)
+                continue
+            except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                # The node took the request; sending it elsewhere could run it twice
+                logger.warning("USSD router: %s failed mid-request: %r", node, e)
+                routed_total.inc(node, 504)
+                return _unavailable(headers, body)
+            routed_total.inc(node, status)
+            return status, response_headers, data
+
+
+app = USSDRouter(
+    config('USSD_ROUTER_NODES', default='', cast=Csv()),
+    timeout=config('USSD_ROUTER_TIMEOUT', default=10.0, cast=float),
+    check_seconds=config('USSD_ROUTER_CHECK_SECONDS', default=5.0, cast=float),
+    vnodes=config('USSD_ROUTER_VNODES', default=160, cast=int),
+    metrics_token=config('METRICS_TOKEN', default=None),
+    metrics_public=config('METRICS_PUBLIC', default=False, cast=bool),
+)
+
+registry.gauge('ussd_router_live_nodes', 'USSD nodes currently receiving sessions', lambda: len(app.ring.live_nodes))
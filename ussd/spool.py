@@ -0,0 +1,202 @@
+# ussd/spool.py
+"""
+Local spool for USSD submissions taken while the database is unavailable.
+
+Each process appends NDJSON records to its own file in USSD_SPOOL_DIR (fsynced,
+so an accepted report survives a crash). replay() claims whole files by
+renaming them and persists every record with the reference the subscriber was
+given; records whose submission key already exists are skipped, so a file can
+be replayed again after a partial failure. A record that can't be persisted
+for a reason other than the database (a missing field, a bad created_at) is
+appended to rejected.jsonl in the spool directory and skipped, so it can't
+hold the rest of its file back.
+"""
+import glob
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from models.database import db, User, Incident, SubmissionKey
+from models.locations import resolver
+from models.queries import serialize_report
+from services.events import broker
+from services.metrics import registry
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: appends are not locked
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# A claim older than this belongs to a replay that died part-way
+STALE_CLAIM_SECONDS = 600
+# Not *.ndjson, so replay() never picks it up
+REJECTED_FILE = 'rejected.jsonl'
+
+spooled_total = registry.counter('ussd_spooled_total', 'Submissions spooled locally while the database was unavailable')
+replayed_total = registry.counter('ussd_spool_replayed_total', 'Spooled submissions replayed', ('result',))
+
+
+def spool_dir(directory=None):
+    return directory or current_app.config.get('USSD_SPOOL_DIR', 'spool')
+
+
+def _spool_path(directory):
+    return os.path.join(directory, f"incidents-{socket.gethostname()}-{os.getpid()}.ndjson")
+
+
+def spool_submission(key, reference, session, directory):
+    """Durably record one submission (directory is resolved by the caller)."""
+    os.makedirs(directory, exist_ok=True)
+    record = {
+        "key": key,
+        "reference": reference,
+        "phone_number": session.phone_number,
+        "category": session.category,
+        "location": session.location,
+        "severity": session.severity,
+        "description": session.description,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+    line = (json.dumps(record) + '\n').encode('utf-8')
+    path = _spool_path(directory)
+    while True:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                # replay() may have claimed (renamed) the file while we waited
+                if os.fstat(fd).st_ino != getattr(_stat(path), 'st_ino', None):
+                    continue
+            os.write(fd, line)
+            os.fsync(fd)
+            break
+        finally:
+            os.close(fd)
+    spooled_total.inc()
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def pending(directory=None):
+    directory = spool_dir(directory)
+    return bool(glob.glob(os.path.join(directory, '*.ndjson')) or _stale_claims(directory))
+
+
+def _stale_claims(directory):
+    cutoff = time.time() - STALE_CLAIM_SECONDS
+    return [p for p in glob.glob(os.path.join(directory, '*.claimed')) if os.path.getmtime(p) < cutoff]
+
+
+def _claim(path):
+    claimed = f"{path}.{uuid.uuid4().hex[:8]}.claimed"
+    try:
+        os.rename(path, claimed)
+    except FileNotFoundError:
+        return None   # another worker got it
+    if fcntl:
+        # Wait for an append that started before the rename
+        with open(claimed, 'rb') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+    return claimed
+
+
+def _persist(record):
+    """Write one spooled record. Returns 'inserted' or 'duplicate'."""
+    if db.session.get(SubmissionKey, record["key"]):
+        return 'duplicate'
+    # Before any write in this session (new locations commit on their own connection)
+    location_id = resolver.resolve(record["location"])
+    user = User.query.filter_by(phone_number=record["phone_number"]).first()
+    if not user:
+        user = User(phone_number=record["phone_number"])
+        db.session.add(user)
+        db.session.flush()
+    incident = Incident(
+        reference=record["reference"],
+        category=record["category"],
+        location=record["location"],
+        location_id=location_id,
+        severity=record["severity"],
+        description=record["description"],
+        created_at=datetime.fromisoformat(record["created_at"]),
+        user_id=user.id,
+    )
+    db.session.add(incident)
+    db.session.add(SubmissionKey(key=record["key"], reference=record["reference"]))
+    try:
+        db.session.flush()
+        report = serialize_report(incident)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return 'duplicate'
+    broker.publish_incident(report)
+    return 'inserted'
+
+
+def replay(directory=None):
+    """
+    Persist spooled submissions (inside an app context).
+    Returns {'inserted': n, 'duplicate': n, 'rejected': n}; stops at the first
+    database error.
+    """
+    directory = spool_dir(directory)
+    counts = {'inserted': 0, 'duplicate': 0, 'rejected': 0}
+    paths = sorted(glob.glob(os.path.join(directory, '*.ndjson'))) + _stale_claims(directory)
+    for path in paths:
+        claimed = _claim(path)
+        if claimed is None:
+            continue
+        try:
+            with open(claimed, encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A write torn by a crash; everything after it is intact
+                        logger.warning("Skipping unreadable spool line in %s", claimed)
+                        continue
+                    try:
+                        result = _persist(record)
+                    except (KeyError, ValueError, TypeError, AttributeError) as e:
+                        db.session.rollback()
+                        _reject(directory, claimed, line, e)
+                        result = 'rejected'
+                    counts[result] += 1
+                    replayed_total.inc(result)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            # Keep the file for the next attempt; replayed records are skipped then
+            os.rename(claimed, os.path.join(directory, f"retry-{uuid.uuid4().hex[:8]}.ndjson"))
+            logger.warning("Spool replay stopped: %s", e)
+            break
+        os.remove(claimed)
+    if any(counts.values()):
+        logger.info("Spool replay: %(inserted)d inserted, %(duplicate)d already persisted, "
+                    "%(rejected)d rejected", counts)
+    return counts
+
+
+def _reject(directory, claimed, line, error):
+    """Set a malformed record aside (with why) instead of failing its file forever."""
+    logger.error("Rejected spooled record from %s: %r", claimed, error)
+    with open(os.path.join(directory, REJECTED_FILE), 'a', encoding='utf-8') as f:
+        f.write(json.dumps({"error": repr(error), "file": os.path.basename(claimed), "record": line.strip()}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
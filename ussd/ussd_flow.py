@@ -1,8 +1,16 @@
 # ussd_flow.py
-from datetime import datetime, timedelta
-from models.database import db, User, Incident
+from datetime import datetime
+from collections import OrderedDict
+from enum import IntEnum
+from sqlalchemy.exc import IntegrityError
+from models.database import db, User, Incident, SubmissionKey
+from models.queries import serialize_report
+from models.locations import resolver
+from services.events import broker
 import random
 import string
+import struct
+import time
 
 # Cyber incident categories (numeric menu + readable labels)
 INCIDENT_CATEGORIES = {
@@ -23,29 +31,117 @@ SEVERITY_LEVELS = {
     '4': "Emergency"
 }
 
+# Labels are stored by reference (in memory) or by index (encoded), never copied
+CATEGORY_LABELS = ('',) + tuple(INCIDENT_CATEGORIES.values())
+SEVERITY_LABELS = ('',) + tuple(SEVERITY_LEVELS.values())
+_CATEGORY_CODES = {label: code for code, label in enumerate(CATEGORY_LABELS)}
+_SEVERITY_CODES = {label: code for code, label in enumerate(SEVERITY_LABELS)}
+
+
+class SessionState(IntEnum):
+    INITIAL = 0
+    MAIN_MENU = 1
+    CATEGORY_SELECT = 2
+    LOCATION_INPUT = 3
+    SEVERITY_SELECT = 4
+    DESCRIPTION_INPUT = 5
+    CONFIRMATION = 6
+    VIEW_REPORTS = 7
+    COMPLETE = 8
+    EXIT = 9
+
+
+# version, state, category, severity, created_at, last_active (epoch seconds)
+_HEADER = struct.Struct('<BBBBdd')
+_ENCODING_VERSION = 1
+
+
+def _pack_str(value):
+    data = (value or '').encode('utf-8')
+    return struct.pack('<H', len(data)) + data
+
+
 class USSDSession:
+    """
+    One live USSD session. Held by the hundred-thousand at campaign peaks, so it
+    is slotted: the state is a SessionState, category/severity point at the
+    shared labels above, and timestamps are time.monotonic() floats.
+    last_response is what the gateway was last sent (replayed on a re-dial).
+    """
+    __slots__ = ('session_id', 'phone_number', 'state', 'category', 'location', 'severity',
+                 'description', 'reference', 'last_response', 'created_at', 'last_active')
+
     def __init__(self, session_id, phone_number):
         self.session_id = session_id
         self.phone_number = phone_number
-        self.state = "INITIAL"
-        self.incident_data = {}
-        self.created_at = datetime.utcnow()
-        self.last_active = datetime.utcnow()
-    
+        self.state = SessionState.INITIAL
+        self.category = ''
+        self.location = ''
+        self.severity = ''
+        self.description = ''
+        self.reference = None
+        self.last_response = None
+        self.created_at = self.last_active = time.monotonic()
+
     def is_expired(self, ttl_minutes: int = 5):
-        return datetime.utcnow() > self.last_active + timedelta(minutes=ttl_minutes)
-    
+        return time.monotonic() - self.last_active > ttl_minutes * 60
+
+    def idle_seconds(self):
+        return time.monotonic() - self.last_active
+
     def update_activity(self):
-        self.last_active = datetime.utcnow()
-    
+        self.last_active = time.monotonic()
+
     def generate_reference(self):
         """Generate unique reference number"""
         date_str = datetime.utcnow().strftime("%Y%m%d")
         rand_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
         return f"CYB-{date_str}-{rand_str}"
 
-# module-level replay cache (in-memory)
-session_responses = {}   # key: session_id -> last response string
+    def encode(self):
+        """
+        Compact binary form for shared or persistent session stores. Timestamps
+        are written as wall-clock time, so a session decodes correctly in
+        another process or on another host.
+        """
+        offset = time.time() - time.monotonic()
+        return b''.join((
+            _HEADER.pack(_ENCODING_VERSION, self.state, _CATEGORY_CODES[self.category],
+                         _SEVERITY_CODES[self.severity], self.created_at + offset, self.last_active + offset),
+            _pack_str(self.session_id), _pack_str(self.phone_number), _pack_str(self.location),
+            _pack_str(self.description), _pack_str(self.reference), _pack_str(self.last_response),
+        ))
+
+    @classmethod
+    def decode(cls, data):
+        version, state, category, severity, created_at, last_active = _HEADER.unpack_from(data)
+        if version != _ENCODING_VERSION:
+            raise ValueError(f"unsupported session encoding version {version}")
+        pos = _HEADER.size
+        fields = []
+        for _ in range(6):
+            (size,) = struct.unpack_from('<H', data, pos)
+            pos += 2
+            fields.append(bytes(data[pos:pos + size]).decode('utf-8'))
+            pos += size
+        session_id, phone_number, location, description, reference, last_response = fields
+        session = cls(session_id, phone_number)
+        offset = time.monotonic() - time.time()
+        session.state = SessionState(state)
+        session.category = CATEGORY_LABELS[category]
+        session.severity = SEVERITY_LABELS[severity]
+        session.location = location
+        session.description = description
+        session.reference = reference or None
+        session.last_response = last_response or None
+        session.created_at = created_at + offset
+        session.last_active = last_active + offset
+        return session
+
+# Recently submitted sessions (submission key -> reference), so gateway retries
+# of "1. Submit" are answered without touching the database
+recent_submissions = OrderedDict()
+RECENT_SUBMISSIONS_MAX = 10000
 
 def _looks_like_initial_dial(text: str):
     """
@@ -83,19 +179,52 @@ def _match_category_input(user_input):
             return k
     return None
 
-def handle_ussd(session_store, session_id, phone_number, user_input, new_session=False, replay_cache=None, session_ttl_minutes: int = 5):
+def handle_ussd(session_store, session_id, phone_number, user_input, new_session=False, replay_cache=None, session_ttl_minutes: int = 5, actions=None):
     """
     session_store: dict-like mapping session_id -> USSDSession
     session_id, phone_number: strings
     user_input: normalized text from provider (may be '' for initial dial)
     new_session: boolean flag from provider payload
-    replay_cache: optional dict-like for replay (not strictly required here)
+    replay_cache: optional dict-like that also receives the last response
+                  (the session keeps its own copy in session.last_response)
     session_ttl_minutes: expiry
+    actions: database actions to use (default SYNC_ACTIONS; see ussd/resilience.py)
     Returns: response string (starting with 'CON ' or 'END ')
     """
-    if replay_cache is None:
-        replay_cache = session_responses
+    steps = ussd_steps(session_store, session_id, phone_number, user_input, new_session,
+                       replay_cache, session_ttl_minutes)
+    return run_steps(steps, actions or SYNC_ACTIONS)
+
+
+def run_steps(steps, actions):
+    """Drive a ussd_steps() generator, answering each yielded action with actions[name](*args)."""
+    result = None
+    try:
+        while True:
+            name, *args = steps.send(result)
+            result = actions[name](*args)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def run_steps_async(steps, actions):
+    """run_steps() for coroutine actions (see ussd/asgi.py)."""
+    result = None
+    try:
+        while True:
+            name, *args = steps.send(result)
+            result = await actions[name](*args)
+    except StopIteration as stop:
+        return stop.value
+
 
+def ussd_steps(session_store, session_id, phone_number, user_input, new_session=False, replay_cache=None, session_ttl_minutes: int = 5):
+    """
+    The USSD state machine, free of I/O: database work is yielded as
+    (action, *args) and the result is sent back in, so the same flow runs
+    under the sync Flask handler and the async ASGI handler.
+    Returns (via StopIteration) the response string.
+    """
     # Normalize input to be safe
     user_input = _normalize_input(user_input)
 
@@ -113,7 +242,17 @@ def handle_ussd(session_store, session_id, phone_number, user_input, new_session
         # and it does *not* look like an initial dial, set the session.state to MAIN_MENU
         # so the incoming selection will be processed rather than being discarded.
         if user_input and (not _looks_like_initial_dial(user_input)):
-            session.state = "MAIN_MENU"
+            session.state = SessionState.MAIN_MENU
+
+        # A fresh session answering '1' may be a gateway retry of "1. Submit"
+        # for a session that already ended (possibly on another worker)
+        if user_input == '1':
+            ref = yield ('find_submission', session_id, phone_number)
+            if ref:
+                session.state = SessionState.COMPLETE
+                response = f"END Incident reported successfully!\nReference: {ref}"
+                _remember_response(session, replay_cache, response)
+                return response
 
     # Update activity timestamp
     session.update_activity()
@@ -121,24 +260,24 @@ def handle_ussd(session_store, session_id, phone_number, user_input, new_session
     # State machine
     response = None
 
-    if session.state == "INITIAL":
+    if session.state == SessionState.INITIAL:
         response = ("CON Cyber Incident Reporting:\n"
                    "1. Report New Incident\n"
                    "2. View Previous Reports\n"
                    "3. Help\n"
                    "0. Exit")
-        session.state = "MAIN_MENU"
+        session.state = SessionState.MAIN_MENU
 
-    elif session.state == "MAIN_MENU":
+    elif session.state == SessionState.MAIN_MENU:
         if user_input == '1':
-            session.state = "CATEGORY_SELECT"
+            session.state = SessionState.CATEGORY_SELECT
             response = ("CON Select Incident Category:\n" +
                         "\n".join([f"{k}. {v}" for k, v in INCIDENT_CATEGORIES.items()]))
         elif user_input == '2':
-            session.state = "VIEW_REPORTS"
-            response = get_recent_reports(phone_number)
+            session.state = SessionState.VIEW_REPORTS
+            response = yield ('recent_reports', phone_number)
         elif user_input == '3':
-            session.state = "INITIAL"
+            session.state = SessionState.INITIAL
             response = (
                 "END Help - Cyber Incident Reporting:\n"
                 "• What to report: Forgery, Fraud, Terrorism,\n"
@@ -149,7 +288,7 @@ def handle_ussd(session_store, session_id, phone_number, user_input, new_session
                 "Email: cyber-support@incident.org"
             )
         elif user_input == '0':
-            session.state = "EXIT"
+            session.state = SessionState.EXIT
             response = "END Thank you. Stay safe online."
         else:
             if not user_input:
@@ -158,80 +297,85 @@ def handle_ussd(session_store, session_id, phone_number, user_input, new_session
                             "2. View Previous Reports\n"
                             "3. Help\n"
                             "0. Exit")
-                session.state = "MAIN_MENU"
+                session.state = SessionState.MAIN_MENU
             else:
                 response = "END Invalid option. Please dial again."
 
-    elif session.state == "CATEGORY_SELECT":
+    elif session.state == SessionState.CATEGORY_SELECT:
         matched = _match_category_input(user_input)
         if matched:
-            session.incident_data['category'] = INCIDENT_CATEGORIES[matched]
-            session.state = "LOCATION_INPUT"
+            session.category = INCIDENT_CATEGORIES[matched]
+            session.state = SessionState.LOCATION_INPUT
             # For cyber incidents, "location" can be a URL, platform, or physical location
             response = ("CON Enter location / platform / URL (e.g., example.com, Twitter @user, Building A):")
         else:
             response = ("END Invalid category. Please start again.")
 
-    elif session.state == "LOCATION_INPUT":
+    elif session.state == SessionState.LOCATION_INPUT:
         if user_input:
-            session.incident_data['location'] = user_input
-            session.state = "SEVERITY_SELECT"
+            session.location = user_input
+            session.state = SessionState.SEVERITY_SELECT
             response = ("CON Select Severity Level:\n" +
                         "\n".join([f"{k}. {v}" for k, v in SEVERITY_LEVELS.items()]))
         else:
             response = "CON Enter location / platform / URL (e.g., example.com, Twitter @user, Building A):"
 
-    elif session.state == "SEVERITY_SELECT":
+    elif session.state == SessionState.SEVERITY_SELECT:
         if user_input in SEVERITY_LEVELS:
-            session.incident_data['severity'] = SEVERITY_LEVELS[user_input]
-            session.state = "DESCRIPTION_INPUT"
+            session.severity = SEVERITY_LEVELS[user_input]
+            session.state = SessionState.DESCRIPTION_INPUT
             response = "CON Briefly describe the incident (include attacker handle, sample URL, or any evidence):"
         else:
             response = "END Invalid severity level. Please start again."
 
-    elif session.state == "DESCRIPTION_INPUT":
+    elif session.state == SessionState.DESCRIPTION_INPUT:
         if user_input:
-            session.incident_data['description'] = user_input
-            session.state = "CONFIRMATION"
-            summary = (f"Category: {session.incident_data.get('category','-')}\n"
-                       f"Location: {session.incident_data.get('location','-')}\n"
-                       f"Severity: {session.incident_data.get('severity','-')}\n"
-                       f"Description: {session.incident_data.get('description','-')}")
+            session.description = user_input
+            session.state = SessionState.CONFIRMATION
+            summary = (f"Category: {session.category}\n"
+                       f"Location: {session.location}\n"
+                       f"Severity: {session.severity}\n"
+                       f"Description: {session.description}")
             response = f"CON Confirm submission:\n{summary}\n1. Submit\n2. Cancel"
         else:
             response = "CON Briefly describe the incident (include attacker handle, sample URL, or any evidence):"
 
-    elif session.state == "CONFIRMATION":
+    elif session.state == SessionState.CONFIRMATION:
         if user_input == '1':
-            ref = save_incident(session)
-            session.state = "COMPLETE"
+            ref = yield ('save_incident', session)
+            session.state = SessionState.COMPLETE
             response = f"END Incident reported successfully!\nReference: {ref}"
         else:
-            session.state = "INITIAL"
+            session.state = SessionState.INITIAL
             response = "END Incident reporting cancelled."
 
-    elif session.state == "VIEW_REPORTS":
+    elif session.state == SessionState.VIEW_REPORTS:
         if user_input == '0':
-            session.state = "INITIAL"
+            session.state = SessionState.INITIAL
             response = ("CON Cyber Incident Reporting:\n"
                         "1. Report New Incident\n"
                         "2. View Previous Reports\n"
                         "3. Help\n0. Exit")
         else:
-            response = view_report_details(phone_number, user_input)
+            response = yield ('report_details', phone_number, user_input)
 
     else:
         response = "END Session error. Please dial again."
 
-    # Save last response into replay cache for potential quick replay
-    try:
-        replay_cache[session_id] = response
-    except Exception:
-        pass
-
+    # Save last response for potential quick replay
+    _remember_response(session, replay_cache, response)
     return response
 
 
+def _remember_response(session, replay_cache, response):
+    session.last_response = response
+    if replay_cache is not None:
+        try:
+            replay_cache[session.session_id] = response
+        except Exception:
+            pass
+
+
 def get_recent_reports(phone_number):
     """Get user's recent incident reports"""
     user = User.query.filter_by(phone_number=phone_number).first()
@@ -239,7 +383,10 @@ def get_recent_reports(phone_number):
         return "END No previous reports found."
     
     incidents = Incident.query.filter_by(user_id=user.id).order_by(Incident.created_at.desc()).limit(5).all()
-    
+    return format_recent_reports(incidents)
+
+
+def format_recent_reports(incidents):
     if not incidents:
         return "END No previous reports found."
     
@@ -253,21 +400,32 @@ def get_recent_reports(phone_number):
     return "\n".join(response_lines)
 
 
-def view_report_details(phone_number, selection):
-    """Show details of a specific report"""
+def parse_report_selection(selection):
+    """Returns (index, None) or (None, error response)."""
     try:
         index = int(selection) - 1
         if index < 0:
-            return "END Invalid selection."
+            return None, "END Invalid selection."
     except ValueError:
-        return "END Invalid input."
+        return None, "END Invalid input."
+    return index, None
+
+
+def view_report_details(phone_number, selection):
+    """Show details of a specific report"""
+    index, error = parse_report_selection(selection)
+    if error:
+        return error
     
     user = User.query.filter_by(phone_number=phone_number).first()
     if not user:
         return "END User not found."
     
     incidents = Incident.query.filter_by(user_id=user.id).order_by(Incident.created_at.desc()).limit(5).all()
-    
+    return format_report_details(incidents, index)
+
+
+def format_report_details(incidents, index):
     if 0 <= index < len(incidents):
         detail = incidents[index].summary()
         if len(detail) > 200:
@@ -276,24 +434,92 @@ def view_report_details(phone_number, selection):
     return "END Report not found."
 
 
+def submission_key(session_id, phone_number):
+    return f"{phone_number}:{session_id}"[:128]
+
+
+def _remember_submission(key, reference):
+    recent_submissions[key] = reference
+    recent_submissions.move_to_end(key)
+    while len(recent_submissions) > RECENT_SUBMISSIONS_MAX:
+        recent_submissions.popitem(last=False)
+
+
+def find_submission(session_id, phone_number):
+    """Reference already issued for this session, or None (memory first, then a PK lookup)."""
+    key = submission_key(session_id, phone_number)
+    ref = recent_submissions.get(key)
+    if ref:
+        return ref
+    row = db.session.get(SubmissionKey, key)
+    if row:
+        _remember_submission(key, row.reference)
+        return row.reference
+    return None
+
+
+def session_reference(session):
+    """The session's incident reference, generated once and reused by retries and the spool."""
+    if not session.reference:
+        session.reference = session.generate_reference()
+    return session.reference
+
+
+def build_incident(session, user_id, location_id):
+    return Incident(
+        reference=session_reference(session),
+        category=session.category,
+        location=session.location,
+        location_id=location_id,
+        severity=session.severity,
+        description=session.description,
+        user_id=user_id
+    )
+
+
 def save_incident(session):
-    """Save incident to database"""
+    """Save incident to database (at most once per session)"""
+    key = submission_key(session.session_id, session.phone_number)
+    existing = find_submission(session.session_id, session.phone_number)
+    if existing:
+        return existing
+
+    # Resolved first: new locations are committed on their own connection
+    location = session.location
+    location_id = resolver.resolve(location)
+
     user = User.query.filter_by(phone_number=session.phone_number).first()
     if not user:
         user = User(phone_number=session.phone_number)
         db.session.add(user)
-        db.session.commit()
-    
-    reference = session.generate_reference()
-    incident = Incident(
-        reference=reference,
-        category=session.incident_data.get('category', ''),
-        location=session.incident_data.get('location', ''),
-        severity=session.incident_data.get('severity', ''),
-        description=session.incident_data.get('description', ''),
-        user_id=user.id
-    )
+        db.session.flush()
     
+    incident = build_incident(session, user.id, location_id)
+    reference = incident.reference
     db.session.add(incident)
-    db.session.commit()
+    db.session.add(SubmissionKey(key=key, reference=reference))
+    try:
+        db.session.flush()
+        # Capture before commit so publishing doesn't trigger a refresh query
+        report = serialize_report(incident)
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent retry on another worker committed first; answer with its reference
+        db.session.rollback()
+        existing = find_submission(session.session_id, session.phone_number)
+        if existing:
+            return existing
+        raise
+
+    _remember_submission(key, reference)
+    broker.publish_incident(report)
     return reference
+
+
+# Database actions yielded by ussd_steps()
+SYNC_ACTIONS = {
+    'find_submission': find_submission,
+    'recent_reports': get_recent_reports,
+    'report_details': view_report_details,
+    'save_incident': save_incident,
+}
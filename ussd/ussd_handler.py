@@ -1,19 +1,23 @@
 # ussd/ussd_handler.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from ussd.ussd_flow import handle_ussd   # keep this relative import only if package layout supports it
-import threading, time
+from ussd.resilience import DeadlineGuard
+from services.metrics import registry, ussd_transitions, ussd_handle_seconds, ussd_replay, timed_job
+import json, threading, time
+from urllib.parse import parse_qsl
 
 ussd_bp = Blueprint("ussd", __name__)
 
 # In-memory stores (process-level)
-session_store = {}     # session_id -> USSDSession (from ussd_flow)
-replay_cache = {}      # session_id -> (response_payload_dict, timestamp)
+session_store = {}     # session_id -> USSDSession (from ussd_flow); holds the replay text too
 session_lock = threading.Lock()
 
 # Tunable TTLs
 SESSION_TTL_MINUTES = 5         # session expiry window
 REPLAY_CACHE_TTL_SECONDS = 60   # how long to keep last response for replay
 
+registry.gauge('ussd_live_sessions', 'Sessions held in session_store', lambda: len(session_store))
+
 # --- keep your _extract_and_normalize, _is_initial_dial, _make_response_payload exactly as before ---
 # (copy the full helpers you already wrote here)
 
@@ -21,6 +25,10 @@ def _extract_and_normalize(req):
     # ... your existing helper implementation (unchanged) ...
     json_data = req.get_json(silent=True)
     form_data = req.form.to_dict() if req.form else {}
+    return _normalize_payload(json_data, form_data)
+
+def _normalize_payload(json_data, form_data):
+    # Shared with the ASGI handler (ussd/asgi.py), which parses the body itself
     merged = {}
     if form_data:
         merged.update(form_data)
@@ -70,6 +78,19 @@ def _extract_and_normalize(req):
         'new_session': new_session
     }
 
+def _parse_body(headers, body):
+    # For servers that read the raw body (ussd/asgi.py, ussd/router.py); headers are ASGI's lowercased bytes
+    content_type = headers.get(b'content-type', b'').decode('latin-1').lower()
+    json_data, form_data = None, {}
+    if 'json' in content_type:
+        try:
+            json_data = json.loads(body or b'null')
+        except ValueError:
+            json_data = None
+    elif 'x-www-form-urlencoded' in content_type:
+        form_data = dict(parse_qsl(body.decode('utf-8', 'replace'), keep_blank_values=True))
+    return _normalize_payload(json_data, form_data)
+
 def _is_initial_dial(text, service_code):
     # ... same as your existing implementation ...
     if not text:
@@ -121,9 +142,25 @@ def _make_response_payload(session_id, merged, response_text):
     }
     return payload
 
+_cleanup_started = False
+_guard = None   # DeadlineGuard, created with the first request
+
+@ussd_bp.before_app_request
+def _ensure_cleanup():
+    # Started lazily so the timer thread lives in the worker that serves
+    # traffic (safe with gunicorn --preload) and not in utility scripts.
+    global _cleanup_started, _guard
+    if not _cleanup_started:
+        with session_lock:
+            if not _cleanup_started:
+                _guard = DeadlineGuard(current_app._get_current_object())
+                start_cleanup()
+                _cleanup_started = True
+
 # Use the blueprint decorator (was @app.route before)
 @ussd_bp.route('/ussd', methods=['POST'])
 def ussd_handler():
+    request_started = time.monotonic()
     parsed = _extract_and_normalize(request)
     merged = parsed['merged']
     session_id = parsed['session_id']
@@ -146,34 +183,38 @@ def ussd_handler():
         }), 200
 
     # Fast-path: only replay cached JSON if provider indicates new session AND text looks like initial dial
-    with session_lock:
-        cache_entry = replay_cache.get(session_id)
-        if new_session and cache_entry and _is_initial_dial(text, service_code):
-            payload, ts = cache_entry
-            if (time.time() - ts) <= REPLAY_CACHE_TTL_SECONDS:
-                print(f"[USSD] Replaying cached JSON payload for session {session_id} (initial dial detected)")
-                return jsonify(payload), 200
-            else:
-                del replay_cache[session_id]
-
-    # Call business logic
-    try:
+    if new_session and _is_initial_dial(text, service_code):
         with session_lock:
-            response_text = handle_ussd(
-                session_store=session_store,
-                session_id=session_id,
-                phone_number=phone_number,
-                user_input=text,
-                new_session=new_session,
-                replay_cache={k: v[0] for k, v in replay_cache.items()},
-                session_ttl_minutes=SESSION_TTL_MINUTES
-            )
-            payload = _make_response_payload(session_id, merged, response_text)
-            replay_cache[session_id] = (payload, time.time())
-            if not payload['continueSession']:
-                print(f"[USSD] Session {session_id} ended. Removing from session_store and replay_cache.")
-                session_store.pop(session_id, None)
-                replay_cache.pop(session_id, None)
+            replay_text = _replayable(session_store.get(session_id))
+        if replay_text:
+            ussd_replay.inc("hit")
+            print(f"[USSD] Replaying cached JSON payload for session {session_id} (initial dial detected)")
+            return jsonify(_make_response_payload(session_id, merged, replay_text)), 200
+        ussd_replay.inc("miss")
+
+    # Call business logic; database actions share the request's latency budget
+    deadline = _guard.deadline(request_started)
+    if not session_lock.acquire(timeout=max(deadline - time.monotonic(), 0)):
+        return jsonify(_busy_payload(session_id, merged, phone_number)), 200
+    try:
+        existing = session_store.get(session_id)
+        from_state = existing.state.name if existing else "NONE"
+        started = time.perf_counter()
+        response_text = handle_ussd(
+            session_store=session_store,
+            session_id=session_id,
+            phone_number=phone_number,
+            user_input=text,
+            new_session=new_session,
+            session_ttl_minutes=SESSION_TTL_MINUTES,
+            actions=_guard.sync_actions(deadline)
+        )
+        ussd_handle_seconds.observe(time.perf_counter() - started, from_state)
+        ussd_transitions.inc(from_state, session_store[session_id].state.name)
+        payload = _make_response_payload(session_id, merged, response_text)
+        if not payload['continueSession']:
+            print(f"[USSD] Session {session_id} ended. Removing from session_store.")
+            session_store.pop(session_id, None)
 
     except Exception as e:
         print("Error in handle_ussd:", str(e))
@@ -186,27 +227,52 @@ def ussd_handler():
             "raw_response": "END Internal server error."
         }
         return jsonify(fallback), 200
+    finally:
+        session_lock.release()
 
     return jsonify(payload), 200
 
+def _replayable(session):
+    """The session's last response if it is still fresh enough to replay, else None."""
+    if session and session.last_response and session.idle_seconds() <= REPLAY_CACHE_TTL_SECONDS:
+        return session.last_response
+    return None
+
+def _busy_payload(session_id, merged, phone_number):
+    # The session store stayed locked for the whole budget; answer before the gateway gives up
+    return {
+        "sessionID": session_id,
+        "userID": merged.get('userID') or session_id,
+        "msisdn": phone_number,
+        "message": "Service busy. Please try again.",
+        "continueSession": False,
+        "raw_response": "END Service busy. Please try again."
+    }
+
+@timed_job('ussd_session_cleanup')
+def _cleanup_expired():
+    with session_lock:
+        expired_keys = [sid for sid, s in session_store.items() if s.is_expired(SESSION_TTL_MINUTES)]
+        for sid in expired_keys:
+            del session_store[sid]
+
 def cleanup_sessions_and_replay():
-    """Periodically remove expired sessions and stale replay entries."""
+    """Periodically remove expired sessions (their replay text goes with them)."""
     try:
-        with session_lock:
-            now = time.time()
-            expired_keys = [sid for sid, s in session_store.items() if s.is_expired()]
-            for sid in expired_keys:
-                del session_store[sid]
-                if sid in replay_cache:
-                    del replay_cache[sid]
-            stale = [sid for sid, (_, ts) in replay_cache.items() if (now - ts) > REPLAY_CACHE_TTL_SECONDS]
-            for sid in stale:
-                del replay_cache[sid]
+        _cleanup_expired()
+        # Spooled submissions wait for the database (no-op while the breaker is open)
+        if _guard:
+            _guard.replay_spool()
     except Exception as e:
         print("Error during cleanup:", str(e))
     finally:
-        threading.Timer(30, cleanup_sessions_and_replay).start()
+        _start_timer(30)
+
+def _start_timer(delay):
+    timer = threading.Timer(delay, cleanup_sessions_and_replay)
+    timer.daemon = True
+    timer.start()
 
-# OPTIONAL helper to start cleanup from app.py after registering blueprint
+# Started on the first request (see _ensure_cleanup)
 def start_cleanup():
-    threading.Timer(1, cleanup_sessions_and_replay).start()
+    _start_timer(1)